@@ -0,0 +1,81 @@
+"""
+Benchmark de gravação no banco: inserções por segundo antes e depois do lote.
+
+"Antes" reproduz o `save_document` original (uma conexão e um commit por documento,
+journal padrão). "Depois" usa `DatabaseHandler.save_documents` (conexão única, WAL,
+synchronous=NORMAL e `executemany` em uma só transação) e o `save_document` com buffer.
+
+Uso:
+    python -m benchmarks.bench_db_inserts [--documentos 10000]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.fixtures import synthetic_documents
+from utils.database_handler import DatabaseHandler
+
+
+def _insercao_por_documento(db_path: str, docs):
+    """Cópia do comportamento original: conecta, insere e faz commit a cada documento."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS documentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome_arquivo TEXT NOT NULL,
+                tipo_documento TEXT,
+                data_processamento TEXT NOT NULL,
+                conteudo_extraido TEXT,
+                atributos_especificos TEXT
+            );
+        """)
+    fixed_keys = ['nome_arquivo', 'tipo_documento', 'data_processamento', 'conteudo_extraido']
+    for doc in docs:
+        specific = {k: v for k, v in doc.to_dict().items() if k not in fixed_keys}
+        values = (doc.nome_arquivo, doc.tipo_documento, str(doc.data_processamento), doc.conteudo_extraido,
+                  json.dumps(specific, ensure_ascii=False, default=str))
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                "INSERT INTO documentos (nome_arquivo, tipo_documento, data_processamento, conteudo_extraido, "
+                "atributos_especificos) VALUES (?, ?, ?, ?, ?);", values)
+            conn.commit()
+        conn.close()
+
+
+def _insercao_em_lote(db_path: str, docs):
+    with DatabaseHandler(db_path=db_path) as handler:
+        handler.save_documents(docs)
+
+
+def _insercao_com_buffer(db_path: str, docs):
+    with DatabaseHandler(db_path=db_path, buffer_size=500) as handler:
+        for doc in docs:
+            handler.save_document(doc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=10000)
+    args = parser.parse_args()
+
+    docs = list(synthetic_documents(args.documentos))
+    cenarios = [
+        ("antes: uma transação por documento", _insercao_por_documento),
+        ("depois: save_documents (lote único)", _insercao_em_lote),
+        ("depois: save_document com buffer", _insercao_com_buffer),
+    ]
+    print(f"{args.documentos} documentos sintéticos")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i, (nome, func) in enumerate(cenarios):
+            db_path = os.path.join(tmp_dir, f"bench_{i}.db")
+            inicio = time.perf_counter()
+            func(db_path, docs)
+            duracao = time.perf_counter() - inicio
+            print(f"  {nome:<40} {duracao:8.2f} s   {args.documentos / duracao:10.0f} inserções/s")
+
+
+if __name__ == "__main__":
+    main()
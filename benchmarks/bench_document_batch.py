@@ -0,0 +1,62 @@
+"""
+Benchmark da leitura de muitos documentos do banco para análise.
+
+Compara o caminho por linha (um dicionário por documento, como em `find_documents`,
+seguido de `pd.DataFrame(registros)`) com o lote colunar (`DatabaseHandler.load_batch`
+seguido de `DocumentoBatch.to_pandas`). Mede o tempo e o pico de memória Python
+(tracemalloc) de cada caminho.
+
+Uso:
+    python -m benchmarks.bench_document_batch [--documentos 200000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.fixtures import synthetic_documents
+from utils.database_handler import DatabaseHandler
+
+
+def _por_linha(handler: DatabaseHandler) -> pd.DataFrame:
+    with handler._lock:
+        cursor = handler._conn.execute("SELECT * FROM documentos;")
+        columns = [description[0] for description in cursor.description]
+        registros = [handler._row_to_dict(columns, row) for row in cursor]
+    return pd.DataFrame(registros)
+
+
+def _colunar(handler: DatabaseHandler) -> pd.DataFrame:
+    return handler.load_batch(include_content=True).to_pandas()
+
+
+def _medir(func, handler: DatabaseHandler):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    df = func(handler)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico / 1e6, len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with DatabaseHandler(db_path=os.path.join(tmp_dir, "bench.db")) as handler:
+            handler.save_documents(synthetic_documents(args.documentos))
+            print(f"{args.documentos} documentos")
+            for nome, func in (("por linha (dict + DataFrame)", _por_linha),
+                               ("colunar (load_batch + to_pandas)", _colunar)):
+                duracao, pico_mb, linhas = _medir(func, handler)
+                print(f"  {nome:<34} {duracao:7.2f} s   pico {pico_mb:8.1f} MB   {linhas} linhas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Microbenchmark do custo por página antes do OCR.
+
+Compara o caminho antigo de `_process_pdf` (PIL -> PNG -> Image.open -> np.array)
+com a entrada direta de `OcrProcessor.process_image` (normalização única para RGB,
+sem codificar/decodificar a imagem). O PaddleOCR não é executado: apenas o
+overhead de preparação da imagem é medido.
+
+Uso:
+    python -m benchmarks.bench_image_input [--width 1654] [--height 2339] [--repeticoes 20]
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.ocr_processor import _to_rgb_array
+
+
+def _pagina_sintetica(width: int, height: int, mode: str) -> Image.Image:
+    """Gera uma página com ruído determinístico (pior caso para a compressão PNG)."""
+    rng = np.random.default_rng(42)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels, "RGB").convert(mode)
+
+
+def _caminho_antigo(image: Image.Image) -> np.ndarray:
+    with io.BytesIO() as output:
+        image.save(output, format="PNG")
+        image_bytes = output.getvalue()
+    return np.array(Image.open(io.BytesIO(image_bytes)))
+
+
+def _caminho_novo(image: Image.Image) -> np.ndarray:
+    return _to_rgb_array(image)
+
+
+def _medir(func, image: Image.Image, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func(image)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # A4 a 200 DPI por padrão
+    parser.add_argument("--width", type=int, default=1654)
+    parser.add_argument("--height", type=int, default=2339)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Página {args.width}x{args.height}, mediana de {args.repeticoes} execuções")
+    for mode in ("RGB", "RGBA", "L", "P"):
+        image = _pagina_sintetica(args.width, args.height, mode)
+        antigo = _medir(_caminho_antigo, image, args.repeticoes)
+        novo = _medir(_caminho_novo, image, args.repeticoes)
+        print(f"  {mode:<4} antes: {antigo:8.2f} ms   depois: {novo:8.2f} ms   ({antigo / max(novo, 1e-6):.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
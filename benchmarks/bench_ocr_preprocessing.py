@@ -0,0 +1,142 @@
+"""
+Precisão x latência do OCR para diferentes configurações de pré-processamento.
+
+Gera um conjunto de amostras sintéticas com texto conhecido (miniatura, página A4 a
+200 DPI e uma "foto" de 12 MP com ruído) e executa o PaddleOCR em cada uma, com cada
+configuração de `OcrProcessor` (resolução máxima/mínima, tons de cinza, binarização e
+classificador de orientação). A precisão é a similaridade (difflib) entre o texto
+reconhecido e o texto esperado. As amostras sintéticas estão todas na orientação
+correta: a configuração sem o classificador ("padrao_sem_cls") só mede o ganho de
+latência, não a perda de precisão em digitalizações giradas.
+
+Amostras reais podem ser adicionadas com `--amostras DIR`: cada imagem (png/jpg) deve
+ter ao lado um arquivo .txt com o texto esperado.
+
+Uso:
+    python -m benchmarks.bench_ocr_preprocessing [--amostras DIR] [--repeticoes 3]
+"""
+import argparse
+import difflib
+import glob
+import os
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from utils.ocr_processor import OcrProcessor
+
+TEXTO_AMOSTRA = [
+    "NOTA FISCAL ELETRONICA N 000.123.456",
+    "EMITENTE: COMERCIO DE PECAS EXEMPLO LTDA",
+    "CNPJ: 11.222.333/0001-81",
+    "DESTINATARIO: CLIENTE MODELO S.A.",
+    "DATA DE EMISSAO: 15/03/2024",
+    "VALOR TOTAL DA NOTA: R$ 1.234,56",
+]
+
+# Nome -> parâmetros de OcrProcessor e uso do classificador de orientação
+CONFIGURACOES: Dict[str, Tuple[Dict, bool]] = {
+    "sem_ajuste": ({"max_side": None, "min_side": None}, True),
+    "padrao": ({}, True),
+    "padrao_sem_cls": ({}, False),
+    "max_1600": ({"max_side": 1600}, True),
+    "cinza": ({"grayscale": True}, True),
+    "binarizado": ({"binarize_threshold": 160}, True),
+}
+
+
+def _fonte(tamanho: int):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", tamanho)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _pagina(largura: int, altura: int, tamanho_fonte: int, ruido: float = 0.0) -> Image.Image:
+    """Desenha o texto da amostra em uma página branca, com ruído opcional (simula uma foto)."""
+    image = Image.new("RGB", (largura, altura), "white")
+    draw = ImageDraw.Draw(image)
+    fonte = _fonte(tamanho_fonte)
+    y = tamanho_fonte * 2
+    for linha in TEXTO_AMOSTRA:
+        draw.text((tamanho_fonte * 2, y), linha, fill="black", font=fonte)
+        y += int(tamanho_fonte * 1.8)
+    if ruido:
+        rng = np.random.default_rng(7)
+        pixels = np.asarray(image, dtype=np.int16)
+        pixels = pixels + rng.normal(0, ruido, pixels.shape).astype(np.int16)
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB").filter(ImageFilter.GaussianBlur(1))
+    return image
+
+
+def amostras_sinteticas() -> List[Tuple[str, Image.Image, str]]:
+    esperado = "\n".join(TEXTO_AMOSTRA)
+    return [
+        ("miniatura_400px", _pagina(400, 300, 9), esperado),
+        ("a4_200dpi", _pagina(1654, 2339, 36), esperado),
+        ("foto_12mp", _pagina(4000, 3000, 80, ruido=12.0), esperado),
+    ]
+
+
+def amostras_do_diretorio(diretorio: str) -> List[Tuple[str, Image.Image, str]]:
+    amostras = []
+    for caminho in sorted(glob.glob(os.path.join(diretorio, "*"))):
+        base, extensao = os.path.splitext(caminho)
+        if extensao.lower() not in (".png", ".jpg", ".jpeg") or not os.path.exists(base + ".txt"):
+            continue
+        with open(base + ".txt", encoding="utf-8") as arquivo:
+            esperado = arquivo.read()
+        with Image.open(caminho) as image:
+            image.load()
+            amostras.append((os.path.basename(caminho), image.copy(), esperado))
+    return amostras
+
+
+def similaridade(reconhecido: str, esperado: str) -> float:
+    """Similaridade (0 a 1) entre os textos, ignorando diferenças de espaços e caixa."""
+    normalizar = lambda texto: " ".join(texto.upper().split())
+    return difflib.SequenceMatcher(None, normalizar(reconhecido), normalizar(esperado)).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--amostras", help="Diretório com imagens e os respectivos .txt esperados.")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    amostras = amostras_sinteticas()
+    if args.amostras:
+        amostras += amostras_do_diretorio(args.amostras)
+
+    print(f"{'configuração':<16} {'amostra':<20} {'latência (ms)':>14} {'precisão':>9}")
+    resumo = {}
+    for nome, (parametros, angle_cls) in CONFIGURACOES.items():
+        processor = OcrProcessor(max_workers=1, **parametros)
+        processor.engine_pool.wait_ready()
+        # Aquecimento: a primeira inferência inclui a inicialização do Paddle
+        processor.process_image(amostras[0][1], angle_cls=angle_cls)
+
+        latencias, precisoes = [], []
+        for amostra, image, esperado in amostras:
+            tempos = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                texto = processor.process_image(image, angle_cls=angle_cls)
+                tempos.append(time.perf_counter() - inicio)
+            latencia = statistics.median(tempos) * 1000
+            precisao = similaridade(texto, esperado)
+            latencias.append(latencia)
+            precisoes.append(precisao)
+            print(f"{nome:<16} {amostra:<20} {latencia:>14.1f} {precisao:>9.3f}")
+        resumo[nome] = (statistics.mean(latencias), statistics.mean(precisoes))
+
+    print("\nMédia por configuração:")
+    for nome, (latencia, precisao) in resumo.items():
+        print(f"  {nome:<16} {latencia:>10.1f} ms   precisão {precisao:.3f}")
+
+
+if __name__ == "__main__":
+    main()
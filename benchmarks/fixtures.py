@@ -0,0 +1,302 @@
+"""
+Geradores de arquivos sintéticos e reproduzíveis para os benchmarks.
+
+Todos os arquivos são montados à mão (PDF, XML de NF-e, DOCX e ZIP não dependem de
+bibliotecas externas); apenas as imagens e as páginas "digitalizadas" de PDF usam o
+Pillow para desenhar o texto. O conteúdo varia com o índice de cada arquivo, de modo
+que nenhum par de arquivos tem o mesmo hash (a ingestão descarta duplicados).
+"""
+import io
+import random
+import zipfile
+import zlib
+from typing import Dict, Iterator, List, Tuple
+from xml.sax.saxutils import escape
+
+from models.document_model import Documento
+
+NFE_NAMESPACE = "http://www.portalfiscal.inf.br/nfe"
+
+_EMPRESAS = ["COMERCIO DE PECAS EXEMPLO LTDA", "DISTRIBUIDORA MODELO S.A.", "SERVICOS GERAIS TESTE ME",
+             "INDUSTRIA FICTICIA LTDA", "LOJA DEMONSTRACAO EIRELI"]
+
+
+# --- Documentos válidos (dígitos verificadores) ---
+
+def _mod11_digit(digits: str, weights: List[int]) -> str:
+    total = sum(int(d) * w for d, w in zip(digits, weights))
+    check = 11 - total % 11
+    return "0" if check >= 10 else str(check)
+
+
+def cnpj(rng: random.Random) -> str:
+    """CNPJ (apenas dígitos) com dígitos verificadores válidos."""
+    base = "".join(str(rng.randint(0, 9)) for _ in range(8)) + "0001"
+    base += _mod11_digit(base, [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    base += _mod11_digit(base, [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    return base
+
+
+def access_key(uf: str, year_month: str, issuer_cnpj: str, model: str, number: int, rng: random.Random) -> str:
+    """Chave de acesso de 44 dígitos com o dígito verificador (módulo 11) correto."""
+    key = f"{uf}{year_month}{issuer_cnpj}{model}001{number:09d}1{rng.randint(0, 10 ** 8 - 1):08d}"
+    weights = [2, 3, 4, 5, 6, 7, 8, 9]
+    total = sum(int(d) * weights[i % 8] for i, d in enumerate(reversed(key)))
+    check = 11 - total % 11
+    return key + ("0" if check >= 10 else str(check))
+
+
+def invoice_lines(index: int, rng: random.Random) -> List[str]:
+    """Linhas de texto de uma nota fiscal com CNPJs válidos (também o texto enviado ao LLM)."""
+    issuer, recipient = cnpj(rng), cnpj(rng)
+    value = rng.randint(1000, 999999) / 100
+    fmt = lambda c: f"{c[:2]}.{c[2:5]}.{c[5:8]}/{c[8:12]}-{c[12:]}"
+    return [
+        f"NOTA FISCAL ELETRONICA N {100000 + index}",
+        f"EMITENTE: {rng.choice(_EMPRESAS)}",
+        f"CNPJ: {fmt(issuer)}",
+        f"DESTINATARIO: {rng.choice(_EMPRESAS)}",
+        f"CNPJ: {fmt(recipient)}",
+        f"DATA DE EMISSAO: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024",
+        f"VALOR TOTAL DA NOTA: R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+    ]
+
+
+# --- PDF ---
+
+def _pdf_from_objects(objects: List[bytes]) -> bytes:
+    """Monta um PDF a partir dos corpos dos objetos (numerados a partir de 1), com xref e trailer."""
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        output.write(f"{offset:010d} 00000 n \n".encode())
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return output.getvalue()
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _stream(data: bytes, extra: str = "") -> bytes:
+    return f"<< /Length {len(data)} {extra}>>\nstream\n".encode() + data + b"\nendstream"
+
+
+def _scanned_page_pixels(lines: List[str], width: int, height: int) -> bytes:
+    from PIL import Image, ImageDraw
+
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for row, line in enumerate(lines):
+        draw.text((40, 40 + row * 30), line, fill=0)
+    return image.tobytes()
+
+
+def make_pdf(index: int, pages: int = 3, scanned: bool = False, seed: int = 0) -> bytes:
+    """
+    PDF A4 com `pages` páginas. Com `scanned=False` as páginas têm camada de texto
+    (Helvetica); com `scanned=True` cada página é uma imagem em tons de cinza, sem texto,
+    e precisa passar pelo OCR.
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    # 1: catálogo, 2: árvore de páginas, 3: fonte; depois (página, conteúdo[, imagem]) por página
+    objects: List[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = invoice_lines(index * 100 + page, rng) + [f"Pagina {page + 1} de {pages}"]
+        page_number = len(objects) + 1
+        kids.append(f"{page_number} 0 R")
+        if scanned:
+            width, height = 827, 1169  # A4 a 100 DPI
+            pixels = zlib.compress(_scanned_page_pixels(lines, width, height))
+            content = b"q 595 0 0 842 0 0 cm /Im0 Do Q"
+            resources = f"<< /XObject << /Im0 {page_number + 2} 0 R >> >>"
+        else:
+            text_ops = "".join(f"({_pdf_escape(line)}) Tj 0 -18 Td " for line in lines)
+            content = f"BT /F1 11 Tf 50 790 Td {text_ops}ET".encode("latin-1")
+            resources = "<< /Font << /F1 3 0 R >> >>"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources {resources} "
+                       f"/Contents {page_number + 1} 0 R >>".encode())
+        objects.append(_stream(content))
+        if scanned:
+            objects.append(_stream(pixels, f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                                           f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode "))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+    return _pdf_from_objects(objects)
+
+
+# --- XML de NF-e ---
+
+def make_nfe_xml(index: int, items: int = 5, seed: int = 0) -> bytes:
+    """XML de NF-e (modelo 55, leiaute 4.00) com chave de acesso e CNPJs válidos."""
+    rng = random.Random(seed * 1_000_003 + index)
+    issuer, recipient = cnpj(rng), cnpj(rng)
+    number = 1000 + index
+    key = access_key("35", "2403", issuer, "55", number, rng)
+    products = []
+    total = 0.0
+    for item in range(1, items + 1):
+        value = rng.randint(100, 99999) / 100
+        total += value
+        products.append(
+            f'<det nItem="{item}"><prod><cProd>{item:04d}</cProd><xProd>PRODUTO {item}</xProd>'
+            f"<qCom>1.0000</qCom><vProd>{value:.2f}</vProd></prod></det>"
+        )
+    xml = (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<nfeProc xmlns="{NFE_NAMESPACE}" versao="4.00"><NFe><infNFe Id="NFe{key}" versao="4.00">'
+        f"<ide><cUF>35</cUF><mod>55</mod><serie>1</serie><nNF>{number}</nNF>"
+        f"<dhEmi>2024-03-{rng.randint(1, 28):02d}T10:00:00-03:00</dhEmi></ide>"
+        f"<emit><CNPJ>{issuer}</CNPJ><xNome>{escape(rng.choice(_EMPRESAS))}</xNome></emit>"
+        f"<dest><CNPJ>{recipient}</CNPJ><xNome>{escape(rng.choice(_EMPRESAS))}</xNome></dest>"
+        f"{''.join(products)}"
+        f"<total><ICMSTot><vProd>{total:.2f}</vProd><vNF>{total:.2f}</vNF></ICMSTot></total>"
+        f"</infNFe></NFe></nfeProc>"
+    )
+    return xml.encode("utf-8")
+
+
+# --- DOCX ---
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    "</Types>"
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/></Relationships>'
+)
+
+
+def make_docx(index: int, paragraphs: int = 20, seed: int = 0) -> bytes:
+    """DOCX mínimo (apenas document.xml) com um contrato de aluguel fictício."""
+    rng = random.Random(seed * 1_000_003 + index)
+    lines = [f"CONTRATO DE LOCACAO N {index}"] + invoice_lines(index, rng)[1:5]
+    lines += [f"Clausula {n}: o locatario pagara o valor mensal de R$ {rng.randint(500, 9000)},00."
+              for n in range(1, paragraphs + 1)]
+    body = "".join(f"<w:p><w:r><w:t>{escape(line)}</w:t></w:r></w:p>" for line in lines)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as docx_zip:
+        docx_zip.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        docx_zip.writestr("_rels/.rels", _DOCX_RELS)
+        docx_zip.writestr("word/document.xml", document)
+    return output.getvalue()
+
+
+# --- Imagens ---
+
+def make_image(index: int, width: int, height: int, fmt: str = "PNG", seed: int = 0) -> bytes:
+    """Imagem (PNG ou JPEG) com o texto de uma nota fiscal, proporcional ao tamanho."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = random.Random(seed * 1_000_003 + index)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font_size = max(10, width // 40)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    for row, line in enumerate(invoice_lines(index, rng)):
+        draw.text((font_size, font_size * (1 + row * 2)), line, fill="black", font=font)
+    output = io.BytesIO()
+    image.save(output, format=fmt)
+    return output.getvalue()
+
+
+# Tamanhos das imagens geradas: miniatura, página digitalizada e foto de celular
+IMAGE_SIZES = {"pequena": (480, 360), "media": (1654, 2339), "grande": (4000, 3000)}
+
+
+# --- Conjuntos ---
+
+def make_zip(files: List[Tuple[str, bytes]]) -> bytes:
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+    return output.getvalue()
+
+
+def format_samples(with_ocr: bool, seed: int = 0, per_format: int = 5) -> Dict[str, List[Tuple[str, bytes]]]:
+    """
+    Amostras por formato, para as medições de latência de extração.
+
+    Returns:
+        Dict[str, List[Tuple[str, bytes]]]: formato -> [(nome do arquivo, bytes)].
+    """
+    samples = {
+        "pdf_texto": [(f"texto_{i}.pdf", make_pdf(i, pages=3, seed=seed)) for i in range(per_format)],
+        "xml_nfe": [(f"nfe_{i}.xml", make_nfe_xml(i, seed=seed)) for i in range(per_format)],
+        "docx": [(f"contrato_{i}.docx", make_docx(i, seed=seed)) for i in range(per_format)],
+    }
+    if with_ocr:
+        samples["pdf_digitalizado"] = [(f"digitalizado_{i}.pdf", make_pdf(i, pages=2, scanned=True, seed=seed))
+                                       for i in range(per_format)]
+        for size_name, (width, height) in IMAGE_SIZES.items():
+            fmt = "JPEG" if size_name == "grande" else "PNG"
+            extension = "jpg" if fmt == "JPEG" else "png"
+            samples[f"imagem_{size_name}"] = [
+                (f"imagem_{size_name}_{i}.{extension}", make_image(i, width, height, fmt, seed=seed))
+                for i in range(per_format)
+            ]
+    return samples
+
+
+def mixed_files(count: int, with_ocr: bool, seed: int = 0) -> List[Tuple[str, bytes]]:
+    """Lista de `count` arquivos únicos alternando os formatos (para os ZIPs de ingestão)."""
+    makers = [
+        lambda i: (f"nfe_{i:05d}.xml", make_nfe_xml(i, seed=seed)),
+        lambda i: (f"texto_{i:05d}.pdf", make_pdf(i, pages=2, seed=seed)),
+        lambda i: (f"contrato_{i:05d}.docx", make_docx(i, paragraphs=8, seed=seed)),
+    ]
+    if with_ocr:
+        makers.append(lambda i: (f"imagem_{i:05d}.png", make_image(i, *IMAGE_SIZES["pequena"], seed=seed)))
+    return [makers[i % len(makers)](i) for i in range(count)]
+
+
+def synthetic_documents(count: int) -> Iterator[Documento]:
+    """Documentos já extraídos (notas do mesmo emitente com números distintos), para os benchmarks do banco."""
+    for i in range(count):
+        doc = Documento(
+            nome_arquivo=f"nota_{i:06d}.pdf",
+            tipo_documento="Nota Fiscal",
+            numero_nf=str(100000 + i),
+            cnpj_emitente="11.222.333/0001-81",
+            nome_emitente="Empresa Exemplo LTDA",
+            data_emissao="2024-03-15",
+            valor_total=round(10 + i * 0.37, 2),
+        )
+        doc.conteudo_extraido = f"NOTA FISCAL {100000 + i}\nValor total R$ {10 + i * 0.37:.2f}\n" * 20
+        yield doc
+
+
+class InMemoryFile:
+    """Arquivo em memória com a interface do UploadedFile do Streamlit (name/getvalue)."""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
@@ -0,0 +1,270 @@
+"""
+Suíte de benchmarks reproduzível do pipeline de documentos.
+
+Gera os arquivos de teste (benchmarks/fixtures.py), sobe o servidor stub do LLM com a
+latência configurada e mede:
+  * latência de extração por formato (p50/p95/p99), via `OcrProcessor.process_file_structured`;
+  * vazão do `LlmExtractor` em lote contra o stub;
+  * vazão ponta a ponta (documentos/s) do `IngestPipeline` com ZIPs de 10/100/1000 arquivos;
+  * taxa de inserção do `DatabaseHandler` (lote único e com buffer);
+  * pico de memória (RSS) do processo e dos processos filhos (no Windows, apenas o pico de
+    alocações Python do processo, via tracemalloc).
+
+Os resultados são gravados em JSON e podem ser comparados com uma execução anterior: a
+comparação falha (código de saída 1) quando alguma métrica piora além do limite.
+
+Uso:
+    python -m benchmarks.run_suite --saida base.json
+    python -m benchmarks.run_suite --saida novo.json --comparar base.json --limite 0.10
+    python -m benchmarks.run_suite --sem-ocr --zips 10,100   # sem PaddleOCR/Poppler
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks import fixtures
+from benchmarks.fixtures import InMemoryFile, synthetic_documents
+from benchmarks.stub_llm_server import run_stub_server
+from utils.database_handler import DatabaseHandler
+from utils.ingest_pipeline import IngestPipeline
+from utils.llm_extractor import LlmExtractor
+
+try:
+    import resource
+except ImportError:
+    # Windows: sem getrusage, o pico de memória é medido pelo tracemalloc (apenas alocações Python)
+    resource = None
+
+# Direção de cada métrica: "menor" (latência, memória) ou "maior" (vazão) é melhor.
+MENOR, MAIOR = "menor", "maior"
+
+
+def _resultado(valor: float, unidade: str, melhor: str) -> Dict:
+    return {"valor": round(valor, 4), "unidade": unidade, "melhor": melhor}
+
+
+def _percentil(ordenadas: List[float], q: float) -> float:
+    """Percentil pelo método nearest-rank."""
+    index = min(len(ordenadas) - 1, max(0, math.ceil(q * len(ordenadas)) - 1))
+    return ordenadas[index]
+
+
+def _rss_mb(who: int) -> float:
+    maxrss = resource.getrusage(who).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def medir_memoria() -> Dict[str, Dict]:
+    """Pico de memória do processo e dos filhos (ou, sem `resource`, o pico do tracemalloc)."""
+    if resource is None:
+        _, pico = tracemalloc.get_traced_memory()
+        return {"memoria.pico_tracemalloc_processo": _resultado(pico / (1024 * 1024), "MB", MENOR)}
+    return {
+        "memoria.pico_rss_processo": _resultado(_rss_mb(resource.RUSAGE_SELF), "MB", MENOR),
+        "memoria.pico_rss_filhos": _resultado(_rss_mb(resource.RUSAGE_CHILDREN), "MB", MENOR),
+    }
+
+
+# --- Medições ---
+
+def medir_formatos(amostras: Dict, repeticoes: int, com_ocr: bool) -> Dict[str, Dict]:
+    from utils.ocr_processor import OcrProcessor
+
+    resultados = {}
+    processor = OcrProcessor(max_workers=1, warm_start=com_ocr)
+    if com_ocr:
+        # O carregamento do motor é medido à parte, não nas latências por formato
+        processor.engine_pool.wait_ready()
+        resultados["ocr.cold_start"] = _resultado(
+            processor.cold_start_report()["primeiro_motor_pronto_segundos"], "s", MENOR)
+
+    for formato, arquivos in amostras.items():
+        tempos = []
+        for _ in range(repeticoes):
+            for nome, dados in arquivos:
+                inicio = time.perf_counter()
+                processor.process_file_structured(InMemoryFile(nome, dados))
+                tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        for q in (50, 95, 99):
+            resultados[f"formato.{formato}.p{q}"] = _resultado(_percentil(tempos, q / 100), "ms", MENOR)
+        print(f"  {formato:<20} p50 {_percentil(tempos, 0.5):9.1f} ms   p95 {_percentil(tempos, 0.95):9.1f} ms")
+    processor.close()
+    return resultados
+
+
+def medir_llm(base_url: str, quantidade: int, concorrencia: int) -> Dict[str, Dict]:
+    import random
+
+    rng = random.Random(0)
+    textos = ["\n".join(fixtures.invoice_lines(i, rng)) for i in range(quantidade)]
+    extractor = LlmExtractor(api_key="benchmark", base_url=base_url, max_concurrency=concorrencia)
+    inicio = time.perf_counter()
+    respostas = extractor.extract_details_many(textos)
+    duracao = time.perf_counter() - inicio
+    extractor.close()
+    erros = sum(1 for resposta in respostas if isinstance(resposta, Exception))
+    print(f"  {quantidade} extrações em {duracao:.2f}s ({quantidade / duracao:.1f}/s), {erros} erro(s)")
+    return {
+        "llm.extracoes_por_segundo": _resultado(quantidade / duracao, "docs/s", MAIOR),
+        "llm.erros": _resultado(erros, "erros", MENOR),
+    }
+
+
+def medir_ingestao(base_url: str, tamanhos: List[int], com_ocr: bool, ocr_workers: int,
+                   concorrencia: int, tmp_dir: str) -> Dict[str, Dict]:
+    resultados = {}
+    for tamanho in tamanhos:
+        zip_path = os.path.join(tmp_dir, f"lote_{tamanho}.zip")
+        with open(zip_path, "wb") as arquivo:
+            arquivo.write(fixtures.make_zip(fixtures.mixed_files(tamanho, com_ocr)))
+
+        db_path = os.path.join(tmp_dir, f"ingestao_{tamanho}.db")
+        extractor = LlmExtractor(api_key="benchmark", base_url=base_url, max_concurrency=concorrencia)
+        with DatabaseHandler(db_path=db_path) as db_handler:
+            pipeline = IngestPipeline(db_handler, extractor, ocr_workers=ocr_workers,
+                                      llm_concurrency=concorrencia)
+            metricas = pipeline.run([zip_path])
+        print(f"  ZIP com {tamanho:>5} arquivos: {metricas['salvos']} salvos em {metricas['segundos']}s "
+              f"({metricas['documentos_por_segundo']} docs/s)")
+        resultados[f"ingestao.zip_{tamanho}.docs_por_segundo"] = _resultado(
+            metricas["documentos_por_segundo"], "docs/s", MAIOR)
+    return resultados
+
+
+def medir_banco(quantidade: int, tmp_dir: str) -> Dict[str, Dict]:
+    docs = list(synthetic_documents(quantidade))
+    resultados = {}
+
+    db_path = os.path.join(tmp_dir, "banco_lote.db")
+    with DatabaseHandler(db_path=db_path) as handler:
+        inicio = time.perf_counter()
+        handler.save_documents(docs)
+        taxa = quantidade / (time.perf_counter() - inicio)
+    resultados["banco.insercoes_por_segundo.lote"] = _resultado(taxa, "docs/s", MAIOR)
+
+    db_path = os.path.join(tmp_dir, "banco_buffer.db")
+    with DatabaseHandler(db_path=db_path, buffer_size=500) as handler:
+        inicio = time.perf_counter()
+        for doc in docs:
+            handler.save_document(doc)
+        handler.flush()
+        taxa_buffer = quantidade / (time.perf_counter() - inicio)
+    resultados["banco.insercoes_por_segundo.buffer"] = _resultado(taxa_buffer, "docs/s", MAIOR)
+    print(f"  lote: {taxa:.0f} inserções/s   buffer: {taxa_buffer:.0f} inserções/s")
+    return resultados
+
+
+# --- Comparação ---
+
+def comparar(atual: Dict, base: Dict, limite: float) -> List[str]:
+    """
+    Compara as métricas presentes nas duas execuções.
+
+    Returns:
+        List[str]: As métricas que pioraram mais do que `limite` (fração, ex: 0.10 = 10%).
+    """
+    regressoes = []
+    print(f"\n{'métrica':<48} {'base':>12} {'atual':>12} {'variação':>9}")
+    for nome, resultado in sorted(atual["resultados"].items()):
+        anterior = base["resultados"].get(nome)
+        if anterior is None:
+            continue
+        valor_base, valor = anterior["valor"], resultado["valor"]
+        if valor_base == 0:
+            variacao = 0.0 if valor == 0 else math.inf
+        else:
+            variacao = (valor - valor_base) / abs(valor_base)
+        # Piora: aumento de métricas "menor é melhor" ou queda de "maior é melhor"
+        piora = variacao if resultado["melhor"] == MENOR else -variacao
+        marca = "  REGRESSÃO" if piora > limite else ""
+        print(f"{nome:<48} {valor_base:>12.2f} {valor:>12.2f} {variacao * 100:>8.1f}%{marca}")
+        if piora > limite:
+            regressoes.append(nome)
+    return regressoes
+
+
+def _commit_atual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saida", default="benchmark_resultados.json", help="Arquivo JSON de resultados.")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparação.")
+    parser.add_argument("--limite", type=float, default=0.10,
+                        help="Piora relativa máxima aceita na comparação (padrão: 0.10 = 10%%).")
+    parser.add_argument("--zips", default="10,100,1000", help="Quantidade de arquivos de cada ZIP de ingestão.")
+    parser.add_argument("--latencia-llm", type=float, default=0.05, help="Latência do stub do LLM, em segundos.")
+    parser.add_argument("--concorrencia-llm", type=int, default=16)
+    parser.add_argument("--ocr-workers", type=int, default=2)
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições das medições por formato.")
+    parser.add_argument("--documentos-banco", type=int, default=5000)
+    parser.add_argument("--sem-ocr", action="store_true",
+                        help="Omite imagens e PDFs digitalizados (dispensa PaddleOCR e Poppler).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    com_ocr = not args.sem_ocr
+    tamanhos = [int(tamanho) for tamanho in args.zips.split(",") if tamanho.strip()]
+    resultados: Dict[str, Dict] = {}
+    inicio = time.perf_counter()
+    if resource is None:
+        tracemalloc.start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir, run_stub_server(latency=args.latencia_llm) as server:
+        print("Latência por formato:")
+        resultados.update(medir_formatos(fixtures.format_samples(com_ocr, seed=args.seed),
+                                         args.repeticoes, com_ocr))
+        print("LLM (stub):")
+        resultados.update(medir_llm(server.base_url, 100, args.concorrencia_llm))
+        print("Ingestão ponta a ponta:")
+        resultados.update(medir_ingestao(server.base_url, tamanhos, com_ocr, args.ocr_workers,
+                                         args.concorrencia_llm, tmp_dir))
+        print("Banco de dados:")
+        resultados.update(medir_banco(args.documentos_banco, tmp_dir))
+
+    resultados.update(medir_memoria())
+
+    execucao = {
+        "meta": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_atual(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "duracao_segundos": round(time.perf_counter() - inicio, 1),
+            "parametros": vars(args),
+        },
+        "resultados": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(execucao, arquivo, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(execucao, base, args.limite)
+        if regressoes:
+            print(f"\n{len(regressoes)} métrica(s) pioraram mais de {args.limite:.0%}: {', '.join(regressoes)}")
+            sys.exit(1)
+        print("\nNenhuma regressão acima do limite.")
+
+
+if __name__ == "__main__":
+    main()
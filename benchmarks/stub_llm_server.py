@@ -0,0 +1,146 @@
+"""
+Servidor HTTP local que imita o endpoint `/v1/chat/completions` da OpenAI.
+
+Permite exercitar o `LlmExtractor` (inclusive `extract_details_many`) sem rede e
+sem custo, com latência e taxa de erros 429/500 configuráveis:
+
+    with run_stub_server(latency=0.2, error_rate=0.1) as server:
+        extractor = LlmExtractor(api_key="teste", base_url=server.base_url)
+        resultados = extractor.extract_details_many(textos)
+
+Também pode ser executado diretamente:
+    python -m benchmarks.stub_llm_server --port 8765 --latency 0.5
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+# Resposta fixa devolvida pelo servidor no campo `content` da mensagem
+STUB_DETAILS = {
+    "tipo_documento": "Nota Fiscal",
+    "numero_nf": "123",
+    "cnpj_emitente": "11.222.333/0001-81",
+    "nome_emitente": "Empresa Exemplo LTDA",
+    "data_emissao": "2024-03-15",
+    "valor_total": 1500.0,
+}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "StubLlmServer"
+
+    def log_message(self, format, *args):
+        # Silencia o log de cada requisição
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.record_request()
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        draw = self.server.draw()
+        if draw < self.server.error_rate / 2:
+            self._send_json(429, {"error": {"message": "Rate limit (stub)", "type": "rate_limit"}},
+                            headers={"Retry-After": "0"})
+            return
+        if draw < self.server.error_rate:
+            self._send_json(500, {"error": {"message": "Erro interno (stub)", "type": "server_error"}})
+            return
+
+        prompt_chars = sum(len(m.get("content", "")) for m in request.get("messages", []))
+        content = json.dumps(STUB_DETAILS, ensure_ascii=False)
+        self._send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_chars // 4 + len(content) // 4,
+            },
+        })
+
+
+class StubLlmServer(ThreadingHTTPServer):
+    """Servidor com os parâmetros de simulação e a contagem de requisições recebidas."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.request_count = 0
+        # As requisições são atendidas em threads: o contador e o gerador são compartilhados
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def draw(self) -> float:
+        """Sorteia, de forma segura entre as threads, o valor que decide se a resposta é um erro."""
+        with self._lock:
+            return self.rng.random()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+@contextmanager
+def run_stub_server(port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                    seed: int = 0) -> Iterator[StubLlmServer]:
+    """Inicia o servidor em uma thread e o encerra ao sair do bloco `with`."""
+    server = StubLlmServer(port=port, latency=latency, error_rate=error_rate, seed=seed)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de chat da OpenAI.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latência de cada resposta, em segundos.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de respostas 429/500.")
+    args = parser.parse_args()
+
+    server = StubLlmServer(port=args.port, latency=args.latency, error_rate=args.error_rate)
+    print(f"Servidor stub ouvindo em {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
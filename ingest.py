@@ -0,0 +1,85 @@
+"""
+Ingestão de documentos em lote pela linha de comando (sem Streamlit).
+
+Percorre arquivos, diretórios e ZIPs e executa OCR -> LLM -> banco de dados em estágios
+paralelos. Arquivos já ingeridos (mesmo conteúdo) são pulados, de modo que uma execução
+interrompida pode ser retomada simplesmente executando o mesmo comando novamente. Documentos
+que repetem um já gravado (a mesma nota em PDF e XML) são gravados apenas como ligação ao
+documento canônico, sem passar pelo LLM; textos quase idênticos são gravados por completo e
+marcados como possível duplicata.
+
+Exemplos:
+    python ingest.py ./notas ./contratos.zip
+    python ingest.py ./notas --ocr-workers 4 --llm-concurrency 16 --sem-llm
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+from utils.database_handler import DatabaseHandler
+from utils.ingest_pipeline import IngestPipeline
+from utils.llm_extractor import LlmExtractor
+from utils.metrics import metrics
+from utils.result_cache import ResultCache
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("caminhos", nargs="+", help="Arquivos, diretórios e/ou arquivos ZIP.")
+    parser.add_argument("--db", default=os.path.join("data", "documentos.db"), help="Banco de dados SQLite.")
+    parser.add_argument("--cache", default=os.path.join("data", "cache.db"),
+                        help="Cache de resultados (use '' para desativar).")
+    parser.add_argument("--ocr-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Processos de OCR.")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="Chamadas simultâneas ao LLM.")
+    parser.add_argument("--db-batch", type=int, default=100, help="Documentos por transação no banco.")
+    parser.add_argument("--queue-size", type=int, default=32, help="Capacidade das filas entre os estágios.")
+    parser.add_argument("--api-key", default=None, help="Chave da API OpenAI (padrão: OPENAI_API_KEY).")
+    parser.add_argument("--base-url", default=None, help="URL alternativa da API compatível com a OpenAI.")
+    parser.add_argument("--sem-llm", action="store_true", help="Salva apenas o texto extraído, sem chamar o LLM.")
+    parser.add_argument("--sem-deduplicacao", action="store_true",
+                        help="Grava todos os documentos, sem ligar as duplicatas ao documento canônico.")
+    parser.add_argument("--metricas", default=None,
+                        help="Arquivo onde gravar as métricas no formato Prometheus ao final.")
+    return parser.parse_args()
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or ".", exist_ok=True)
+    cache = ResultCache(db_path=args.cache) if args.cache else None
+
+    llm_extractor = None
+    api_key = args.api_key or os.getenv("OPENAI_API_KEY")
+    if not args.sem_llm:
+        if not api_key:
+            raise SystemExit("Informe --api-key, defina OPENAI_API_KEY ou use --sem-llm.")
+        llm_extractor = LlmExtractor(api_key=api_key, cache=cache, base_url=args.base_url,
+                                     max_concurrency=args.llm_concurrency)
+
+    with DatabaseHandler(db_path=args.db, deduplicate=not args.sem_deduplicacao) as db_handler:
+        pipeline = IngestPipeline(
+            db_handler=db_handler,
+            llm_extractor=llm_extractor,
+            ocr_workers=args.ocr_workers,
+            llm_concurrency=args.llm_concurrency,
+            db_batch_size=args.db_batch,
+            queue_size=args.queue_size,
+            cache_path=args.cache or None,
+        )
+        resumo = pipeline.run(args.caminhos)
+
+    print("\n--- Resumo da ingestão ---")
+    for name, value in resumo.items():
+        print(f"{name:>28}: {value}")
+
+    if args.metricas:
+        metrics.write_prometheus(args.metricas)
+        print(f"\nMétricas gravadas em {args.metricas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,16 @@
-import io
 import os
-import zipfile
-from types import SimpleNamespace
+import uuid
 
 import streamlit as st
 
 # Importações das nossas classes
-from models.document_model import Documento
 from utils.ocr_processor import OcrProcessor
 from utils.database_handler import DatabaseHandler
+from utils.ingest_pipeline import UploadJobHandler
+from utils.job_queue import JobQueue
 from utils.llm_extractor import LlmExtractor
+from utils.metrics import metrics
+from utils.result_cache import ResultCache
 
 # --- Configuração da Página e Cache ---
 
@@ -19,11 +20,18 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def load_result_cache():
+    """Carrega o cache persistente de resultados (OCR e LLM) no diretório de dados."""
+    db_dir = "data"
+    os.makedirs(db_dir, exist_ok=True)
+    return ResultCache(db_path=os.path.join(db_dir, "cache.db"))
+
 # Cache do processador OCR para evitar recarregá-lo a cada interação
 @st.cache_resource
 def load_ocr_processor():
     """Carrega a instância do OcrProcessor."""
-    return OcrProcessor()
+    return OcrProcessor(cache=load_result_cache())
 
 @st.cache_resource
 def load_db_handler():
@@ -37,9 +45,42 @@ def load_db_handler():
 def load_llm_extractor(api_key):
     """Carrega a instância do LlmExtractor se a chave da API for fornecida."""
     if api_key:
-        return LlmExtractor(api_key=api_key)
+        return LlmExtractor(api_key=api_key, cache=load_result_cache())
+    return None
+
+@st.cache_resource
+def load_job_queue():
+    """Carrega a fila de trabalhos e inicia os workers que processam os arquivos enviados."""
+    db_dir = "data"
+    os.makedirs(db_dir, exist_ok=True)
+    # Trabalhos sem o extrator da sessão (ex: retomados após um reinício) usam OPENAI_API_KEY, se definida
+    handler = UploadJobHandler(load_ocr_processor(), load_db_handler(),
+                               load_llm_extractor(os.getenv("OPENAI_API_KEY")), llm_batch_size=LLM_BATCH_SIZE)
+    job_queue = JobQueue(db_path=os.path.join(db_dir, "jobs.db"), upload_dir=os.path.join(db_dir, "uploads"),
+                         handler=handler, workers=JOB_WORKERS)
+    job_queue.start()
+    return job_queue
+
+@st.cache_resource
+def start_metrics_server():
+    """Expõe as métricas no formato Prometheus se DOCUMENTOS_METRICAS_PORTA estiver definida."""
+    port = os.getenv("DOCUMENTOS_METRICAS_PORTA")
+    if port and metrics.enabled:
+        return metrics.start_http_server(int(port))
     return None
 
+# Quantidade de documentos de um ZIP enviados ao LLM em cada lote concorrente
+LLM_BATCH_SIZE = 16
+# Threads que processam a fila de trabalhos e intervalo de atualização do andamento na página
+JOB_WORKERS = 2
+JOB_POLL_SECONDS = 2
+# Trabalhos da sessão exibidos e resultados exibidos por trabalho
+MAX_JOBS_SHOWN = 10
+MAX_RESULTS_SHOWN = 50
+
+JOB_STATUS_LABELS = {"pendente": "Na fila", "processando": "Processando", "concluido": "Concluído",
+                     "erro": "Erro", "cancelado": "Cancelado"}
+
 # --- Interface Principal ---
 
 st.title("Sistema de Processamento de Documentos")
@@ -56,91 +97,163 @@ st.write("Faça o upload de um ou mais documentos (PDF, XML, DOCX, Imagem) ou um
 
 # Carrega os handlers
 try:
+    result_cache = load_result_cache()
     ocr_processor = load_ocr_processor()
     db_handler = load_db_handler()
     llm_extractor = load_llm_extractor(openai_api_key)
+    job_queue = load_job_queue()
+    start_metrics_server()
 except Exception as e:
     st.error(f"Falha ao inicializar os serviços. Verifique as dependências. Erro: {e}")
     st.stop()  # Interrompe a execução se o OCR não puder ser carregado
 
+with st.sidebar.expander("Cache de resultados"):
+    cache_stats = result_cache.stats()
+    if cache_stats:
+        for namespace, counters in cache_stats.items():
+            st.write(f"**{namespace.upper()}**: {counters['hits']} acertos, {counters['misses']} falhas")
+    else:
+        st.write("Nenhuma consulta ao cache nesta sessão.")
+
+with st.sidebar.expander("Motor OCR"):
+    cold_start = ocr_processor.cold_start_report()
+    if cold_start["erro"]:
+        st.error(f"Falha ao carregar o PaddleOCR: {cold_start['erro']}")
+    elif cold_start["motor_pronto"]:
+        st.write(f"**Pronto em:** {cold_start['primeiro_motor_pronto_segundos']}s "
+                 f"(importação: {cold_start['importacao_segundos']}s)")
+        st.write(f"**Motores carregados:** {cold_start['motores_prontos']}/{cold_start['motores']}")
+    else:
+        st.write("Carregando em segundo plano... XML, DOCX e PDFs com texto já podem ser processados.")
+
+with st.sidebar.expander("Diagnóstico"):
+    if not metrics.enabled:
+        st.write("Métricas desativadas (DOCUMENTOS_METRICAS=0).")
+    else:
+        snapshot = metrics.snapshot()
+        if snapshot["histogramas"]:
+            st.write("**Latências (segundos)**")
+            st.dataframe(snapshot["histogramas"], hide_index=True)
+        if snapshot["contadores"]:
+            st.write("**Contadores**")
+            st.dataframe(snapshot["contadores"], hide_index=True)
+        if not snapshot["histogramas"] and not snapshot["contadores"]:
+            st.write("Nenhuma métrica coletada nesta sessão.")
+        st.download_button("Exportar (Prometheus)", metrics.render_prometheus(),
+                           file_name="metricas.prom", mime="text/plain")
+
+if llm_extractor:
+    with st.sidebar.expander("Economia de tokens (extração local)"):
+        savings = llm_extractor.token_savings_summary()
+        if savings.get("documentos"):
+            st.write(f"**Documentos analisados:** {savings['documentos']}")
+            st.write(f"**Chamadas ao LLM:** {savings['chamadas_llm']}")
+            st.write(f"**Tokens estimados economizados:** {savings['tokens_estimados_economizados']} "
+                     f"({savings['economia_percentual']}%)")
+        else:
+            st.write("Nenhum documento analisado nesta sessão.")
+
+# Identificador da sessão do navegador (dono dos trabalhos na fila). Fica na URL, de modo que
+# os trabalhos e seus resultados continuam visíveis depois de recarregar a página.
+if "sessao" not in st.query_params:
+    st.query_params["sessao"] = uuid.uuid4().hex
+session_id = st.query_params["sessao"]
+
 # Componente de upload de arquivo
-uploaded_file = st.file_uploader(
-    "Escolha um arquivo",
-    type=['pdf', 'xml', 'docx', 'png', 'jpg', 'jpeg', 'zip']
+uploaded_files = st.file_uploader(
+    "Escolha um ou mais arquivos",
+    type=['pdf', 'xml', 'docx', 'png', 'jpg', 'jpeg', 'zip'],
+    accept_multiple_files=True
 )
 
 # --- Lógica de Processamento ---
 
-if uploaded_file is not None:
-    st.success(f"Arquivo '{uploaded_file.name}' carregado com sucesso!")
-
-    # Função auxiliar para processar um único arquivo e exibir os resultados
-    def process_and_display(file_obj):
-        with st.spinner(f"Processando '{file_obj.name}'..."):
-            try:
-                # 1. Extrair texto com o OCR Processor
-                extracted_text = ocr_processor.process_file(file_obj)
-
-                # 2. Usar LLM para extrair detalhes (se a chave da API foi fornecida)
-                if llm_extractor:
-                    st.info("Analisando conteúdo com IA para extrair detalhes...")
-                    extracted_details = llm_extractor.extract_details(extracted_text)
-                    doc_type = extracted_details.pop('tipo_documento', 'Não Identificado')
-                    # Os detalhes restantes serão os atributos específicos
-                    doc = Documento(
-                        nome_arquivo=file_obj.name,
-                        tipo_documento=doc_type,
-                        **extracted_details
-                    )
-                else:
-                    # Cria a instância sem os detalhes do LLM
-                    doc = Documento(nome_arquivo=file_obj.name)
-
-                doc.conteudo_extraido = extracted_text
-
-                # 3. Salvar no banco de dados
-                db_handler.save_document(doc)
-
-                # 4. Exibir resultados
-                st.write("---")
-                st.success(f"Documento '{doc.nome_arquivo}' salvo no banco de dados!")
-                st.subheader(f"Resultados para: {doc.nome_arquivo}")
-                st.write(f"**Objeto Documento Criado:**")
-                st.json(doc.to_dict())
-
-                with st.expander("Ver Conteúdo Extraído"):
-                    st.text(doc.conteudo_extraido)
-
-            except NotImplementedError as e:
-                st.warning(f"Aviso para '{file_obj.name}': {e}")
-            except Exception as e:
-                st.error(f"Falha ao processar '{file_obj.name}': {e}")
+if uploaded_files:
+    st.success(f"{len(uploaded_files)} arquivo(s) carregado(s) com sucesso!")
 
     if not openai_api_key:
         st.warning("A chave da API da OpenAI não foi fornecida. A extração detalhada de informações (como tipo de documento, CNPJ, etc.) será desativada.")
 
-    # Lógica para lidar com ZIP ou arquivos únicos
-    is_zip = uploaded_file.type == "application/zip" or uploaded_file.name.endswith('.zip')
-
-    if st.button(f"Processar {'Arquivo ZIP' if is_zip else 'Documento'}"):
-        if is_zip:
-            try:
-                zip_buffer = io.BytesIO(uploaded_file.getvalue())
-                with zipfile.ZipFile(zip_buffer, 'r') as zip_ref:
-                    for file_name in zip_ref.namelist():
-                        # Ignorar diretórios e arquivos ocultos do macOS
-                        if file_name.endswith('/') or file_name.startswith('__MACOSX'):
-                            continue
-                        
-                        with zip_ref.open(file_name) as file_in_zip:
-                            # Cria um objeto simples que simula o UploadedFile do Streamlit
-                            mock_file = SimpleNamespace(
-                                name=os.path.basename(file_name),
-                                getvalue=file_in_zip.read
-                            )
-                            process_and_display(mock_file)
-            except Exception as e:
-                st.error(f"Ocorreu um erro ao ler o arquivo ZIP: {e}")
-        else:
-            # Processa o arquivo único
-            process_and_display(uploaded_file)
\ No newline at end of file
+    if st.button(f"Processar {len(uploaded_files)} arquivo(s)"):
+        # Os arquivos vão para a fila e são processados em segundo plano: a página continua
+        # respondendo e o andamento é exibido abaixo
+        job_queue.submit(session_id, [(file.name, file) for file in uploaded_files],
+                         context={"llm_extractor": llm_extractor} if llm_extractor else None)
+        st.success("Arquivos enviados para processamento.")
+
+
+def display_result(result):
+    """Exibe um resultado registrado pelo processamento em segundo plano."""
+    st.write("---")
+    if result["status"] == "erro":
+        st.error(f"Falha ao processar '{result['nome_arquivo']}': {result['mensagem']}")
+        return
+    if result["status"] == "aviso":
+        st.warning(f"Aviso para '{result['nome_arquivo']}': {result['mensagem']}")
+        return
+
+    document = result["documento"]
+    if result["status"] == "duplicata":
+        # Apenas a ligação foi gravada: exibe o documento canônico
+        canonical = db_handler.get_document(document["duplicata_de"]) or {}
+        st.info(f"'{result['nome_arquivo']}' é uma duplicata ({document['tipo_duplicata']}) do documento "
+                f"#{document['duplicata_de']} ('{canonical.get('nome_arquivo')}'); apenas a ligação foi salva.")
+        st.json({k: v for k, v in canonical.items() if k != 'conteudo_extraido'})
+        return
+
+    if result.get("mensagem"):
+        st.info(result["mensagem"])
+    if document.get("possivel_duplicata_de"):
+        st.info(f"O texto de '{result['nome_arquivo']}' é quase idêntico ao do documento "
+                f"#{document['possivel_duplicata_de']}; ambos foram mantidos.")
+    st.success(f"Documento '{result['nome_arquivo']}' salvo no banco de dados!")
+    st.subheader(f"Resultados para: {result['nome_arquivo']}")
+    st.write(f"**Objeto Documento Criado:**")
+    st.json(document)
+
+    with st.expander("Ver Conteúdo Extraído"):
+        st.text(result["conteudo"])
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def display_jobs():
+    """Acompanha os trabalhos desta sessão (apenas este trecho da página é atualizado periodicamente)."""
+    job_ids = job_queue.jobs_for(session_id, limit=MAX_JOBS_SHOWN)
+    if not job_ids:
+        return
+    st.header("Processamentos")
+    for job_id in job_ids:
+        job = job_queue.status(job_id)
+        if job is None:
+            continue
+        names = ", ".join(file["nome"] for file in job["arquivos"][:3])
+        if len(job["arquivos"]) > 3:
+            names += f" e mais {len(job['arquivos']) - 3}"
+
+        with st.container(border=True):
+            st.write(f"**{names}** — {JOB_STATUS_LABELS[job['status']]}")
+            st.progress(job["progresso"])
+            active = job["status"] in ("pendente", "processando")
+            if job["status"] == "pendente" and job["posicao"]:
+                st.caption(f"{job['posicao']} arquivo(s) de outros envios à frente na fila.")
+            if active and not job["cancelado"] and st.button("Cancelar", key=f"cancelar_{job_id}"):
+                job_queue.cancel(job_id)
+            st.dataframe(
+                [{"Arquivo": file["nome"], "Status": JOB_STATUS_LABELS[file["status"]],
+                  "Andamento": f"{file['progresso']:.0%}", "Mensagem": file["mensagem"] or ""}
+                 for file in job["arquivos"]],
+                hide_index=True,
+            )
+
+            results = job_queue.results(job_id, limit=MAX_RESULTS_SHOWN + 1)
+            if results:
+                count = str(len(results)) if len(results) <= MAX_RESULTS_SHOWN else f"{MAX_RESULTS_SHOWN}+"
+                with st.expander(f"Resultados ({count})", expanded=not active):
+                    for result in results[:MAX_RESULTS_SHOWN]:
+                        display_result(result)
+                    if len(results) > MAX_RESULTS_SHOWN:
+                        st.caption(f"Exibindo os primeiros {MAX_RESULTS_SHOWN} resultados; "
+                                   "todos os documentos foram salvos no banco de dados.")
+
+
+display_jobs()
@@ -0,0 +1,177 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from models.document_model import Documento
+
+# Colunas de texto e numéricas da tabela 'documentos', usadas no esquema Arrow.
+_FLOAT_COLUMNS = {'valor_total'}
+_INT_COLUMNS = {'id', 'duplicata_de', 'possivel_duplicata_de', 'simhash'}
+
+
+def _import_pyarrow():
+    """Importa o pyarrow (e o módulo parquet), com uma mensagem clara se ele não estiver instalado."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("A exportação para Arrow/Parquet requer o pacote opcional 'pyarrow' "
+                          "(pip install pyarrow).") from None
+    return pyarrow
+
+
+class DocumentoBatch:
+    """
+    Conjunto de documentos em formato colunar: um dicionário {coluna: lista de valores}.
+
+    Evita criar um objeto (ou um dicionário) por documento, o que torna barato carregar
+    muitos documentos do banco e convertê-los para pandas, Arrow ou Parquet. As colunas
+    seguem os nomes da tabela 'documentos'; `atributos_especificos` é mantido como texto JSON.
+
+    A exportação para Arrow/Parquet requer o pacote opcional `pyarrow`.
+    """
+
+    __slots__ = ('columns',)
+
+    def __init__(self, columns: Dict[str, List[Any]]):
+        """
+        Args:
+            columns (Dict[str, List[Any]]): Valores de cada coluna, todas com o mesmo tamanho.
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"As colunas têm tamanhos diferentes: {sorted(lengths)}")
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, column_names: Sequence[str], rows: Sequence[tuple]) -> "DocumentoBatch":
+        """Monta o lote a partir de linhas do banco (transpostas de uma vez, sem dicionários por linha)."""
+        if not rows:
+            return cls({name: [] for name in column_names})
+        return cls({name: list(values) for name, values in zip(column_names, zip(*rows))})
+
+    @classmethod
+    def from_documents(cls, docs: Iterable[Documento], include_content: bool = True) -> "DocumentoBatch":
+        """Monta o lote a partir de objetos Documento (os extras viram o JSON de atributos_especificos)."""
+        names = ['nome_arquivo', 'tipo_documento', 'data_processamento']
+        if include_content:
+            names.append('conteudo_extraido')
+        names += list(Documento.KNOWN_FIELDS)
+        columns: Dict[str, List[Any]] = {name: [] for name in names + ['atributos_especificos']}
+        for doc in docs:
+            for name in names:
+                columns[name].append(getattr(doc, name))
+            columns['atributos_especificos'].append(json.dumps(doc.extras, ensure_ascii=False, default=str))
+        columns['data_processamento'] = [str(value) for value in columns['data_processamento']]
+        return cls(columns)
+
+    @classmethod
+    def concat(cls, batches: Iterable["DocumentoBatch"]) -> "DocumentoBatch":
+        """Junta vários lotes com as mesmas colunas em um só."""
+        merged: Optional[Dict[str, List[Any]]] = None
+        for batch in batches:
+            if merged is None:
+                merged = {name: list(values) for name, values in batch.columns.items()}
+            else:
+                for name, values in batch.columns.items():
+                    merged[name].extend(values)
+        return cls(merged or {})
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), []))
+
+    def __repr__(self) -> str:
+        return f"DocumentoBatch({len(self)} documentos, colunas={list(self.columns)})"
+
+    def column(self, name: str) -> List[Any]:
+        return self.columns[name]
+
+    def iter_documents(self) -> Iterator[Documento]:
+        """Materializa os documentos um a um (apenas quando realmente for preciso um objeto)."""
+        known = [name for name in Documento.KNOWN_FIELDS if name in self.columns]
+        for position in range(len(self)):
+            extras_json = self.columns.get('atributos_especificos', [None] * len(self))[position]
+            extras = json.loads(extras_json) if extras_json else {}
+            doc = Documento(
+                nome_arquivo=self.columns['nome_arquivo'][position],
+                tipo_documento=self.columns['tipo_documento'][position],
+                **{name: self.columns[name][position] for name in known},
+                **extras,
+            )
+            if 'data_processamento' in self.columns:
+                doc.data_processamento = datetime.fromisoformat(self.columns['data_processamento'][position])
+            if 'conteudo_extraido' in self.columns:
+                doc.conteudo_extraido = self.columns['conteudo_extraido'][position]
+            for name in Documento.DUPLICATE_FIELDS:
+                if name in self.columns:
+                    setattr(doc, name, self.columns[name][position])
+            yield doc
+
+    # --- Exportação ---
+
+    def to_pandas(self, categorical: Sequence[str] = ('tipo_documento',)):
+        """
+        Converte para um DataFrame, coluna a coluna (sem montar um dicionário por linha).
+
+        Args:
+            categorical (Sequence[str]): Colunas de poucos valores distintos armazenadas como
+                                         `category` (bem menos memória em milhões de linhas).
+        """
+        import pandas as pd
+
+        df = pd.DataFrame(self.columns, copy=False)
+        for name in categorical:
+            if name in df.columns:
+                df[name] = df[name].astype('category')
+        return df
+
+    def _arrow_schema(self):
+        pa = _import_pyarrow()
+
+        fields = []
+        for name in self.columns:
+            if name in _FLOAT_COLUMNS:
+                fields.append(pa.field(name, pa.float64()))
+            elif name in _INT_COLUMNS:
+                fields.append(pa.field(name, pa.int64()))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        return pa.schema(fields)
+
+    def to_arrow(self):
+        """Converte para uma `pyarrow.Table` com esquema fixo (texto, REAL -> float64, inteiros -> int64)."""
+        pa = _import_pyarrow()
+        return pa.Table.from_pydict(self.columns, schema=self._arrow_schema())
+
+    def to_parquet(self, path: str, compression: str = 'zstd'):
+        """Grava o lote em um arquivo Parquet."""
+        pa = _import_pyarrow()
+        pa.parquet.write_table(self.to_arrow(), path, compression=compression)
+
+
+def write_parquet(batches: Iterable[DocumentoBatch], path: str, compression: str = 'zstd') -> int:
+    """
+    Grava vários lotes em um único arquivo Parquet, um row group por lote.
+
+    Apenas um lote fica em memória por vez, o que permite exportar milhões de
+    documentos (ex: `write_parquet(db_handler.iter_batches(), "documentos.parquet")`).
+
+    Returns:
+        int: A quantidade de documentos gravados.
+    """
+    pa = _import_pyarrow()
+    writer = None
+    total = 0
+    try:
+        for batch in batches:
+            if not len(batch):
+                continue
+            table = batch.to_arrow()
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(path, table.schema, compression=compression)
+            writer.write_table(table)
+            total += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
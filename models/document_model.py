@@ -1,14 +1,33 @@
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 
 class Documento:
     """
     Representa um documento processado, com campos genéricos e
     a flexibilidade para adicionar atributos específicos dinamicamente.
+
+    Os campos conhecidos ficam em slots (sem `__dict__` por instância); os demais
+    atributos vão para o dicionário `extras`, mas continuam acessíveis como atributos
+    (`doc.chave_acesso`, `setattr(doc, "origem", ...)`).
     """
 
-    def __init__(self, nome_arquivo: str, tipo_documento: str = "Não Identificado", **kwargs: Any):
+    # Campos extraídos conhecidos (os mesmos promovidos a colunas no banco) e o hash do arquivo.
+    KNOWN_FIELDS = ('numero_nf', 'cnpj_emitente', 'nome_emitente', 'cnpj_destinatario',
+                    'nome_destinatario', 'data_emissao', 'valor_total', 'hash_arquivo')
+
+    # Ligação com o documento canônico, preenchida pelo banco quando o documento é uma duplicata,
+    # e o documento de texto quase idêntico, quando há um (apenas candidato, sem ligação).
+    DUPLICATE_FIELDS = ('duplicata_de', 'tipo_duplicata', 'possivel_duplicata_de')
+
+    __slots__ = ('nome_arquivo', 'tipo_documento', 'data_processamento', 'conteudo_extraido',
+                 *KNOWN_FIELDS, *DUPLICATE_FIELDS, 'extras')
+
+    def __init__(self, nome_arquivo: str, tipo_documento: str = "Não Identificado",
+                 numero_nf: Optional[str] = None, cnpj_emitente: Optional[str] = None,
+                 nome_emitente: Optional[str] = None, cnpj_destinatario: Optional[str] = None,
+                 nome_destinatario: Optional[str] = None, data_emissao: Optional[str] = None,
+                 valor_total: Optional[float] = None, hash_arquivo: Optional[str] = None, **kwargs: Any):
         """
         Inicializa a instância do Documento.
 
@@ -16,27 +35,61 @@ class Documento:
             nome_arquivo (str): O nome original do arquivo.
             tipo_documento (str, optional): O tipo do documento (ex: "Nota Fiscal", "Contrato").
                                             Defaults to "Não Identificado".
-            **kwargs: Atributos adicionais e específicos do documento (ex: numero_nf="123", valor_total=99.90).
+            numero_nf ... valor_total: Campos extraídos conhecidos (None quando ausentes).
+            hash_arquivo (str, optional): Hash SHA-256 dos bytes do arquivo de origem.
+            **kwargs: Atributos adicionais e específicos do documento (ex: chave_acesso="3519...").
         """
         self.nome_arquivo: str = nome_arquivo
         self.tipo_documento: str = tipo_documento
         self.data_processamento: datetime = datetime.now()
         self.conteudo_extraido: str = ""  # Para armazenar o texto bruto do OCR
 
-        # Adiciona dinamicamente os atributos passados via kwargs
-        for key, value in kwargs.items():
-            setattr(self, key, value)
+        self.numero_nf = numero_nf
+        self.cnpj_emitente = cnpj_emitente
+        self.nome_emitente = nome_emitente
+        self.cnpj_destinatario = cnpj_destinatario
+        self.nome_destinatario = nome_destinatario
+        self.data_emissao = data_emissao
+        self.valor_total = valor_total
+        self.hash_arquivo = hash_arquivo
+        self.duplicata_de: Optional[int] = None  # id do documento canônico
+        self.tipo_duplicata: Optional[str] = None  # "hash" ou "chave"
+        self.possivel_duplicata_de: Optional[int] = None  # id do documento de texto quase idêntico
+
+        # Os demais atributos passados via kwargs ficam em `extras`
+        self.extras: Dict[str, Any] = dict(kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        # Chamado apenas quando o atributo não é um slot: procura nos extras
+        try:
+            return object.__getattribute__(self, 'extras')[name]
+        except (AttributeError, KeyError):
+            raise AttributeError(f"'Documento' não possui o atributo '{name}'") from None
+
+    def __setattr__(self, name: str, value: Any):
+        if name in Documento.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            self.extras[name] = value
 
     def __repr__(self) -> str:
         """Representação em string do objeto para facilitar a depuração."""
         # Exclui o conteúdo extraído para uma representação mais limpa
-        attrs_dict = self.to_dict()
-        attrs_dict.pop('conteudo_extraido', None)
-        attrs = ", ".join(f"{k}={v!r}" for k, v in attrs_dict.items())
+        attrs = ", ".join(f"{k}={v!r}" for k, v in self._iter_fields(include_content=False))
         return f"Documento({attrs})"
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Converte os atributos do objeto para um dicionário."""
-        # Coleta todos os atributos públicos do objeto
-        return {key: getattr(self, key) for key in self.__dict__ if not key.startswith('_')}
+    def _iter_fields(self, include_content: bool = True):
+        yield 'nome_arquivo', self.nome_arquivo
+        yield 'tipo_documento', self.tipo_documento
+        yield 'data_processamento', self.data_processamento
+        if include_content:
+            yield 'conteudo_extraido', self.conteudo_extraido
+        for name in Documento.KNOWN_FIELDS + Documento.DUPLICATE_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                yield name, value
+        yield from self.extras.items()
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte os atributos do objeto para um dicionário (campos conhecidos ausentes são omitidos)."""
+        return dict(self._iter_fields())
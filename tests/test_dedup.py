@@ -0,0 +1,109 @@
+import random
+
+import pytest
+
+from benchmarks.fixtures import access_key, cnpj
+from models.document_model import Documento
+from utils.database_handler import DatabaseHandler
+from utils.ingest_pipeline import UploadJobHandler
+from utils.result_cache import content_hash
+
+ISSUER = cnpj(random.Random(1))
+
+
+@pytest.fixture
+def db(tmp_path):
+    handler = DatabaseHandler(db_path=str(tmp_path / "documentos.db"))
+    yield handler
+    handler.close()
+
+
+def _nota(nome, **fields):
+    fields.setdefault("cnpj_emitente", ISSUER)
+    return Documento(nome_arquivo=nome, tipo_documento="Nota Fiscal", **fields)
+
+
+def test_same_number_without_corroboration_is_only_a_candidate(db):
+    original, other = _nota("a.pdf", numero_nf="10"), _nota("b.pdf", numero_nf="0010")
+    db.save_documents([original])
+    db.save_documents([other])
+
+    assert other.duplicata_de is None
+    assert db.get_document(other.possivel_duplicata_de)["nome_arquivo"] == "a.pdf"
+
+
+def test_same_number_and_value_is_linked(db):
+    db.save_documents([_nota("a.pdf", numero_nf="10", valor_total=150.0)])
+    other = _nota("b.pdf", numero_nf="0010", valor_total="150,00")
+    db.save_documents([other])
+
+    assert other.tipo_duplicata == "chave"
+    assert other.possivel_duplicata_de is None
+
+
+@pytest.mark.parametrize("fields", [
+    {"data_emissao": "2024-04-01"},
+    {"serie": "2"},
+    {"chave_acesso": "9" * 44},
+])
+def test_conflicting_fields_are_neither_linked_nor_candidates(db, fields):
+    rng = random.Random(2)
+    key = access_key("35", "2403", ISSUER, "55", 10, rng)
+    db.save_documents([_nota("a.xml", numero_nf="10", data_emissao="2024-03-15", serie="1", chave_acesso=key)])
+    other = _nota("b.pdf", numero_nf="10", **fields)
+    db.save_documents([other])
+
+    assert other.duplicata_de is None
+    assert other.possivel_duplicata_de is None
+
+
+class _FakeOcr:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def process_file_structured(self, file):
+        self.calls += 1
+        return self.text, None
+
+
+class _FakeTask:
+    def __init__(self):
+        self.results = []
+
+    def add_result(self, resultado):
+        self.results.append(resultado)
+
+
+def test_access_key_match_skips_the_llm(db):
+    key = access_key("35", "2403", ISSUER, "55", 10, random.Random(3))
+    db.save_documents([_nota("a.xml", numero_nf="10", chave_acesso=key)])
+    handler = UploadJobHandler(_FakeOcr(f"DANFE\nCHAVE DE ACESSO\n{key}"), db)
+
+    _, _, _, fields, _ = handler._extract(_FakeTask(), "a.pdf", b"pdf", llm_extractor=object())
+
+    assert fields["chave_acesso"] == key
+
+
+def test_labelled_number_alone_does_not_skip_the_llm(db):
+    db.save_documents([_nota("a.xml", numero_nf="10", valor_total=150.0)])
+    text = f"NOTA FISCAL Nº 10\nEMITENTE\nCNPJ: {ISSUER}\nVALOR TOTAL DA NOTA: 150,00"
+    handler = UploadJobHandler(_FakeOcr(text), db)
+
+    _, _, _, fields, _ = handler._extract(_FakeTask(), "a.pdf", b"pdf", llm_extractor=object())
+
+    assert fields is None
+
+
+def test_hash_shortcut_requires_deduplication(tmp_path):
+    db = DatabaseHandler(db_path=str(tmp_path / "documentos.db"), deduplicate=False)
+    try:
+        db.save_documents([_nota("a.pdf", numero_nf="10", hash_arquivo=content_hash(b"pdf"))])
+        ocr = _FakeOcr("texto")
+        handler = UploadJobHandler(ocr, db)
+
+        handler._extract(_FakeTask(), "a.pdf", b"pdf", llm_extractor=None)
+
+        assert ocr.calls == 1
+    finally:
+        db.close()
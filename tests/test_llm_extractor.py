@@ -0,0 +1,69 @@
+from benchmarks.stub_llm_server import STUB_DETAILS, run_stub_server
+from utils.llm_extractor import LlmExtractor
+from utils.result_cache import ResultCache
+
+
+def _texts(count):
+    # O número da NF é extraído localmente (e prevalece sobre a resposta do stub), o que
+    # identifica cada resultado
+    return [f"NOTA FISCAL Nº {number}\nEmpresa Exemplo LTDA" for number in range(1, count + 1)]
+
+
+def _extractor(server, **kwargs):
+    kwargs.setdefault("max_concurrency", 8)
+    return LlmExtractor(api_key="teste", base_url=server.base_url, requests_per_minute=None,
+                        tokens_per_minute=None, backoff_base=0.01, backoff_max=0.05, **kwargs)
+
+
+def test_results_follow_input_order():
+    with run_stub_server(latency=0.02) as server:
+        extractor = _extractor(server)
+        try:
+            results = extractor.extract_details_many(_texts(20))
+        finally:
+            extractor.close()
+
+    assert [result["numero_nf"] for result in results] == [str(number) for number in range(1, 21)]
+    assert all(result["cnpj_emitente"] == STUB_DETAILS["cnpj_emitente"] for result in results)
+    assert server.request_count == 20
+
+
+def test_errors_are_retried():
+    with run_stub_server(error_rate=0.5, seed=1) as server:
+        extractor = _extractor(server, max_retries=20)
+        try:
+            results = extractor.extract_details_many(_texts(20))
+        finally:
+            extractor.close()
+
+    assert all(isinstance(result, dict) for result in results)
+    assert server.request_count > 20
+
+
+def test_exhausted_retries_return_the_error_in_place():
+    with run_stub_server(error_rate=1.0) as server:
+        extractor = _extractor(server, max_retries=1)
+        try:
+            results = extractor.extract_details_many(_texts(3))
+        finally:
+            extractor.close()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert server.request_count == 6
+
+
+def test_cached_texts_skip_the_api(tmp_path):
+    cache = ResultCache(db_path=str(tmp_path / "cache.db"))
+    with run_stub_server() as server:
+        extractor = _extractor(server, cache=cache)
+        try:
+            first = extractor.extract_details_many(_texts(5))
+            second = extractor.extract_details_many(_texts(5))
+            single = extractor.extract_details(_texts(1)[0])
+        finally:
+            extractor.close()
+            cache.close()
+
+    assert server.request_count == 5
+    assert second == first
+    assert single == first[0]
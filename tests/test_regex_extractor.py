@@ -0,0 +1,49 @@
+from utils.regex_extractor import extract_hints, pre_extract
+
+ISSUER = "11.222.333/0001-81"
+RECIPIENT = "11.444.777/0001-61"
+CPF = "529.982.247-25"
+
+
+def test_issue_date_requires_the_label():
+    assert "data_emissao" not in pre_extract("Vencimento: 10/05/2024")
+    assert pre_extract("DATA DE EMISSÃO\n15.03.2024")["data_emissao"] == "2024-03-15"
+
+
+def test_issue_date_far_from_the_label_is_ignored():
+    text = "DATA DE EMISSÃO" + " " * 100 + "15/03/2024"
+    assert "data_emissao" not in pre_extract(text)
+
+
+def test_note_total_wins_over_item_totals():
+    text = "ITEM 1  VALOR TOTAL: 10,00\nITEM 2  VALOR TOTAL: 20,00\nVALOR TOTAL DA NOTA: R$ 1.500,00"
+    fields = pre_extract(text)
+    assert fields["valor_total"] == 1500.0
+    assert extract_hints(text)["valor_total"] == ["10,00", "20,00"]
+
+
+def test_note_total_must_be_on_the_same_line():
+    fields = pre_extract("VALOR TOTAL DA NOTA\nQUANTIDADE\n3,00")
+    assert "valor_total" not in fields
+
+
+def test_generic_total_is_only_a_hint():
+    text = "TOTAL A PAGAR: 99,90"
+    assert "valor_total" not in pre_extract(text)
+    assert extract_hints(text)["valor_total"] == ["99,90"]
+
+
+def test_recipient_document_must_be_near_its_label():
+    near = pre_extract(f"DESTINATÁRIO / REMETENTE\nCNPJ: {RECIPIENT}")
+    far = pre_extract("DESTINATÁRIO\n" + "x" * 250 + f"\nCNPJ: {RECIPIENT}")
+    other_section = pre_extract(f"DESTINATÁRIO\nNOME\nTRANSPORTADOR\nCNPJ: {RECIPIENT}")
+    assert near["cnpj_destinatario"] == "11444777000161"
+    assert "cnpj_destinatario" not in far
+    assert "cnpj_destinatario" not in other_section
+
+
+def test_emitter_requires_a_cnpj_after_its_label():
+    assert pre_extract(f"EMITENTE\nCNPJ: {ISSUER}")["cnpj_emitente"] == "11222333000181"
+    assert "cnpj_emitente" not in pre_extract(f"EMITENTE\nCPF: {CPF}")
+    assert "cnpj_emitente" not in pre_extract(f"CNPJ: {ISSUER}")
+    assert extract_hints(f"CNPJ: {ISSUER}")["cnpj_cpf"] == ["11222333000181"]
@@ -1,6 +1,12 @@
+import re
+import sqlite3
+import time
+import unicodedata
+from datetime import date
 import pandas as pd
 
-from typing import Type
+from contextlib import closing
+from typing import List, Optional, Type
 from langchain.agents import Tool
 from langchain.globals import set_debug
 from langchain_core.prompts import PromptTemplate
@@ -8,60 +14,38 @@ from langchain_experimental.tools import PythonAstREPLTool
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain_core.language_models.chat_models import BaseChatModel
 
-class AgenteDataFrame:
+from utils.result_cache import ResultCache, text_hash
 
-    # Vamos utilizar injeção de dependência no construtor, para conseguimos,
-    # trocar a LLM usada e o DataFrame sem ter que alterar nosso código do
-    # Agente. :)
-    def __init__(self, llm:Type[BaseChatModel], df:pd.DataFrame) -> None:
-        self.__df = df
-        self.__llm = llm
+# Apenas consultas de leitura (SELECT ou WITH ... SELECT) são aceitas pela ferramenta SQL.
+_CONSULTA_LEITURA = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+# Tabelas internas do SQLite, do índice FTS5 e do índice SimHash que não interessam ao agente.
+_TABELAS_INTERNAS = re.compile(r"^(sqlite_|documentos_fts_|simhash_faixas$)")
 
-    # Não vamos criar do zero a ferramenta o LangChain tem várias prontas! :)
-    # https://python.langchain.com/docs/integrations/tools/
-    @property
-    def ferramentas(self) -> None:
-        """
-        Adiciona uma ferramenta ao agente.
-        """
-        return  [
-                    Tool(
-                        name="Códigos Python",
-                        func=PythonAstREPLTool(locals={"df": self.__df}),
-                        description="""Utilize esta ferramenta sempre que o usuário solicitar cálculos, consultas ou transformações
-                        específicas usando Python diretamente sobre o DataFrame `df`.
-                        Exemplos de uso incluem: "Qual é a média da coluna X?", "Quais são os valores únicos da coluna Y?",
-                        "Qual a correlação entre A e B?". Evite utilizar esta ferramenta para solicitações mais amplas ou descritivas,
-                        como informações gerais sobre o DataFrame, resumos estatísticos completos ou geração de gráficos — nesses casos,
-                        use as ferramentas apropriadas."""
-                    )
-                ]
+# Namespaces do ResultCache: respostas finais e observações da ferramenta SQL.
+CACHE_NAMESPACE_RESPOSTAS = "agente"
+CACHE_NAMESPACE_FERRAMENTAS = "agente_ferramentas"
 
-    # Vamos criar o nosso prompt, baseado no ReAct (Reasoning + Acting)
-    # O agente, a cada passo, faz:
-    #   1. Pensamento (Thought / Reasoning): O LLM escreve o raciocínio do que está tentando fazer.
-    #   2. Ação (Action): O LLM escolhe uma ferramenta e uma entrada (exemplo: chamar uma API, consultar um banco de dados,
-    #      ler um PDF, fazer uma consulta SQL).
-    #   3. Observação (Observation): O agente recebe a resposta da ferramenta (exemplo:
-    #      "Resposta da API: 123 resultados encontrados").
-    #   4. Volta ao passo 1 até chegar a uma Resposta Final (Final Answer).
-    @property
-    def react_prompt(self) -> str:
-        """
-        Define o prompt para o agente.
-        """
-        df_head:str = self.__df.head().to_markdown()
-        return PromptTemplate(
-                    input_variables=["input", "agent_scratchpad", "tools", "tool_names"],
-                    partial_variables={"df_head": df_head},
-                    template = """
-                        Você é um assistente que sempre responde em português.
+# Termos de datas relativas (na pergunta já normalizada): a resposta depende do dia em que é feita.
+_DATA_RELATIVA = re.compile(
+    r"\b(hoje|ontem|amanha|agora|atual|atuais|recentes?|ultim[oa]s?|passad[oa]s?|proxim[oa]s?|"
+    r"corrente|est[ea]s?|nest[ea]s?|dest[ea]s?)\b"
+)
 
-                        Você tem acesso a um dataframe pandas chamado `df`.
-                        Aqui estão as primeiras linhas do DataFrame, obtidas com `df.head().to_markdown()`:
 
-                        {df_head}
+def normalizar_pergunta(pergunta: str) -> str:
+    """
+    Normaliza a pergunta para a chave do cache: apenas caixa, acentos e espaços.
+
+    Pontuação, operadores e números são mantidos como estão ("valor > 1000" e
+    "valor < 1000" são perguntas diferentes).
+    """
+    texto = unicodedata.normalize("NFKD", pergunta.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
 
+# Parte comum do prompt ReAct; o contexto muda conforme o modo (DataFrame ou SQL).
+_FORMATO_REACT = """
                         Responda às seguintes perguntas da melhor forma possível.
 
                         Para isso, você tem acesso às seguintes ferramentas:
@@ -83,13 +67,319 @@ class AgenteDataFrame:
 
                         Question: {input}
                         Thought: {agent_scratchpad}"""
+
+_CONTEXTO_DATAFRAME = """
+                        Você é um assistente que sempre responde em português.
+
+                        Você tem acesso a um dataframe pandas chamado `df`.
+                        Aqui estão as primeiras linhas do DataFrame, obtidas com `df.head().to_markdown()`:
+
+                        {contexto}
+"""
+
+_CONTEXTO_SQL = """
+                        Você é um assistente que sempre responde em português.
+
+                        Você tem acesso, somente para leitura, a um banco SQLite com os documentos processados.
+                        Aqui está o esquema das tabelas, seguido de algumas linhas de exemplo:
+
+                        {contexto}
+
+                        Sempre faça os filtros, agrupamentos e agregações (WHERE, GROUP BY, SUM, COUNT...) na
+                        própria consulta SQL: o banco pode ter milhões de documentos e apenas as primeiras
+                        linhas do resultado são devolvidas. Valores monetários estão em `valor_total` (REAL),
+                        datas em `data_emissao` (texto ISO, AAAA-MM-DD) e CNPJs apenas com dígitos.
+                        Documentos recebidos mais de uma vez aparecem como cópias (`duplicata_de` preenchido):
+                        para contagens e somas, consulte a visão `documentos_unicos`, que as exclui.
+                        `possivel_duplicata_de` apenas indica um texto parecido: esses documentos são distintos.
+"""
+
+
+class AgenteDataFrame:
+
+    # Vamos utilizar injeção de dependência no construtor, para conseguimos,
+    # trocar a LLM usada e o DataFrame sem ter que alterar nosso código do
+    # Agente. :)
+    # Para bases grandes, passe `db_path` em vez do DataFrame: o agente consulta o
+    # SQLite diretamente (somente leitura), sem carregar todas as linhas na memória.
+    def __init__(self, llm:Type[BaseChatModel], df:Optional[pd.DataFrame]=None, db_path:Optional[str]=None,
+                 max_linhas:int=200, timeout_consulta:float=10.0, cache:Optional[ResultCache]=None) -> None:
+        """
+        Args:
+            llm (BaseChatModel): O modelo de chat usado pelo agente.
+            df (pd.DataFrame, optional): DataFrame consultado com código Python (modo DataFrame).
+            db_path (str, optional): Banco SQLite consultado com SQL somente leitura (modo SQL).
+            max_linhas (int): Quantidade máxima de linhas devolvidas por consulta SQL.
+            timeout_consulta (float): Tempo máximo, em segundos, de cada consulta SQL.
+            cache (ResultCache, optional): Cache das respostas (e, no modo SQL, dos resultados
+                                           das consultas), invalidado quando os dados mudam.
+                                           Use um ResultCache próprio para limitar seu tamanho
+                                           separadamente dos resultados de OCR/LLM.
+        """
+        if (df is None) == (db_path is None):
+            raise ValueError("Informe exatamente um entre `df` e `db_path`.")
+        self.__df = df
+        self.__db_path = db_path
+        self.__llm = llm
+        self.max_linhas = max_linhas
+        self.timeout_consulta = timeout_consulta
+        self.cache = cache
+        self.__versao_dados: Optional[str] = None
+
+        # Ferramentas, prompt e executor são montados uma única vez por versão do esquema
+        self.__versao: Optional[tuple] = None
+        self.__ferramentas: Optional[List[Tool]] = None
+        self.__prompt: Optional[PromptTemplate] = None
+        self.__executor: Optional[AgentExecutor] = None
+        self.__repl: Optional[PythonAstREPLTool] = None
+
+    @property
+    def modo_sql(self) -> bool:
+        return self.__db_path is not None
+
+    # --- Versão do esquema ---
+
+    def _versao_esquema(self) -> tuple:
+        """
+        Identifica o esquema atual dos dados. Quando muda (outro DataFrame, colunas ou
+        tipos diferentes, migração do banco), as ferramentas e o prompt são refeitos.
+        """
+        if self.modo_sql:
+            with closing(self._conectar()) as conn:
+                # schema_version muda a cada CREATE/ALTER/DROP no banco
+                return ("sql", conn.execute("PRAGMA schema_version;").fetchone()[0])
+        return ("df", id(self.__df), tuple(self.__df.columns), tuple(map(str, self.__df.dtypes)))
+
+    def _versao_dados(self) -> str:
+        """
+        Impressão digital dos dados: muda sempre que documentos são gravados (ou o
+        DataFrame é alterado), invalidando as respostas e observações em cache.
+        """
+        if self.modo_sql:
+            with closing(self._conectar()) as conn:
+                esquema = conn.execute("PRAGMA schema_version;").fetchone()[0]
+                total, ultimo_id = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM documentos;").fetchone()
+            return f"sql:{esquema}:{total}:{ultimo_id}"
+        try:
+            conteudo = int(pd.util.hash_pandas_object(self.__df, index=True).sum())
+        except TypeError:
+            # Colunas com valores não hasheáveis (listas, dicionários): apenas a identidade do objeto
+            conteudo = id(self.__df)
+        colunas = ",".join(map(str, self.__df.columns))
+        return f"df:{self.__df.shape}:{text_hash(colunas)[:16]}:{conteudo}"
+
+    def _atualizar_cache(self):
+        versao = self._versao_esquema()
+        if versao != self.__versao:
+            self.__versao = versao
+            self.__ferramentas = None
+            self.__prompt = None
+            self.__executor = None
+
+    # --- Modo SQL ---
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre o banco em modo somente leitura (a escrita falha mesmo que a consulta tente)."""
+        conn = sqlite3.connect(f"file:{self.__db_path}?mode=ro", uri=True)
+        conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    def _esquema_sql(self) -> str:
+        """Descreve as tabelas (CREATE TABLE) e algumas linhas de exemplo de `documentos`."""
+        with closing(self._conectar()) as conn:
+            tabelas = [(nome, sql) for nome, sql in conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'view') ORDER BY name;")
+                if sql and not _TABELAS_INTERNAS.match(nome)]
+            colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(documentos);")
+                       if linha[1] not in ("conteudo_extraido", "atributos_especificos", "simhash")]
+            exemplo = pd.read_sql_query(f"SELECT {', '.join(colunas)} FROM documentos ORDER BY id DESC LIMIT 3;",
+                                        conn) if colunas else None
+
+        partes = [sql.strip() + ";" for _, sql in tabelas]
+        if exemplo is not None and not exemplo.empty:
+            partes.append(exemplo.to_markdown(index=False))
+        return "\n\n".join(partes)
+
+    @staticmethod
+    def _limpar_consulta(consulta: str) -> str:
+        """Remove cercas de markdown (```sql) e o ponto e vírgula final que o LLM costuma incluir."""
+        consulta = consulta.strip().strip("`").strip()
+        if consulta.lower().startswith("sql"):
+            consulta = consulta[3:]
+        return consulta.strip().rstrip(";").strip()
+
+    def executar_sql(self, consulta: str) -> str:
+        """
+        Executa uma consulta somente leitura e devolve o resultado como tabela markdown.
+
+        Erros são devolvidos como texto (e não como exceção) para que o agente possa
+        corrigir a consulta no passo seguinte.
+        """
+        consulta = self._limpar_consulta(consulta)
+        if not _CONSULTA_LEITURA.match(consulta) or ";" in consulta:
+            return "Erro: apenas uma única consulta SELECT (ou WITH ... SELECT) é permitida."
+
+        limite = time.monotonic() + self.timeout_consulta
+        try:
+            with closing(self._conectar()) as conn:
+                # Interrompe consultas longas demais (retornar 1 aborta a execução)
+                conn.set_progress_handler(lambda: 1 if time.monotonic() > limite else 0, 10000)
+                cursor = conn.execute(consulta)
+                colunas = [descricao[0] for descricao in cursor.description or []]
+                linhas = cursor.fetchmany(self.max_linhas + 1)
+        except sqlite3.Error as e:
+            if time.monotonic() > limite:
+                return f"Erro: a consulta excedeu {self.timeout_consulta:.0f}s. Use filtros ou agregações."
+            return f"Erro ao executar a consulta: {e}"
+
+        if not linhas:
+            return "A consulta não retornou linhas."
+        truncado = len(linhas) > self.max_linhas
+        resultado = pd.DataFrame(linhas[:self.max_linhas], columns=colunas).to_markdown(index=False)
+        if truncado:
+            resultado += (f"\n\n(Resultado truncado em {self.max_linhas} linhas; "
+                          "agregue ou filtre na consulta para ver o restante.)")
+        return resultado
+
+    def _executar_sql_com_cache(self, consulta: str) -> str:
+        """Consulta SQL reaproveitando observações anteriores sobre a mesma versão dos dados."""
+        if self.cache is None or self.__versao_dados is None:
+            return self.executar_sql(consulta)
+        chave = text_hash(self.__versao_dados, " ".join(self._limpar_consulta(consulta).split()))
+        resultado = self.cache.get(CACHE_NAMESPACE_FERRAMENTAS, chave)
+        if resultado is None:
+            resultado = self.executar_sql(consulta)
+            if not resultado.startswith("Erro"):
+                self.cache.set(CACHE_NAMESPACE_FERRAMENTAS, chave, resultado)
+        return resultado
+
+    # Não vamos criar do zero a ferramenta o LangChain tem várias prontas! :)
+    # https://python.langchain.com/docs/integrations/tools/
+    @property
+    def ferramentas(self) -> List[Tool]:
+        """
+        Adiciona uma ferramenta ao agente (criada uma única vez por versão do esquema).
+        """
+        self._atualizar_cache()
+        if self.__ferramentas is not None:
+            return self.__ferramentas
+
+        if self.modo_sql:
+            self.__ferramentas = [
+                Tool(
+                    name="Consulta SQL",
+                    func=self._executar_sql_com_cache,
+                    description=f"""Utilize esta ferramenta para consultar o banco SQLite de documentos com uma única
+                    instrução SELECT (somente leitura). Faça filtros, agrupamentos e agregações na própria consulta,
+                    por exemplo: "SELECT nome_emitente, SUM(valor_total) FROM documentos_unicos GROUP BY nome_emitente".
+                    Para buscar palavras no texto dos documentos, use a tabela documentos_fts com MATCH.
+                    No máximo {self.max_linhas} linhas são devolvidas."""
                 )
+            ]
+        else:
+            self.__repl = PythonAstREPLTool(locals={"df": self.__df})
+            self.__ferramentas = [
+                Tool(
+                    name="Códigos Python",
+                    func=self.__repl,
+                    description="""Utilize esta ferramenta sempre que o usuário solicitar cálculos, consultas ou transformações
+                    específicas usando Python diretamente sobre o DataFrame `df`.
+                    Exemplos de uso incluem: "Qual é a média da coluna X?", "Quais são os valores únicos da coluna Y?",
+                    "Qual a correlação entre A e B?". Evite utilizar esta ferramenta para solicitações mais amplas ou descritivas,
+                    como informações gerais sobre o DataFrame, resumos estatísticos completos ou geração de gráficos — nesses casos,
+                    use as ferramentas apropriadas."""
+                )
+            ]
+        return self.__ferramentas
 
-    def executar(self, pergunta:str) -> dict[str,str]:
+    # Vamos criar o nosso prompt, baseado no ReAct (Reasoning + Acting)
+    # O agente, a cada passo, faz:
+    #   1. Pensamento (Thought / Reasoning): O LLM escreve o raciocínio do que está tentando fazer.
+    #   2. Ação (Action): O LLM escolhe uma ferramenta e uma entrada (exemplo: chamar uma API, consultar um banco de dados,
+    #      ler um PDF, fazer uma consulta SQL).
+    #   3. Observação (Observation): O agente recebe a resposta da ferramenta (exemplo:
+    #      "Resposta da API: 123 resultados encontrados").
+    #   4. Volta ao passo 1 até chegar a uma Resposta Final (Final Answer).
+    @property
+    def react_prompt(self) -> PromptTemplate:
+        """
+        Define o prompt para o agente (renderizado uma única vez por versão do esquema).
+        """
+        self._atualizar_cache()
+        if self.__prompt is not None:
+            return self.__prompt
+
+        if self.modo_sql:
+            template, contexto = _CONTEXTO_SQL, self._esquema_sql()
+        else:
+            template, contexto = _CONTEXTO_DATAFRAME, self.__df.head().to_markdown()
+        self.__prompt = PromptTemplate(
+                    input_variables=["input", "agent_scratchpad", "tools", "tool_names"],
+                    partial_variables={"contexto": contexto},
+                    template=template + _FORMATO_REACT
+                )
+        return self.__prompt
+
+    @property
+    def executor(self) -> AgentExecutor:
+        """
+        O AgentExecutor, reaproveitado entre as perguntas enquanto o esquema não mudar.
+        """
+        self._atualizar_cache()
+        if self.__executor is None:
+            agente = create_react_agent(llm=self.__llm, tools=self.ferramentas, prompt=self.react_prompt)
+            # Os passos intermediários trazem o código/SQL gerado, guardado junto com a resposta
+            self.__executor = AgentExecutor(agent=agente, tools=self.ferramentas, handle_parsing_errors=True,
+                                            return_intermediate_steps=True)
+        return self.__executor
+
+    def executar(self, pergunta:str) -> dict:
         """
         Executa o agente com a entrada fornecida.
+
+        Com um cache configurado, perguntas equivalentes (ver `normalizar_pergunta`) sobre
+        a mesma versão dos dados são respondidas sem chamar o LLM. Perguntas com datas
+        relativas ("hoje", "este mês", "último"...) só são reaproveitadas no mesmo dia.
+
+        Returns:
+            dict: "input", "output", "passos" (ferramenta e entrada de cada ação, ex: o código
+                  Python ou o SQL gerado) e "cache" (True se a resposta veio do cache).
         """
-        agente = create_react_agent(llm=self.__llm, tools=self.ferramentas, prompt=self.react_prompt)
-        executor = AgentExecutor(agent=agente, tools=self.ferramentas, handle_parsing_errors=True)
+        chave = None
+        if self.cache is not None:
+            self.__versao_dados = self._versao_dados()
+            normalizada = normalizar_pergunta(pergunta)
+            # "notas deste mês" muda de resposta com o passar dos dias, mesmo sem dados novos
+            dia = date.today().isoformat() if _DATA_RELATIVA.search(normalizada) else ""
+            chave = text_hash(self.__versao_dados, dia, normalizada)
+            em_cache = self.cache.get(CACHE_NAMESPACE_RESPOSTAS, chave)
+            if em_cache is not None:
+                return {"input": pergunta, **em_cache, "cache": True}
+
+        executor = self.executor
+        if self.__repl is not None:
+            # Cada pergunta começa do DataFrame original: variáveis (ou um `df` filtrado)
+            # criadas por uma resposta não valem para as seguintes
+            self.__repl.locals = {"df": self.__df}
+            self.__repl.globals = {}
         resposta = executor.invoke({"input": pergunta})
-        return resposta
\ No newline at end of file
+        passos = [{"ferramenta": acao.tool, "entrada": str(acao.tool_input)}
+                  for acao, _ in resposta.get("intermediate_steps", [])]
+        resultado = {"output": resposta["output"], "passos": passos}
+
+        # Respostas interrompidas (limite de iterações/tempo) não são guardadas
+        if chave is not None and not resposta["output"].startswith("Agent stopped"):
+            self.cache.set(CACHE_NAMESPACE_RESPOSTAS, chave, resultado)
+        return {"input": pergunta, **resultado, "cache": False}
+
+    def estatisticas_cache(self) -> dict:
+        """Acertos, falhas e taxa de acerto do cache de respostas e de observações nesta sessão."""
+        if self.cache is None:
+            return {}
+        estatisticas = {}
+        for namespace, contadores in self.cache.stats().items():
+            if namespace in (CACHE_NAMESPACE_RESPOSTAS, CACHE_NAMESPACE_FERRAMENTAS):
+                total = contadores["hits"] + contadores["misses"]
+                estatisticas[namespace] = {**contadores,
+                                           "taxa_acerto": round(contadores["hits"] / total, 3) if total else 0.0}
+        return estatisticas
@@ -0,0 +1,170 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import IO, Iterator, List, Optional, Tuple, Union
+
+# Tamanho dos blocos lidos de cada membro do ZIP.
+_CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveLimitError(ValueError):
+    """O arquivo compactado excede os limites de segurança (possível zip bomb)."""
+
+
+class ArchiveMember:
+    """
+    Um arquivo extraído de um ZIP, com a mesma interface do UploadedFile do Streamlit
+    (`name` e `getvalue()`), de modo que pode ser passado a `OcrProcessor.process_file`.
+    """
+
+    def __init__(self, name: str, path: str, data: bytes, progress: float):
+        """
+        Args:
+            name (str): Nome do arquivo, sem diretórios.
+            path (str): Caminho completo dentro do ZIP (ZIPs internos separados por "!").
+            data (bytes): Conteúdo descompactado.
+            progress (float): Fração (0 a 1) das entradas do ZIP principal já percorridas.
+        """
+        self.name = name
+        self.path = path
+        self.size = len(data)
+        self.progress = progress
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+    def __repr__(self) -> str:
+        return f"ArchiveMember(path={self.path!r}, size={self.size})"
+
+
+class ZipStreamReader:
+    """
+    Percorre um ZIP (inclusive ZIPs dentro de ZIPs) entregando um membro por vez.
+
+    O ZIP é lido diretamente do disco ou do objeto de arquivo recebido, sem carregar o
+    arquivo inteiro em memória; somente o membro atual é descompactado. Fluxos que não
+    permitem `seek` são copiados antes para um arquivo temporário (SpooledTemporaryFile).
+    ZIPs internos também são descompactados para arquivos temporários.
+
+    Limites de segurança (zip bomb):
+      * `max_member_size`: membros maiores são pulados (registrados em `skipped`);
+      * `max_total_size`: o total descompactado acima do limite interrompe a leitura;
+      * `max_ratio`: membros com taxa de compressão acima do limite são pulados;
+      * `max_depth`: profundidade máxima de ZIPs aninhados.
+    Os tamanhos declarados no ZIP não são confiáveis, por isso os limites também são
+    verificados durante a descompactação. ZIPs internos não entram em `max_total_size`:
+    contam apenas os membros extraídos deles.
+    """
+
+    def __init__(self, source: Union[str, IO[bytes]], max_member_size: int = 200 * 1024 * 1024,
+                 max_total_size: int = 2 * 1024 * 1024 * 1024, max_ratio: float = 200.0,
+                 max_depth: int = 3, spool_size: int = 32 * 1024 * 1024):
+        """
+        Args:
+            source (str | IO[bytes]): Caminho do ZIP ou objeto de arquivo (ex: UploadedFile).
+            max_member_size (int): Tamanho máximo descompactado de cada membro, em bytes.
+            max_total_size (int): Tamanho máximo descompactado somando todos os membros.
+            max_ratio (float): Taxa máxima de compressão (descompactado/compactado) por membro.
+            max_depth (int): Quantidade máxima de níveis de ZIPs aninhados.
+            spool_size (int): Tamanho a partir do qual os temporários vão para o disco.
+        """
+        self.source = source
+        self.max_member_size = max_member_size
+        self.max_total_size = max_total_size
+        self.max_ratio = max_ratio
+        self.max_depth = max_depth
+        self.spool_size = spool_size
+
+        self.total_bytes = 0
+        self.skipped: List[Tuple[str, str]] = []  # (caminho, motivo)
+
+    def _open_source(self) -> IO[bytes]:
+        if isinstance(self.source, (str, os.PathLike)):
+            return open(self.source, "rb")
+        stream = self.source
+        if hasattr(stream, "seekable") and stream.seekable():
+            stream.seek(0)
+            return stream
+        spooled = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        shutil.copyfileobj(stream, spooled, _CHUNK_SIZE)
+        spooled.seek(0)
+        return spooled
+
+    def _check_member(self, info: zipfile.ZipInfo, nested: bool) -> Optional[str]:
+        """Retorna o motivo para pular o membro, ou None. Erros graves levantam ArchiveLimitError."""
+        if info.file_size > self.max_member_size:
+            return f"excede {self.max_member_size} bytes"
+        if info.compress_size and info.file_size / info.compress_size > self.max_ratio:
+            return f"taxa de compressão suspeita ({info.file_size / info.compress_size:.0f}:1)"
+        if not nested and self.total_bytes + info.file_size > self.max_total_size:
+            raise ArchiveLimitError(f"O conteúdo descompactado excede {self.max_total_size} bytes.")
+        return None
+
+    def _copy_limited(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, path: str, output: IO[bytes],
+                      nested: bool = False):
+        """
+        Descompacta o membro em blocos, verificando os limites pelo tamanho real.
+
+        Um ZIP interno (`nested`) não soma em `total_bytes`: seus membros são contados
+        quando forem extraídos.
+        """
+        written = 0
+        with zip_ref.open(info) as member_stream:
+            while True:
+                chunk = member_stream.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > self.max_member_size:
+                    raise ArchiveLimitError(f"'{path}' excede {self.max_member_size} bytes ao ser "
+                                            f"descompactado (o ZIP declara {info.file_size} bytes).")
+                if not nested and self.total_bytes + written > self.max_total_size:
+                    raise ArchiveLimitError(f"O conteúdo descompactado excede {self.max_total_size} bytes.")
+                output.write(chunk)
+        if not nested:
+            self.total_bytes += written
+
+    def _iter_zip(self, stream: IO[bytes], prefix: str, depth: int,
+                  progress_range: Tuple[float, float]) -> Iterator[ArchiveMember]:
+        with zipfile.ZipFile(stream, "r") as zip_ref:
+            entries = [info for info in zip_ref.infolist()
+                       # Ignorar diretórios e arquivos ocultos do macOS
+                       if not info.is_dir() and not info.filename.startswith("__MACOSX")]
+            start, end = progress_range
+            step = (end - start) / len(entries) if entries else 0.0
+
+            for position, info in enumerate(entries):
+                path = f"{prefix}{info.filename}"
+                member_range = (start + position * step, start + (position + 1) * step)
+                nested = info.filename.lower().endswith(".zip")
+                reason = self._check_member(info, nested)
+                if reason:
+                    print(f"  Ignorando '{path}': {reason}.")
+                    self.skipped.append((path, reason))
+                    continue
+
+                if nested:
+                    if depth >= self.max_depth:
+                        self.skipped.append((path, "profundidade máxima de ZIPs aninhados"))
+                        continue
+                    with tempfile.SpooledTemporaryFile(max_size=self.spool_size) as inner:
+                        self._copy_limited(zip_ref, info, path, inner, nested=True)
+                        inner.seek(0)
+                        yield from self._iter_zip(inner, f"{path}!", depth + 1, member_range)
+                    continue
+
+                # O membro atual (limitado a max_member_size) é o único mantido em memória
+                buffer = io.BytesIO()
+                self._copy_limited(zip_ref, info, path, buffer)
+                yield ArchiveMember(os.path.basename(info.filename), path, buffer.getvalue(), member_range[1])
+
+    def __iter__(self) -> Iterator[ArchiveMember]:
+        stream = self._open_source()
+        try:
+            yield from self._iter_zip(stream, "", 1, (0.0, 1.0))
+        finally:
+            if stream is not self.source:
+                stream.close()
@@ -1,31 +1,142 @@
+import atexit
 import json
 import sqlite3
-from typing import Dict
+import threading
+import weakref
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from models.document_batch import DocumentoBatch
 from models.document_model import Documento
+from utils.dedup import (CONFLICT_FIELDS, MAX_DISTANCE, fields_conflict, hamming_distance, same_document, simhash,
+                         simhash_bands)
+from utils.field_normalizers import normalize_cnpj, normalize_date, normalize_decimal, normalize_document_number
+from utils.metrics import metrics
+
+# Campos fixos presentes em todo Documento.
+FIXED_FIELDS = ['nome_arquivo', 'tipo_documento', 'data_processamento', 'conteudo_extraido']
+
+# Campos extraídos conhecidos, armazenados em colunas próprias (tipadas e indexadas)
+# em vez de no JSON de 'atributos_especificos'. Mapeia o nome para o tipo SQLite.
+PROMOTED_FIELDS = {
+    'numero_nf': 'TEXT',
+    'cnpj_emitente': 'TEXT',
+    'nome_emitente': 'TEXT',
+    'cnpj_destinatario': 'TEXT',
+    'nome_destinatario': 'TEXT',
+    'data_emissao': 'TEXT',  # ISO AAAA-MM-DD
+    'valor_total': 'REAL',
+}
+
+# Normalização aplicada a cada campo promovido antes da gravação.
+_FIELD_NORMALIZERS = {
+    'numero_nf': normalize_document_number,
+    'cnpj_emitente': normalize_cnpj,
+    'cnpj_destinatario': normalize_cnpj,
+    'data_emissao': normalize_date,
+    'valor_total': normalize_decimal,
+}
+
+_INDEXED_FIELDS = ['numero_nf', 'cnpj_emitente', 'cnpj_destinatario', 'data_emissao', 'valor_total']
+
+# Hash SHA-256 dos bytes do arquivo de origem, usado para retomar ingestões interrompidas.
+HASH_FIELD = 'hash_arquivo'
+
+# Ligação de duplicatas ao documento canônico, candidato a duplicata (texto quase idêntico) e
+# impressão SimHash do conteúdo (ver utils/dedup.py).
+DEDUP_COLUMNS = ['duplicata_de', 'tipo_duplicata', 'possivel_duplicata_de', 'simhash']
+
+_INSERT_COLUMNS = FIXED_FIELDS + list(PROMOTED_FIELDS) + [HASH_FIELD, 'atributos_especificos'] + DEDUP_COLUMNS
+
+# Máximo de documentos candidatos (mesma faixa SimHash) comparados por busca de quase duplicatas.
+_MAX_SIMHASH_CANDIDATES = 500
+
+# Handlers ainda abertos. A referência fraca não os mantém vivos; os que sobrarem ao
+# encerrar o processo têm o buffer gravado por _close_open_handlers.
+_open_handlers: "weakref.WeakSet[DatabaseHandler]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_handlers():
+    for handler in list(_open_handlers):
+        handler.close()
+
+
+def _identity_fields(promoted: Dict[str, Any], tipo_documento: Any, extras: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos normalizados que identificam a nota: os promovidos, o tipo, a chave de acesso e a série."""
+    fields = dict(promoted)
+    fields['tipo_documento'] = tipo_documento
+    fields['chave_acesso'] = normalize_cnpj(extras.get('chave_acesso'))
+    fields['serie'] = normalize_document_number(extras.get('serie'))
+    return fields
+
+
+def _normalize_field(name: str, value: Any) -> Any:
+    """Normaliza o valor de um campo promovido (CNPJ só com dígitos, data ISO, valor numérico)."""
+    if value is None or value == "":
+        return None
+    normalizer = _FIELD_NORMALIZERS.get(name)
+    if normalizer is not None:
+        return normalizer(value)
+    return str(value)
 
 
 class DatabaseHandler:
     """
     Gerencia a conexão e as operações com o banco de dados SQLite.
+
+    Uma única conexão de longa duração (em modo WAL) é compartilhada entre as threads.
+    Os documentos salvos individualmente ficam em um buffer e são gravados em lote,
+    numa única transação, quando o buffer enche ou quando `flush()` é chamado.
+
+    Documentos repetidos (o mesmo arquivo ou a mesma nota em outro formato) são gravados
+    apenas como uma ligação ao documento canônico (coluna `duplicata_de`, sem o texto
+    extraído) e ficam fora das consultas. Um texto quase idêntico a outro já gravado não
+    basta para a ligação: o documento é gravado por completo e o parecido fica apenas
+    registrado como candidato (coluna `possivel_duplicata_de`).
     """
 
-    def __init__(self, db_path: str = "data/documentos.db"):
+    def __init__(self, db_path: str = "data/documentos.db", buffer_size: int = 50,
+                 deduplicate: bool = True, max_simhash_distance: int = MAX_DISTANCE):
         """
         Inicializa o handler e cria a tabela se ela não existir.
 
         Args:
             db_path (str): O caminho para o arquivo do banco de dados SQLite.
+            buffer_size (int): Quantidade de documentos acumulados por `save_document`
+                               antes de uma gravação em lote. Use 1 para gravar imediatamente.
+            deduplicate (bool): Liga os documentos repetidos ao canônico em vez de gravá-los
+                                como novos e marca os candidatos a duplicata.
+            max_simhash_distance (int): Distância máxima, em bits, entre as impressões SimHash
+                                        de dois textos considerados quase duplicatas (no
+                                        máximo MAX_DISTANCE, o limite garantido pelas faixas).
         """
         self.db_path = db_path
+        self.buffer_size = max(1, buffer_size)
+        self.deduplicate = deduplicate
+        self.max_simhash_distance = min(max(0, max_simhash_distance), MAX_DISTANCE)
+        self._buffer: List[Documento] = []
+        self._lock = threading.RLock()
+        self.fts_enabled = False
+        self._conn = self._connect()
         self._create_table()
+        # Garante que documentos ainda no buffer sejam gravados ao encerrar o processo
+        _open_handlers.add(self)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre a conexão compartilhada e ajusta o SQLite para gravações em lote."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL permite leitores simultâneos a um escritor; com ele, synchronous=NORMAL
+        # mantém a integridade do banco com um fsync por checkpoint, não por commit.
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA busy_timeout=5000;")
+        return conn
 
     def _create_table(self):
-        """Cria a tabela 'documentos' se ela ainda não existir."""
+        """Cria a tabela 'documentos' se ela ainda não existir e aplica as migrações pendentes."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
+            with self._lock, self._conn:
+                self._conn.execute("""
                     CREATE TABLE IF NOT EXISTS documentos (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         nome_arquivo TEXT NOT NULL,
@@ -35,34 +146,603 @@ class DatabaseHandler:
                         atributos_especificos TEXT
                     );
                 """)
-                conn.commit()
+            self._migrate()
         except sqlite3.Error as e:
             print(f"Erro ao criar a tabela: {e}")
             raise
 
+    def _migrate(self):
+        """
+        Aplica, em ordem, as migrações de esquema ainda não aplicadas ao arquivo.
+
+        A versão do esquema é registrada em `PRAGMA user_version`, de modo que bancos
+        criados por versões anteriores (inclusive `documentos.db` existentes) são
+        atualizados na primeira abertura.
+        """
+        migrations = [self._migrate_v1_promoted_fields, self._migrate_v2_content_hash,
+                      self._migrate_v3_duplicates, self._migrate_v4_possible_duplicates]
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version;").fetchone()[0]
+            for target_version, migration in enumerate(migrations, start=1):
+                if version < target_version:
+                    print(f"Migrando o banco de dados para a versão {target_version} do esquema...")
+                    # BEGIN explícito: o sqlite3 não abre transação sozinho antes de DDL
+                    self._conn.execute("BEGIN;")
+                    try:
+                        migration()
+                        self._conn.execute(f"PRAGMA user_version = {target_version};")
+                        self._conn.commit()
+                    except Exception:
+                        self._conn.rollback()
+                        raise
+            self.fts_enabled = self._table_exists("documentos_fts")
+
+    def _table_exists(self, name: str) -> bool:
+        row = self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?;", (name,)).fetchone()
+        return row is not None
+
+    def _migrate_v1_promoted_fields(self):
+        """
+        Versão 1: promove os campos conhecidos a colunas indexadas e cria o índice FTS5.
+
+        Os valores já gravados no JSON de 'atributos_especificos' são normalizados,
+        copiados para as novas colunas e removidos do JSON.
+        """
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(documentos);")}
+        for name, sql_type in PROMOTED_FIELDS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE documentos ADD COLUMN {name} {sql_type};")
+        for name in _INDEXED_FIELDS:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documentos_{name} ON documentos ({name});")
+
+        # Copia os campos conhecidos do JSON para as colunas, em blocos
+        last_id = 0
+        while True:
+            rows = self._conn.execute(
+                "SELECT id, atributos_especificos FROM documentos WHERE id > ? ORDER BY id LIMIT 1000;",
+                (last_id,),
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for doc_id, attrs_json in rows:
+                attrs = json.loads(attrs_json) if attrs_json else {}
+                promoted = [_normalize_field(name, attrs.pop(name, None)) for name in PROMOTED_FIELDS]
+                updates.append((*promoted, json.dumps(attrs, ensure_ascii=False), doc_id))
+            assignments = ", ".join(f"{name} = ?" for name in PROMOTED_FIELDS)
+            self._conn.executemany(
+                f"UPDATE documentos SET {assignments}, atributos_especificos = ? WHERE id = ?;", updates
+            )
+            last_id = rows[-1][0]
+
+        # Índice de texto completo sobre o conteúdo extraído (tabela de conteúdo externo,
+        # mantida em sincronia por triggers). Alguns builds do SQLite não têm FTS5.
+        try:
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS documentos_fts USING fts5(
+                    conteudo_extraido,
+                    content='documentos',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+            """)
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 indisponível; a busca textual usará LIKE. Detalhe: {e}")
+            return
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS documentos_fts_ai AFTER INSERT ON documentos BEGIN
+                INSERT INTO documentos_fts(rowid, conteudo_extraido) VALUES (new.id, new.conteudo_extraido);
+            END;
+        """)
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS documentos_fts_ad AFTER DELETE ON documentos BEGIN
+                INSERT INTO documentos_fts(documentos_fts, rowid, conteudo_extraido)
+                VALUES ('delete', old.id, old.conteudo_extraido);
+            END;
+        """)
+        self._conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS documentos_fts_au AFTER UPDATE OF conteudo_extraido ON documentos BEGIN
+                INSERT INTO documentos_fts(documentos_fts, rowid, conteudo_extraido)
+                VALUES ('delete', old.id, old.conteudo_extraido);
+                INSERT INTO documentos_fts(rowid, conteudo_extraido) VALUES (new.id, new.conteudo_extraido);
+            END;
+        """)
+        self._conn.execute("INSERT INTO documentos_fts(documentos_fts) VALUES ('rebuild');")
+
+    def _migrate_v2_content_hash(self):
+        """Versão 2: coluna indexada com o hash do arquivo de origem."""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(documentos);")}
+        if HASH_FIELD not in existing:
+            self._conn.execute(f"ALTER TABLE documentos ADD COLUMN {HASH_FIELD} TEXT;")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documentos_{HASH_FIELD} ON documentos ({HASH_FIELD});")
+
+    def _migrate_v3_duplicates(self):
+        """
+        Versão 3: ligação de duplicatas ao documento canônico e índice SimHash por faixas.
+
+        Documentos já gravados com o mesmo hash de arquivo passam a apontar para o mais
+        antigo; os números de NF são normalizados e as impressões SimHash dos documentos
+        canônicos são calculadas e indexadas.
+        """
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(documentos);")}
+        for name, sql_type in (('duplicata_de', 'INTEGER REFERENCES documentos(id)'),
+                               ('tipo_duplicata', 'TEXT'), ('simhash', 'INTEGER')):
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE documentos ADD COLUMN {name} {sql_type};")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documentos_duplicata_de ON documentos (duplicata_de);")
+        # Busca por CNPJ do emitente + número da NF, apenas entre os documentos canônicos
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documentos_chave ON documentos (cnpj_emitente, numero_nf)
+            WHERE duplicata_de IS NULL;
+        """)
+        # Cada documento canônico aparece uma vez por faixa: a busca de quase duplicatas é
+        # uma consulta pela chave primária, com custo independente do tamanho da tabela
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS simhash_faixas (
+                faixa INTEGER NOT NULL,
+                valor INTEGER NOT NULL,
+                documento_id INTEGER NOT NULL,
+                PRIMARY KEY (faixa, valor, documento_id)
+            ) WITHOUT ROWID;
+        """)
+        self._conn.execute(
+            "CREATE VIEW IF NOT EXISTS documentos_unicos AS SELECT * FROM documentos WHERE duplicata_de IS NULL;"
+        )
+
+        # Duplicatas exatas já gravadas apontam para o documento mais antigo com o mesmo hash
+        self._conn.execute(f"""
+            UPDATE documentos
+            SET duplicata_de = (SELECT MIN(c.id) FROM documentos AS c WHERE c.{HASH_FIELD} = documentos.{HASH_FIELD}),
+                tipo_duplicata = 'hash'
+            WHERE {HASH_FIELD} IS NOT NULL
+              AND id > (SELECT MIN(c.id) FROM documentos AS c WHERE c.{HASH_FIELD} = documentos.{HASH_FIELD});
+        """)
+
+        # Normaliza os números de NF e indexa as impressões SimHash, em blocos
+        last_id = 0
+        while True:
+            rows = self._conn.execute(
+                "SELECT id, numero_nf, conteudo_extraido, duplicata_de FROM documentos "
+                "WHERE id > ? ORDER BY id LIMIT 1000;",
+                (last_id,),
+            ).fetchall()
+            if not rows:
+                break
+            updates, bands = [], []
+            for doc_id, numero_nf, content, duplicate_of in rows:
+                fingerprint = simhash(content) if duplicate_of is None else None
+                updates.append((normalize_document_number(numero_nf), fingerprint, doc_id))
+                if fingerprint is not None:
+                    bands += [(band, value, doc_id) for band, value in enumerate(simhash_bands(fingerprint))]
+            self._conn.executemany("UPDATE documentos SET numero_nf = ?, simhash = ? WHERE id = ?;", updates)
+            self._conn.executemany("INSERT OR IGNORE INTO simhash_faixas VALUES (?, ?, ?);", bands)
+            last_id = rows[-1][0]
+
+    def _migrate_v4_possible_duplicates(self):
+        """
+        Versão 4: textos quase idênticos deixam de ser ligados ao canônico.
+
+        A semelhança do texto (SimHash) não identifica o documento: contratos do mesmo
+        modelo, com partes e valores diferentes, têm a mesma impressão. As ligações
+        'similar' gravadas pela versão 3 (sem o texto extraído) passam a ser apenas
+        candidatas (`possivel_duplicata_de`) e voltam às consultas; o texto descartado
+        não pode ser recuperado e precisa de uma nova ingestão do arquivo.
+        """
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(documentos);")}
+        if 'possivel_duplicata_de' not in existing:
+            self._conn.execute(
+                "ALTER TABLE documentos ADD COLUMN possivel_duplicata_de INTEGER REFERENCES documentos(id);"
+            )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documentos_possivel_duplicata_de ON documentos (possivel_duplicata_de);"
+        )
+        self._conn.execute("""
+            UPDATE documentos
+            SET possivel_duplicata_de = duplicata_de, duplicata_de = NULL, tipo_duplicata = NULL
+            WHERE tipo_duplicata = 'similar';
+        """)
+        # Sem o texto, essas linhas não têm impressão nem faixas; o índice de texto também não muda
+
+    def _document_values(self, doc: Documento) -> tuple:
+        """
+        Converte um Documento na tupla de valores da tabela 'documentos' (ordem de
+        _INSERT_COLUMNS, sem as colunas de DEDUP_COLUMNS).
+        """
+        # Os campos promovidos são campos conhecidos do Documento; os demais atributos ficam em `extras`
+        promoted = [_normalize_field(name, getattr(doc, name)) for name in PROMOTED_FIELDS]
+
+        # Converte os atributos específicos restantes para uma string JSON
+        specific_attrs_json = json.dumps(doc.extras, ensure_ascii=False, default=str)
+
+        return (doc.nome_arquivo, doc.tipo_documento, str(doc.data_processamento),
+                doc.conteudo_extraido, *promoted, doc.hash_arquivo, specific_attrs_json)
+
+    def _find_duplicate(self, file_hash: Optional[str],
+                        fields: Dict[str, Any]) -> Tuple[Optional[Tuple[int, str]], Optional[int]]:
+        """
+        Procura o documento canônico pelo hash do arquivo ou pela chave da nota (deve ser
+        chamado com o lock). Os campos devem estar normalizados (ver `_identity_fields`).
+
+        Returns:
+            Tuple: A ligação (id do canônico, critério "hash" ou "chave"), ou None, e o id de
+                   uma nota com o mesmo CNPJ do emitente + número que nada confirma nem
+                   contradiz (candidata a duplicata), ou None.
+        """
+        if file_hash:
+            row = self._conn.execute(
+                f"SELECT COALESCE(duplicata_de, id) FROM documentos WHERE {HASH_FIELD} = ? LIMIT 1;", (file_hash,)
+            ).fetchone()
+            if row:
+                return (row[0], 'hash'), None
+
+        # A mesma nota em outro formato (PDF x XML): CNPJ do emitente + número da NF, confirmados
+        # pela chave de acesso, pela data ou pelo valor (ver `same_document`)
+        candidate = None
+        if fields.get('cnpj_emitente') and fields.get('numero_nf'):
+            rows = self._conn.execute(
+                "SELECT id, data_emissao, valor_total, tipo_documento, "
+                "json_extract(atributos_especificos, '$.chave_acesso'), "
+                "json_extract(atributos_especificos, '$.serie') FROM documentos "
+                "WHERE cnpj_emitente = ? AND numero_nf = ? AND duplicata_de IS NULL ORDER BY id LIMIT 10;",
+                (fields['cnpj_emitente'], fields['numero_nf']),
+            ).fetchall()
+            for doc_id, data_emissao, valor_total, tipo_documento, chave_acesso, serie in rows:
+                other = _identity_fields({'data_emissao': data_emissao, 'valor_total': valor_total},
+                                         tipo_documento, {'chave_acesso': chave_acesso, 'serie': serie})
+                match = same_document(fields, other)
+                if match:
+                    return (doc_id, 'chave'), None
+                if match is None and candidate is None:
+                    candidate = doc_id
+        return None, candidate
+
+    def _find_similar(self, fields: Dict[str, Any], fingerprint: Optional[int]) -> Optional[int]:
+        """
+        Procura o documento de texto quase idêntico (candidato a duplicata), entre os que
+        têm alguma faixa SimHash igual (deve ser chamado com o lock).
+
+        Apenas sinaliza: documentos distintos do mesmo modelo têm textos parecidos.
+        """
+        # Com a chave completa, a busca é dispensada: notas do mesmo modelo cairiam todas
+        # nas mesmas faixas, e a mesma nota já teria sido encontrada pela chave
+        if fingerprint is None or (fields.get('cnpj_emitente') and fields.get('numero_nf')):
+            return None
+        bands = simhash_bands(fingerprint)
+        conditions = " OR ".join("(f.faixa = ? AND f.valor = ?)" for _ in bands)
+        params = [item for band, value in enumerate(bands) for item in (band, value)]
+        rows = self._conn.execute(
+            f"SELECT DISTINCT d.id, d.simhash, {', '.join('d.' + name for name in CONFLICT_FIELDS)} "
+            f"FROM simhash_faixas AS f JOIN documentos AS d ON d.id = f.documento_id "
+            f"WHERE ({conditions}) AND d.duplicata_de IS NULL LIMIT ?;",
+            params + [_MAX_SIMHASH_CANDIDATES],
+        ).fetchall()
+        best = None
+        for doc_id, other_fingerprint, *values in rows:
+            distance = hamming_distance(fingerprint, other_fingerprint)
+            if distance > self.max_simhash_distance or (best is not None and distance >= best[1]):
+                continue
+            # Textos parecidos com campos diferentes são documentos distintos do mesmo modelo
+            if not fields_conflict(fields, dict(zip(CONFLICT_FIELDS, values))):
+                best = (doc_id, distance)
+        return best[0] if best is not None else None
+
+    @metrics.timed("banco_gravacao_segundos", operacao="lote")
+    def save_documents(self, docs: Iterable[Documento]) -> int:
+        """
+        Salva vários documentos em uma única transação.
+
+        Com a deduplicação ligada, cada documento é comparado com os já gravados (inclusive
+        os anteriores do mesmo lote) pelo hash do arquivo e pelo CNPJ do emitente + número
+        da NF, confirmados pela chave de acesso, pela data ou pelo valor. Uma duplicata é gravada apenas como ligação ao documento canônico
+        (`duplicata_de`, sem o texto extraído), e os atributos `duplicata_de`/`tipo_duplicata`
+        do objeto Documento são preenchidos. Os demais são gravados por completo; se o texto
+        for quase idêntico ao de outro documento (SimHash), ou se outra nota tiver o mesmo
+        CNPJ do emitente + número sem nada que confirme, o id dela vai para
+        `possivel_duplicata_de`.
+
+        Args:
+            docs (Iterable[Documento]): Os objetos Documento a serem salvos.
+
+        Returns:
+            int: A quantidade de documentos gravados (inclusive as ligações de duplicatas).
+        """
+        placeholders = ", ".join("?" for _ in _INSERT_COLUMNS)
+        sql = f"INSERT INTO documentos ({', '.join(_INSERT_COLUMNS)}) VALUES ({placeholders});"
+        docs = list(docs)
+        if not docs:
+            return 0
+        rows = [self._document_values(doc) for doc in docs]
+
+        if not self.deduplicate:
+            with self._lock, self._conn:
+                self._conn.executemany(sql, [(*values, None, None, None, None) for values in rows])
+            metrics.inc("banco_documentos_total", len(rows))
+            return len(rows)
+
+        # As impressões são calculadas fora do lock (é a parte mais cara)
+        fingerprints = [simhash(doc.conteudo_extraido) for doc in docs]
+        promoted = slice(len(FIXED_FIELDS), len(FIXED_FIELDS) + len(PROMOTED_FIELDS))
+        content_index = FIXED_FIELDS.index('conteudo_extraido')
+        duplicates: Dict[str, int] = {}
+        with self._lock, self._conn:
+            for doc, values, fingerprint in zip(docs, rows, fingerprints):
+                fields = _identity_fields(dict(zip(PROMOTED_FIELDS, values[promoted])), doc.tipo_documento, doc.extras)
+                duplicate, candidate = self._find_duplicate(doc.hash_arquivo, fields)
+                if duplicate is None:
+                    similar_id = candidate or self._find_similar(fields, fingerprint)
+                    cursor = self._conn.execute(sql, (*values, None, None, similar_id, fingerprint))
+                    if fingerprint is not None:
+                        self._conn.executemany(
+                            "INSERT INTO simhash_faixas VALUES (?, ?, ?);",
+                            [(band, value, cursor.lastrowid) for band, value in enumerate(simhash_bands(fingerprint))],
+                        )
+                    doc.duplicata_de, doc.tipo_duplicata, doc.possivel_duplicata_de = None, None, similar_id
+                    if similar_id is not None:
+                        metrics.inc("banco_possiveis_duplicatas_total")
+                else:
+                    canonical_id, kind = duplicate
+                    # Apenas a ligação é gravada: o texto já está no documento canônico
+                    link = list(values)
+                    link[content_index] = None
+                    self._conn.execute(sql, (*link, canonical_id, kind, None, None))
+                    doc.duplicata_de, doc.tipo_duplicata, doc.possivel_duplicata_de = canonical_id, kind, None
+                    duplicates[kind] = duplicates.get(kind, 0) + 1
+        metrics.inc("banco_documentos_total", len(rows))
+        for kind, count in duplicates.items():
+            metrics.inc("banco_duplicatas_total", count, tipo=kind)
+        return len(rows)
+
+    @metrics.timed("banco_gravacao_segundos", operacao="documento")
     def save_document(self, doc: Documento):
         """
         Salva uma instância de Documento no banco de dados.
 
+        O documento é acumulado no buffer e gravado junto com os demais quando o
+        buffer atinge `buffer_size` (ou em `flush()`/`close()`). As consultas deste handler
+        (`find_documents`, `get_document`, `iter_batches`...) gravam o buffer antes de ler,
+        mas outras conexões ao mesmo arquivo (ex: o AgenteDataFrame em modo SQL ou outro
+        processo) só veem o documento depois de `flush()`. Um handler descartado sem
+        `close()` (ou sem o bloco `with`) perde o buffer pendente.
+
         Args:
             doc (Documento): O objeto Documento a ser salvo.
         """
-        doc_dict = doc.to_dict()
+        with self._lock:
+            self._buffer.append(doc)
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+
+    def flush(self) -> int:
+        """Grava todos os documentos pendentes no buffer. Retorna quantos foram gravados."""
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+            try:
+                return self.save_documents(pending)
+            except sqlite3.Error:
+                # Devolve os documentos ao buffer para não perdê-los
+                self._buffer = pending + self._buffer
+                raise
+
+    # --- Consultas ---
+
+    def find_documents(self, cnpj: Optional[str] = None, data_inicio: Any = None, data_fim: Any = None,
+                       valor_min: Optional[float] = None, valor_max: Optional[float] = None,
+                       texto: Optional[str] = None, tipo_documento: Optional[str] = None,
+                       limit: int = 100, incluir_duplicatas: bool = False) -> List[Dict[str, Any]]:
+        """
+        Busca documentos combinando filtros sobre as colunas indexadas e o índice de texto.
+
+        Args:
+            cnpj (str, optional): CNPJ do emitente ou do destinatário (com ou sem pontuação).
+            data_inicio, data_fim (optional): Intervalo inclusivo de data de emissão
+                                              (date ou texto "AAAA-MM-DD"/"DD/MM/AAAA").
+            valor_min, valor_max (float, optional): Intervalo inclusivo do valor total.
+            texto (str, optional): Trecho a ser procurado no conteúdo extraído
+                                   (ex: "multa rescisória"; acentos são ignorados).
+            tipo_documento (str, optional): Tipo exato do documento.
+            limit (int): Quantidade máxima de documentos retornados.
+            incluir_duplicatas (bool): Inclui as ligações de duplicatas (por padrão, apenas
+                                       os documentos canônicos são retornados).
+
+        Returns:
+            List[Dict[str, Any]]: Os documentos encontrados, com os atributos específicos já
+                                  convertidos de JSON para dicionário.
+        """
+        conditions = [] if incluir_duplicatas else ["d.duplicata_de IS NULL"]
+        params: List[Any] = []
+        if cnpj:
+            cnpj = normalize_cnpj(cnpj)
+            conditions.append("(d.cnpj_emitente = ? OR d.cnpj_destinatario = ?)")
+            params += [cnpj, cnpj]
+        if data_inicio is not None:
+            conditions.append("d.data_emissao >= ?")
+            params.append(normalize_date(data_inicio))
+        if data_fim is not None:
+            conditions.append("d.data_emissao <= ?")
+            params.append(normalize_date(data_fim))
+        if valor_min is not None:
+            conditions.append("d.valor_total >= ?")
+            params.append(valor_min)
+        if valor_max is not None:
+            conditions.append("d.valor_total <= ?")
+            params.append(valor_max)
+        if tipo_documento:
+            conditions.append("d.tipo_documento = ?")
+            params.append(tipo_documento)
+
+        if texto:
+            if self.fts_enabled:
+                conditions.append(
+                    "d.id IN (SELECT rowid FROM documentos_fts WHERE documentos_fts MATCH ?)"
+                )
+                # O texto é buscado como frase exata
+                params.append('"' + texto.replace('"', '""') + '"')
+            else:
+                conditions.append("d.conteudo_extraido LIKE ?")
+                params.append(f"%{texto}%")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT d.* FROM documentos AS d {where} ORDER BY d.id DESC LIMIT ?;"
+        params.append(limit)
+
+        # Documentos ainda no buffer precisam estar gravados para aparecer na consulta
+        self.flush()
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        return [self._row_to_dict(columns, row) for row in rows]
+
+    def find_by_cnpj(self, cnpj: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Documentos em que o CNPJ aparece como emitente ou destinatário."""
+        return self.find_documents(cnpj=cnpj, limit=limit)
+
+    def find_by_date_range(self, data_inicio: Any, data_fim: Any, limit: int = 100) -> List[Dict[str, Any]]:
+        """Documentos com data de emissão no intervalo (inclusivo)."""
+        return self.find_documents(data_inicio=data_inicio, data_fim=data_fim, limit=limit)
 
-        # Separa os campos fixos dos atributos específicos
-        fixed_keys = ['nome_arquivo', 'tipo_documento', 'data_processamento', 'conteudo_extraido']
-        specific_attrs = {k: v for k, v in doc_dict.items() if k not in fixed_keys}
+    def find_by_value_range(self, valor_min: Optional[float], valor_max: Optional[float],
+                            limit: int = 100) -> List[Dict[str, Any]]:
+        """Documentos com valor total no intervalo (inclusivo)."""
+        return self.find_documents(valor_min=valor_min, valor_max=valor_max, limit=limit)
 
-        # Converte os atributos específicos para uma string JSON
-        specific_attrs_json = json.dumps(specific_attrs, ensure_ascii=False, default=str)
+    def search_text(self, texto: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Documentos cujo conteúdo extraído contém o trecho informado."""
+        return self.find_documents(texto=texto, limit=limit)
 
-        sql = """
-            INSERT INTO documentos (nome_arquivo, tipo_documento, data_processamento, conteudo_extraido, atributos_especificos)
-            VALUES (?, ?, ?, ?, ?);
+    def existing_content_hashes(self, hashes: Iterable[str]) -> set:
         """
-        values = (doc.nome_arquivo, doc.tipo_documento, doc.data_processamento, doc.conteudo_extraido, specific_attrs_json)
+        Retorna quais dos hashes informados já pertencem a documentos gravados.
+
+        Args:
+            hashes (Iterable[str]): Hashes SHA-256 de arquivos (ver `hash_arquivo`).
+        """
+        hashes = list(hashes)
+        found = set()
+        self.flush()
+        with self._lock:
+            # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = self._conn.execute(
+                    f"SELECT DISTINCT {HASH_FIELD} FROM documentos WHERE {HASH_FIELD} IN ({placeholders});", chunk
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def has_content_hash(self, file_hash: str) -> bool:
+        """Indica se um arquivo com este hash já foi gravado."""
+        return bool(self.existing_content_hashes([file_hash]))
+
+    def find_duplicate(self, hash_arquivo: Optional[str] = None,
+                       campos: Optional[Dict[str, Any]] = None) -> Optional[Tuple[int, str]]:
+        """
+        Procura o documento canônico do qual um documento ainda não gravado seria duplicata.
+
+        Permite pular etapas caras (OCR, LLM) de documentos já conhecidos; ao serem salvos,
+        eles são ligados ao canônico da mesma forma. Textos apenas parecidos não contam
+        (ver `save_documents`): o documento precisa passar por todas as etapas.
+
+        Args:
+            hash_arquivo (str, optional): Hash SHA-256 do arquivo.
+            campos (Dict[str, Any], optional): Campos já conhecidos (ex: de `pre_extract`); o CNPJ
+                                               do emitente + o número da NF, confirmados pela
+                                               chave de acesso, pela data ou pelo valor,
+                                               identificam a mesma nota em outro formato.
+
+        Returns:
+            Optional[Tuple[int, str]]: O id do documento canônico e o critério ("hash" ou
+                                       "chave"), ou None se o documento é novo.
+        """
+        campos = campos or {}
+        fields = _identity_fields({name: _normalize_field(name, campos.get(name)) for name in PROMOTED_FIELDS},
+                                  campos.get('tipo_documento'), campos)
+        self.flush()
+        with self._lock:
+            return self._find_duplicate(hash_arquivo, fields)[0]
+
+    def get_document(self, doc_id: int) -> Optional[Dict[str, Any]]:
+        """Retorna o documento com o id informado (ex: o canônico de uma duplicata), ou None."""
+        self.flush()
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM documentos WHERE id = ?;", (doc_id,))
+            columns = [description[0] for description in cursor.description]
+            row = cursor.fetchone()
+        return self._row_to_dict(columns, row) if row else None
+
+    def iter_batches(self, batch_size: int = 100000, include_content: bool = False,
+                     columns: Optional[List[str]] = None,
+                     include_duplicates: bool = False) -> Iterator[DocumentoBatch]:
+        """
+        Percorre todos os documentos em lotes colunares, em ordem de id.
+
+        Cada lote é lido com uma consulta paginada pelo id (sem OFFSET), de modo que a
+        conexão só fica ocupada durante a leitura de um lote e a memória fica limitada
+        a `batch_size` documentos.
+
+        Args:
+            batch_size (int): Documentos por lote.
+            include_content (bool): Inclui o texto extraído (a coluna mais pesada).
+            columns (List[str], optional): Colunas a ler. Defaults to todas (exceto o texto,
+                                           conforme `include_content`).
+            include_duplicates (bool): Inclui as ligações de duplicatas (`duplicata_de` preenchido).
+        """
+        if columns is None:
+            with self._lock:
+                columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documentos);")]
+            if not include_content:
+                columns.remove('conteudo_extraido')
+        # O id é usado na paginação e sempre é lido (removido depois, se não foi pedido)
+        selected = columns if 'id' in columns else ['id'] + columns
+        duplicates = "" if include_duplicates else " AND duplicata_de IS NULL"
+        sql = f"SELECT {', '.join(selected)} FROM documentos WHERE id > ?{duplicates} ORDER BY id LIMIT ?;"
+
+        self.flush()
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            batch = DocumentoBatch.from_rows(selected, rows)
+            if selected is not columns:
+                del batch.columns['id']
+            yield batch
+            if len(rows) < batch_size:
+                break
+
+    def load_batch(self, include_content: bool = False, columns: Optional[List[str]] = None,
+                   include_duplicates: bool = False) -> DocumentoBatch:
+        """
+        Carrega todos os documentos em um único lote colunar (ex: `load_batch().to_pandas()`
+        para o AgenteDataFrame ou relatórios).
+        """
+        return DocumentoBatch.concat(self.iter_batches(include_content=include_content, columns=columns,
+                                                       include_duplicates=include_duplicates))
+
+    @staticmethod
+    def _row_to_dict(columns: List[str], row: tuple) -> Dict[str, Any]:
+        record = dict(zip(columns, row))
+        attrs_json = record.get('atributos_especificos')
+        record['atributos_especificos'] = json.loads(attrs_json) if attrs_json else {}
+        return record
+
+    def close(self):
+        """Grava o buffer pendente e fecha a conexão. Pode ser chamado mais de uma vez."""
+        with self._lock:
+            _open_handlers.discard(self)
+            if self._conn is None:
+                return
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self) -> "DatabaseHandler":
+        return self
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql, values)
-            conn.commit()
\ No newline at end of file
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,137 @@
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from utils.fiscal_xml import DOCUMENT_TYPES
+
+# Impressão digital SimHash de 64 bits, dividida em faixas de 16 bits para a busca no banco.
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+# Com 4 faixas, dois textos a até 3 bits de distância têm ao menos uma faixa idêntica
+# (princípio da casa dos pombos), então a busca por faixa não perde nenhum candidato.
+MAX_DISTANCE = SIMHASH_BANDS - 1
+
+# Textos curtos demais (ex: OCR que falhou) geram impressões pouco confiáveis.
+MIN_TOKENS = 20
+# Apenas o início de textos muito longos entra no cálculo.
+MAX_CHARS = 200_000
+SHINGLE_SIZE = 3
+
+# Campos que, quando preenchidos nos dois documentos com valores diferentes, indicam
+# documentos distintos mesmo com textos parecidos (ex: notas ou contratos do mesmo modelo).
+CONFLICT_FIELDS = ('numero_nf', 'cnpj_emitente', 'nome_emitente', 'cnpj_destinatario',
+                   'nome_destinatario', 'data_emissao', 'valor_total')
+
+# Campos que, iguais nos dois documentos, confirmam que o mesmo CNPJ do emitente + número
+# da NF é a mesma nota (e não outra nota do emitente com o mesmo número).
+CORROBORATING_FIELDS = ('data_emissao', 'valor_total')
+
+_MODEL_BY_TYPE = {name: model for model, name in DOCUMENT_TYPES.items()}
+
+_WORD = re.compile(r"\w+")
+_MASK = (1 << SIMHASH_BITS) - 1
+_BAND_MASK = (1 << BAND_BITS) - 1
+# Posições dos bits ligados em cada valor de byte.
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def _tokens(text: str) -> List[str]:
+    """Palavras do texto sem caixa nem acentos (o OCR nem sempre preserva os diacríticos)."""
+    text = text[:MAX_CHARS].casefold()
+    if not text.isascii():
+        # A decomposição separa os acentos, descartados junto com os demais caracteres não ASCII
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return _WORD.findall(text)
+
+
+def simhash(text: Optional[str], shingle_size: int = SHINGLE_SIZE) -> Optional[int]:
+    """
+    Calcula a impressão digital SimHash do texto, sobre sequências de `shingle_size` palavras.
+
+    Textos quase iguais (mesmo documento com outro OCR, outro formato ou pequenas
+    diferenças de layout) têm impressões a poucos bits de distância.
+
+    Returns:
+        Optional[int]: A impressão com sinal (cabe em um INTEGER do SQLite), ou None para
+                       textos com menos de MIN_TOKENS palavras.
+    """
+    if not text:
+        return None
+    words = _tokens(text)
+    if len(words) < MIN_TOKENS:
+        return None
+    shingles = Counter(map(" ".join, zip(*(words[i:] for i in range(shingle_size)))))
+    # Cada shingle distinto é hasheado uma vez e repetido conforme sua frequência (peso)
+    digests = b"".join(hashlib.blake2b(shingle.encode(), digest_size=8).digest() * weight
+                       for shingle, weight in shingles.items())
+    total = len(digests) // 8
+
+    # Conta, para cada bit, quantos shingles o têm ligado. A contagem é feita por byte
+    # (uma fatia do buffer por posição, contada em C) e só depois expandida para os 8 bits
+    counts = [0] * SIMHASH_BITS
+    for position in range(8):
+        offset = position * 8
+        for byte, count in Counter(digests[position::8]).items():
+            for bit in _BYTE_BITS[byte]:
+                counts[offset + bit] += count
+    # O bit fica ligado quando a maioria dos shingles o tem ligado
+    fingerprint = sum(1 << bit for bit, count in enumerate(counts) if 2 * count > total)
+    return to_signed(fingerprint)
+
+
+def to_signed(value: int) -> int:
+    """Converte um inteiro de 64 bits sem sinal para o intervalo do INTEGER do SQLite."""
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Quantidade de bits diferentes entre duas impressões."""
+    return bin((a ^ b) & _MASK).count("1")
+
+
+def simhash_bands(fingerprint: int) -> List[int]:
+    """Valores das faixas de 16 bits da impressão (a faixa `i` é o i-ésimo valor)."""
+    value = fingerprint & _MASK
+    return [(value >> (band * BAND_BITS)) & _BAND_MASK for band in range(SIMHASH_BANDS)]
+
+
+def fields_conflict(a: Dict[str, Any], b: Dict[str, Any], fields=CONFLICT_FIELDS) -> bool:
+    """Indica se algum dos campos está preenchido nos dois documentos com valores diferentes."""
+    for name in fields:
+        value_a, value_b = a.get(name), b.get(name)
+        if value_a is not None and value_b is not None and value_a != value_b:
+            return True
+    return False
+
+
+def fiscal_model(fields: Dict[str, Any]) -> Optional[str]:
+    """Modelo do documento fiscal (55, 57...), pela chave de acesso ou pelo tipo lido do XML."""
+    access_key = fields.get('chave_acesso')
+    if access_key and len(access_key) == 44:
+        return access_key[20:22]
+    return _MODEL_BY_TYPE.get(fields.get('tipo_documento'))
+
+
+def same_document(a: Dict[str, Any], b: Dict[str, Any]) -> Optional[bool]:
+    """
+    Decide se dois documentos com o mesmo CNPJ do emitente e número da NF são o mesmo.
+
+    Returns:
+        Optional[bool]: True quando as chaves de acesso são iguais ou quando a data ou o
+                        valor confirmam (iguais nos dois); False quando a chave de acesso,
+                        a série, o modelo, a data ou o valor diferem; None quando nada
+                        confirma nem contradiz (apenas um candidato a duplicata).
+    """
+    if a.get('chave_acesso') and b.get('chave_acesso'):
+        return a['chave_acesso'] == b['chave_acesso']
+    if fields_conflict(a, b, ('serie',) + CORROBORATING_FIELDS):
+        return False
+    model_a, model_b = fiscal_model(a), fiscal_model(b)
+    if model_a and model_b and model_a != model_b:
+        return False
+    if any(a.get(name) is not None and a.get(name) == b.get(name) for name in CORROBORATING_FIELDS):
+        return True
+    return None
@@ -0,0 +1,103 @@
+import re
+from datetime import date, datetime
+from typing import Any, Optional
+
+_NON_DIGITS = re.compile(r"\D")
+_THOUSANDS_DOT = re.compile(r"^-?\d{1,3}(\.\d{3})+$")
+_DOCUMENT_NUMBER = re.compile(r"^[\d.\s-]*\d[\d.\s-]*$")
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y")
+
+
+def normalize_cnpj(value: Any) -> Optional[str]:
+    """
+    Mantém apenas os dígitos de um CNPJ/CPF (ex: "11.222.333/0001-81" -> "11222333000181").
+
+    Returns:
+        Optional[str]: Os dígitos, ou None se o valor não contiver nenhum.
+    """
+    if value is None:
+        return None
+    digits = _NON_DIGITS.sub("", str(value))
+    return digits or None
+
+
+def normalize_date(value: Any) -> Optional[str]:
+    """
+    Converte datas nos formatos mais comuns dos documentos para ISO (AAAA-MM-DD).
+
+    Aceita objetos date/datetime, "AAAA-MM-DD" (inclusive com horário, como no `dhEmi`
+    da NF-e) e "DD/MM/AAAA", "DD-MM-AAAA", "DD.MM.AAAA".
+
+    Returns:
+        Optional[str]: A data em formato ISO, ou None se não for reconhecida.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+
+    text = str(value).strip()
+    # "2024-03-15T10:20:30-03:00" -> "2024-03-15"
+    if len(text) > 10 and text[4:5] == "-" and text[10:11] in ("T", " "):
+        text = text[:10]
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_decimal(value: Any) -> Optional[float]:
+    """
+    Converte valores monetários para float, aceitando os formatos brasileiro e americano
+    (ex: "R$ 1.234,56", "1234,56", "1,234.56", "1234.56", 99.9).
+
+    Returns:
+        Optional[float]: O valor numérico, ou None se não for reconhecido.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = re.sub(r"[^\d,.\-]", "", str(value))
+    if not text:
+        return None
+    if "," in text and "." in text:
+        # O último separador é o decimal
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        text = text.replace(",", ".")
+    elif _THOUSANDS_DOT.match(text):
+        # "1.234.567" -> separadores de milhar
+        text = text.replace(".", "")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def normalize_document_number(value: Any) -> Optional[str]:
+    """
+    Normaliza números de documento puramente numéricos, para que a mesma nota seja
+    reconhecida em formatos diferentes (ex: "000.001.234" -> "1234", como no `nNF` da NF-e).
+
+    Números com letras (ex: "CT-2024/15A") são mantidos como estão, sem espaços nas pontas.
+
+    Returns:
+        Optional[str]: O número normalizado, ou None se o valor estiver vazio.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+    if _DOCUMENT_NUMBER.match(text):
+        return str(int(_NON_DIGITS.sub("", text)))
+    return text
@@ -0,0 +1,122 @@
+import io
+import xml.etree.ElementTree as ET
+from typing import Dict, Optional, Tuple
+
+from utils.field_normalizers import normalize_date, normalize_decimal
+
+NFE_NAMESPACE = "http://www.portalfiscal.inf.br/nfe"
+CTE_NAMESPACE = "http://www.portalfiscal.inf.br/cte"
+
+# Tipo do documento a partir do modelo (ide/mod) informado no XML.
+DOCUMENT_TYPES = {
+    "55": "Nota Fiscal Eletrônica (NF-e)",
+    "65": "Nota Fiscal de Consumidor Eletrônica (NFC-e)",
+    "57": "Conhecimento de Transporte Eletrônico (CT-e)",
+    "67": "Conhecimento de Transporte Eletrônico para Outros Serviços (CT-e OS)",
+}
+
+# Caminho (nomes locais do elemento pai e do elemento) -> campo do Documento.
+# Apenas a primeira ocorrência de cada campo é considerada.
+_NFE_FIELDS = {
+    ("ide", "nNF"): "numero_nf",
+    ("ide", "serie"): "serie",
+    ("ide", "dhEmi"): "data_emissao",
+    ("ide", "dEmi"): "data_emissao",  # leiaute 2.00
+    ("ide", "mod"): "modelo",
+    ("emit", "CNPJ"): "cnpj_emitente",
+    ("emit", "CPF"): "cnpj_emitente",
+    ("emit", "xNome"): "nome_emitente",
+    ("dest", "CNPJ"): "cnpj_destinatario",
+    ("dest", "CPF"): "cnpj_destinatario",
+    ("dest", "xNome"): "nome_destinatario",
+    ("ICMSTot", "vNF"): "valor_total",
+}
+
+_CTE_FIELDS = {
+    ("ide", "nCT"): "numero_nf",
+    ("ide", "serie"): "serie",
+    ("ide", "dhEmi"): "data_emissao",
+    ("ide", "mod"): "modelo",
+    ("emit", "CNPJ"): "cnpj_emitente",
+    ("emit", "xNome"): "nome_emitente",
+    ("dest", "CNPJ"): "cnpj_destinatario",
+    ("dest", "CPF"): "cnpj_destinatario",
+    ("dest", "xNome"): "nome_destinatario",
+    ("vPrest", "vTPrest"): "valor_total",
+}
+
+# Elementos cujo atributo Id contém a chave de acesso (ex: "NFe3519...").
+_ACCESS_KEY_ELEMENTS = {"infNFe", "infCte"}
+
+
+def _split_tag(tag: str) -> Tuple[str, str]:
+    """Separa "{namespace}nome" em (namespace, nome)."""
+    if tag.startswith("{"):
+        namespace, _, local = tag[1:].partition("}")
+        return namespace, local
+    return "", tag
+
+
+def parse_xml(file_bytes: bytes) -> Tuple[str, Optional[Dict]]:
+    """
+    Lê um XML em uma única passada (iterparse), com memória limitada.
+
+    Os elementos são descartados assim que processados, de modo que a árvore nunca é
+    montada por inteiro. Se o XML for uma NF-e, NFC-e ou CT-e (namespaces do Portal
+    Fiscal), os campos do Documento são montados diretamente a partir da estrutura
+    (emit/CNPJ, dest/CNPJ, ide/nNF, ide/dhEmi, total/ICMSTot/vNF...), dispensando o LLM.
+
+    Args:
+        file_bytes (bytes): O conteúdo do arquivo XML.
+
+    Returns:
+        Tuple[str, Optional[Dict]]: O texto de todos os elementos (um por linha) e os
+                                    campos extraídos, ou None se o XML não for um
+                                    documento fiscal reconhecido.
+
+    Raises:
+        ET.ParseError: Se o XML for inválido.
+    """
+    text_content = []
+    fields: Dict = {}
+    field_map: Optional[Dict] = None
+    document_namespace = None
+    stack = []  # (elemento, nome local)
+
+    for event, elem in ET.iterparse(io.BytesIO(file_bytes), events=("start", "end")):
+        if event == "start":
+            namespace, local = _split_tag(elem.tag)
+            if field_map is None and namespace in (NFE_NAMESPACE, CTE_NAMESPACE):
+                document_namespace = namespace
+                field_map = _NFE_FIELDS if namespace == NFE_NAMESPACE else _CTE_FIELDS
+            if local in _ACCESS_KEY_ELEMENTS and "chave_acesso" not in fields:
+                access_key = "".join(ch for ch in elem.get("Id", "") if ch.isdigit())
+                if access_key:
+                    fields["chave_acesso"] = access_key
+            stack.append((elem, local))
+            continue
+
+        _, local = stack.pop()
+        text = elem.text.strip() if elem.text else ""
+        if text:
+            text_content.append(text)
+            if field_map is not None and stack:
+                field = field_map.get((stack[-1][1], local))
+                if field and field not in fields:
+                    fields[field] = text
+
+        # Descarta o elemento já processado para manter a memória limitada
+        elem.clear()
+        if stack:
+            stack[-1][0].remove(elem)
+
+    if document_namespace is None or not fields.keys() - {"chave_acesso", "modelo"}:
+        return "\n".join(text_content), None
+
+    model = fields.pop("modelo", "57" if document_namespace == CTE_NAMESPACE else "55")
+    fields["tipo_documento"] = DOCUMENT_TYPES.get(model, "Documento Fiscal Eletrônico")
+    if "data_emissao" in fields:
+        fields["data_emissao"] = normalize_date(fields["data_emissao"]) or fields["data_emissao"]
+    if "valor_total" in fields:
+        fields["valor_total"] = normalize_decimal(fields["valor_total"])
+    return "\n".join(text_content), fields
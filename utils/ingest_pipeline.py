@@ -0,0 +1,438 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models.document_model import Documento
+from utils.archive_reader import ArchiveLimitError, ZipStreamReader
+from utils.database_handler import DatabaseHandler
+from utils.job_queue import JobTask
+from utils.llm_extractor import LlmExtractor
+from utils.metrics import metrics
+from utils.regex_extractor import pre_extract
+from utils.result_cache import ResultCache, content_hash
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.xml', '.docx', '.png', '.jpg', '.jpeg'}
+
+# Processador OCR exclusivo de cada processo worker (criado por _init_ocr_worker).
+_worker_processor = None
+
+
+def build_document(nome_arquivo: str, conteudo_extraido: str, extracted_details: Optional[dict] = None,
+                   **kwargs) -> Documento:
+    """
+    Cria o Documento a partir do texto extraído e dos detalhes do LLM (se houver).
+
+    Args:
+        nome_arquivo (str): O nome original do arquivo.
+        conteudo_extraido (str): O texto extraído do arquivo.
+        extracted_details (dict, optional): O dicionário devolvido por `LlmExtractor.extract_details`.
+        **kwargs: Atributos adicionais (ex: hash_arquivo).
+    """
+    details = dict(extracted_details or {})
+    doc_type = details.pop('tipo_documento', 'Não Identificado')
+    # Os detalhes restantes serão os atributos específicos
+    doc = Documento(nome_arquivo=nome_arquivo, tipo_documento=doc_type, **details, **kwargs)
+    doc.conteudo_extraido = conteudo_extraido
+    return doc
+
+
+def access_key_fields(fields: Dict) -> Dict:
+    """
+    Apenas os campos tirados da chave de acesso (validada pelo dígito verificador), usados
+    para decidir se o LLM pode ser dispensado: os demais campos locais são palpites.
+    """
+    return {name: fields[name] for name in ('chave_acesso', 'cnpj_emitente', 'numero_nf') if name in fields}
+
+
+def _init_ocr_worker(cache_path: Optional[str]) -> None:
+    """Inicializador do pool: cada processo worker carrega seu próprio OcrProcessor."""
+    global _worker_processor
+    # Importado aqui para que o processo principal não precise carregar o PaddleOCR
+    from utils.ocr_processor import OcrProcessor
+
+    cache = ResultCache(db_path=cache_path) if cache_path else None
+    # As páginas de PDF são processadas no próprio worker (sem pool aninhado)
+    _worker_processor = OcrProcessor(max_workers=1, cache=cache)
+
+
+class _InMemoryFile:
+    """Objeto mínimo com a interface do UploadedFile do Streamlit (name/getvalue)."""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+
+def _ocr_file(name: str, data: bytes) -> Tuple[str, Optional[Dict]]:
+    """Extrai o texto (e os campos, para XMLs fiscais) de um arquivo (executado no worker)."""
+    return _worker_processor.process_file_structured(_InMemoryFile(name, data))
+
+
+def iter_source_files(paths: Iterable[str]) -> Iterator[Tuple[str, str, bytes]]:
+    """
+    Percorre arquivos, diretórios (recursivamente) e ZIPs, produzindo os documentos suportados.
+
+    Yields:
+        Tuple[str, str, bytes]: (nome do arquivo, origem legível, bytes do arquivo).
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                yield from iter_source_files(os.path.join(root, name) for name in sorted(files))
+            continue
+
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.zip':
+            # Membros são descompactados um por vez, com proteção contra zip bombs
+            try:
+                for member in ZipStreamReader(path):
+                    if os.path.splitext(member.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        yield member.name, f"{path}!{member.path}", member.getvalue()
+            except ArchiveLimitError as e:
+                print(f"[ZIP] '{path}' interrompido: {e}")
+        elif extension in SUPPORTED_EXTENSIONS:
+            with open(path, 'rb') as file:
+                yield os.path.basename(path), path, file.read()
+
+
+class IngestPipeline:
+    """
+    Ingestão em lote, sem interface gráfica: OCR -> LLM -> banco de dados.
+
+    Os estágios rodam em paralelo, ligados por filas limitadas:
+      * descoberta: percorre diretórios/ZIPs e descarta arquivos já gravados (pelo hash);
+      * OCR: pool de processos, cada um com seu próprio motor;
+      * LLM: chamadas assíncronas concorrentes (`LlmExtractor.aextract_details`);
+      * banco: um único escritor que grava em lotes (`DatabaseHandler.save_documents`).
+
+    Como cada documento grava o hash do arquivo de origem, uma execução interrompida
+    pode ser retomada: os arquivos já ingeridos são pulados. Documentos que repetem um já
+    gravado (a mesma nota em outro formato) não passam pelo LLM e são gravados apenas como
+    ligação ao documento canônico.
+    """
+
+    def __init__(self, db_handler: DatabaseHandler, llm_extractor: Optional[LlmExtractor] = None,
+                 ocr_workers: int = 2, llm_concurrency: int = 8, db_batch_size: int = 100,
+                 queue_size: int = 32, cache_path: Optional[str] = None):
+        """
+        Args:
+            db_handler (DatabaseHandler): Destino dos documentos.
+            llm_extractor (LlmExtractor, optional): Extrator de detalhes; sem ele, apenas o texto é salvo.
+            ocr_workers (int): Quantidade de processos de OCR.
+            llm_concurrency (int): Quantidade de chamadas simultâneas ao LLM.
+            db_batch_size (int): Documentos por transação no escritor do banco.
+            queue_size (int): Capacidade de cada fila entre os estágios (limita a memória).
+            cache_path (str, optional): Arquivo do ResultCache usado pelos workers de OCR.
+        """
+        self.db_handler = db_handler
+        self.llm_extractor = llm_extractor
+        self.ocr_workers = max(1, ocr_workers)
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.db_batch_size = max(1, db_batch_size)
+        self.queue_size = max(1, queue_size)
+        self.cache_path = cache_path
+
+        self.counters: Counter = Counter()
+        self.stage_seconds: Counter = Counter()
+
+    # --- Estágios ---
+
+    async def _discover(self, paths: List[str], ocr_queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        iterator = iter_source_files(paths)
+        seen = set()
+        while True:
+            # A leitura dos arquivos é bloqueante e roda em uma thread
+            item = await loop.run_in_executor(None, next, iterator, None)
+            if item is None:
+                break
+            name, origin, data = item
+            self.counters['descobertos'] += 1
+            file_hash = content_hash(data)
+            # A consulta ao banco também é bloqueante
+            if file_hash in seen or await loop.run_in_executor(None, self.db_handler.has_content_hash, file_hash):
+                self.counters['ja_ingeridos'] += 1
+                continue
+            seen.add(file_hash)
+            self.counters['bytes'] += len(data)
+            await ocr_queue.put((name, origin, file_hash, data))
+
+    async def _ocr_stage(self, pool: ProcessPoolExecutor, ocr_queue: asyncio.Queue, llm_queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await ocr_queue.get()
+            if item is None:
+                break
+            name, origin, file_hash, data = item
+            file_format = os.path.splitext(name)[1].lower().lstrip(".")
+            start = time.perf_counter()
+            try:
+                text, fields = await loop.run_in_executor(pool, _ocr_file, name, data)
+            except Exception as e:
+                self.counters['erros_ocr'] += 1
+                metrics.inc("erros_total", operacao="ocr_arquivo_segundos", formato=file_format)
+                print(f"[OCR] Falha em '{origin}': {e}")
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                self.stage_seconds['ocr'] += elapsed
+                # O OCR roda em outros processos; a latência é registrada aqui, no processo principal
+                metrics.observe("ocr_arquivo_segundos", elapsed, formato=file_format)
+                metrics.inc("ocr_bytes_total", len(data), formato=file_format)
+            self.counters['ocr_ok'] += 1
+            await llm_queue.put((name, origin, file_hash, text, fields))
+
+    async def _llm_stage(self, llm_queue: asyncio.Queue, db_queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await llm_queue.get()
+            if item is None:
+                break
+            name, origin, file_hash, text, details = item
+            # XMLs fiscais já chegam com os campos extraídos e dispensam o LLM
+            if details is not None:
+                self.counters['sem_llm_xml_fiscal'] += 1
+            elif self.llm_extractor is not None and self.db_handler.deduplicate:
+                # Uma nota já gravada com a mesma chave de acesso dispensa o LLM: os campos
+                # locais bastam para a ligação, feita pelo DatabaseHandler ao salvar
+                local_fields = pre_extract(text)
+                duplicate = None
+                if local_fields.get('chave_acesso'):
+                    duplicate = await loop.run_in_executor(None, self.db_handler.find_duplicate,
+                                                           None, access_key_fields(local_fields))
+                if duplicate is not None:
+                    self.counters['sem_llm_duplicata'] += 1
+                    details = local_fields
+            if details is None and self.llm_extractor is not None:
+                start = time.perf_counter()
+                try:
+                    details = await self.llm_extractor.aextract_details(text)
+                except Exception as e:
+                    self.counters['erros_llm'] += 1
+                    print(f"[LLM] Falha em '{origin}': {e}")
+                    continue
+                finally:
+                    self.stage_seconds['llm'] += time.perf_counter() - start
+                self.counters['llm_ok'] += 1
+            await db_queue.put(build_document(name, text, details, hash_arquivo=file_hash, origem=origin))
+
+    async def _db_stage(self, db_queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        finished = False
+        while not finished:
+            batch = []
+            item = await db_queue.get()
+            # Junta o que já estiver na fila, até o tamanho do lote
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.db_batch_size or db_queue.empty():
+                    break
+                item = db_queue.get_nowait()
+            finished = item is None
+            if batch:
+                start = time.perf_counter()
+                try:
+                    saved = await loop.run_in_executor(None, self.db_handler.save_documents, batch)
+                    self.counters['salvos'] += saved
+                    self.counters['duplicatas'] += sum(1 for doc in batch if doc.duplicata_de is not None)
+                except Exception as e:
+                    self.counters['erros_banco'] += len(batch)
+                    print(f"[Banco] Falha ao gravar {len(batch)} documento(s): {e}")
+                finally:
+                    self.stage_seconds['banco'] += time.perf_counter() - start
+
+    async def _run(self, paths: List[str]):
+        ocr_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        llm_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        db_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        pool = ProcessPoolExecutor(
+            max_workers=self.ocr_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_ocr_worker,
+            initargs=(self.cache_path,),
+        )
+        try:
+            ocr_tasks = [asyncio.create_task(self._ocr_stage(pool, ocr_queue, llm_queue))
+                         for _ in range(self.ocr_workers)]
+            llm_tasks = [asyncio.create_task(self._llm_stage(llm_queue, db_queue))
+                         for _ in range(self.llm_concurrency)]
+            db_task = asyncio.create_task(self._db_stage(db_queue))
+
+            # Cada estágio é encerrado (com um None por consumidor) quando o anterior termina
+            await self._discover(paths, ocr_queue)
+            for _ in ocr_tasks:
+                await ocr_queue.put(None)
+            await asyncio.gather(*ocr_tasks)
+            for _ in llm_tasks:
+                await llm_queue.put(None)
+            await asyncio.gather(*llm_tasks)
+            await db_queue.put(None)
+            await db_task
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if self.llm_extractor is not None:
+                await self.llm_extractor.aclose()
+
+    def run(self, paths: List[str]) -> Dict[str, float]:
+        """
+        Executa a ingestão dos caminhos informados e retorna as métricas de vazão.
+
+        Args:
+            paths (List[str]): Arquivos, diretórios e/ou ZIPs.
+        """
+        self.counters.clear()
+        self.stage_seconds.clear()
+        start = time.perf_counter()
+        asyncio.run(self._run(paths))
+        elapsed = time.perf_counter() - start
+
+        resumo = dict(self.counters)
+        resumo['segundos'] = round(elapsed, 2)
+        resumo['documentos_por_segundo'] = round(self.counters['salvos'] / elapsed, 2) if elapsed else 0.0
+        resumo['mb_por_segundo'] = round(self.counters['bytes'] / 1e6 / elapsed, 3) if elapsed else 0.0
+        # Tempo médio por arquivo em cada estágio (o banco é medido por documento gravado)
+        processed_by_stage = {'ocr': 'ocr_ok', 'llm': 'llm_ok', 'banco': 'salvos'}
+        for stage, seconds in self.stage_seconds.items():
+            processed = self.counters[processed_by_stage[stage]]
+            resumo[f'{stage}_segundos_medio'] = round(seconds / processed, 3) if processed else 0.0
+        if self.llm_extractor is not None:
+            savings = self.llm_extractor.token_savings_summary()
+            resumo['chamadas_llm'] = savings.get('chamadas_llm', 0)
+            resumo['tokens_estimados_economizados'] = savings['tokens_estimados_economizados']
+        return resumo
+
+
+class UploadJobHandler:
+    """
+    Processa os arquivos enviados pela interface à fila de trabalhos (utils/job_queue.py):
+    OCR -> LLM -> banco, registrando o andamento e os resultados no JobTask.
+
+    ZIPs são percorridos membro a membro e os textos vão ao LLM em lotes concorrentes.
+    Com a deduplicação ligada, arquivos idênticos a um já processado dispensam o OCR e o
+    LLM, e notas já gravadas com a mesma chave de acesso dispensam o LLM (ver
+    `DatabaseHandler.find_duplicate`).
+    """
+
+    # Tamanho máximo do texto guardado em cada resultado (o texto completo fica no banco).
+    RESULT_CONTENT_CHARS = 20000
+
+    def __init__(self, ocr_processor, db_handler: DatabaseHandler, llm_extractor: Optional[LlmExtractor] = None,
+                 llm_batch_size: int = 16):
+        """
+        Args:
+            ocr_processor (OcrProcessor): Extrator de texto.
+            db_handler (DatabaseHandler): Destino dos documentos.
+            llm_extractor (LlmExtractor, optional): Extrator usado quando o trabalho não traz o
+                                                    seu (`context["llm_extractor"]`).
+            llm_batch_size (int): Documentos de um ZIP enviados ao LLM em cada lote concorrente.
+        """
+        self.ocr_processor = ocr_processor
+        self.db_handler = db_handler
+        self.llm_extractor = llm_extractor
+        self.llm_batch_size = max(1, llm_batch_size)
+
+    def __call__(self, task: JobTask):
+        llm_extractor = task.context.get("llm_extractor") or self.llm_extractor
+        if os.path.splitext(task.nome)[1].lower() == '.zip':
+            self._process_zip(task, llm_extractor)
+            return
+        with open(task.caminho, 'rb') as file:
+            data = file.read()
+        task.report(0.1, "Extraindo texto...")
+        item = self._extract(task, task.nome, data, llm_extractor)
+        task.check_cancelled()
+        if item is not None:
+            self._save_batch(task, [item], llm_extractor)
+
+    def _process_zip(self, task: JobTask, llm_extractor: Optional[LlmExtractor]):
+        # O ZIP é percorrido membro a membro, sem carregá-lo inteiro em memória
+        reader = ZipStreamReader(task.caminho)
+        batch = []
+        for member in reader:
+            task.check_cancelled()
+            task.report(member.progress * 0.95, f"Processando '{member.path}'...")
+            item = self._extract(task, member.name, member.getvalue(), llm_extractor)
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.llm_batch_size:
+                self._save_batch(task, batch, llm_extractor)
+                batch = []
+        self._save_batch(task, batch, llm_extractor)
+        for member_path, reason in reader.skipped:
+            task.add_result({"nome_arquivo": member_path, "status": "aviso",
+                             "mensagem": f"'{member_path}' foi ignorado: {reason}."})
+
+    def _extract(self, task: JobTask, name: str, data: bytes,
+                 llm_extractor: Optional[LlmExtractor]) -> Optional[Tuple[str, str, str, Optional[Dict], Optional[str]]]:
+        """
+        Extrai o texto de um arquivo, registrando avisos e erros como resultados.
+
+        Returns:
+            Tupla (nome, texto, hash do arquivo, campos ou None, mensagem), ou None em caso de falha.
+            Os campos já preenchidos (XML fiscal ou duplicata) dispensam o LLM.
+        """
+        file_hash = content_hash(data)
+        deduplicate = self.db_handler.deduplicate
+        if deduplicate and self.db_handler.find_duplicate(hash_arquivo=file_hash) is not None:
+            return name, "", file_hash, {}, "Arquivo idêntico a um já processado; OCR e IA dispensados."
+        try:
+            text, fields = self.ocr_processor.process_file_structured(_InMemoryFile(name, data))
+        except NotImplementedError as e:
+            task.add_result({"nome_arquivo": name, "status": "aviso", "mensagem": str(e)})
+            return None
+        except Exception as e:
+            task.add_result({"nome_arquivo": name, "status": "erro", "mensagem": str(e)})
+            return None
+
+        if fields is not None:
+            return name, text, file_hash, fields, "Campos lidos diretamente do XML fiscal; a análise com IA não é necessária."
+        if llm_extractor is not None and deduplicate:
+            # Apenas uma nota já gravada com a mesma chave de acesso (validada) dispensa o LLM
+            local_fields = pre_extract(text)
+            if (local_fields.get('chave_acesso')
+                    and self.db_handler.find_duplicate(campos=access_key_fields(local_fields)) is not None):
+                return name, text, file_hash, local_fields, "Documento já processado; a análise com IA não é necessária."
+        return name, text, file_hash, None, None
+
+    def _save_batch(self, task: JobTask, items: List[Tuple], llm_extractor: Optional[LlmExtractor]):
+        """Envia ao LLM os textos ainda sem campos, grava os documentos e registra os resultados."""
+        if not items:
+            return
+        all_details: List = [fields for _, _, _, fields, _ in items]
+        pending = [i for i, fields in enumerate(all_details) if fields is None]
+        if llm_extractor is not None and pending:
+            task.check_cancelled()
+            task.report(None, f"Analisando {len(pending)} documento(s) com IA...")
+            llm_details = llm_extractor.extract_details_many([items[i][1] for i in pending])
+            for i, details in zip(pending, llm_details):
+                all_details[i] = details
+
+        docs, messages = [], []
+        for (name, text, file_hash, _, message), details in zip(items, all_details):
+            if isinstance(details, Exception):
+                task.add_result({"nome_arquivo": name, "status": "erro", "mensagem": str(details)})
+                continue
+            docs.append(build_document(name, text, details, hash_arquivo=file_hash))
+            messages.append(message)
+
+        # Todos os documentos do lote são gravados em uma única transação
+        self.db_handler.save_documents(docs)
+        for doc, message in zip(docs, messages):
+            document = doc.to_dict()
+            content = document.pop('conteudo_extraido', '') or ''
+            task.add_result({
+                "nome_arquivo": doc.nome_arquivo,
+                "status": "duplicata" if doc.duplicata_de is not None else "salvo",
+                "mensagem": message,
+                "documento": document,
+                "conteudo": content[:self.RESULT_CONTENT_CHARS],
+            })
@@ -0,0 +1,524 @@
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+from utils.metrics import metrics
+
+# Estados de um arquivo na fila; os três últimos são finais.
+PENDENTE, PROCESSANDO, CONCLUIDO, ERRO, CANCELADO = "pendente", "processando", "concluido", "erro", "cancelado"
+_FINAIS = (CONCLUIDO, ERRO, CANCELADO)
+
+_NOME_SEGURO = re.compile(r"[^\w.\-]+")
+
+# Tamanho dos blocos copiados para o disco no envio (os arquivos não são lidos inteiros para a memória)
+_COPY_CHUNK = 1024 * 1024
+
+
+class JobCancelled(Exception):
+    """O trabalho foi cancelado enquanto o arquivo era processado."""
+
+
+class JobTask:
+    """
+    Um arquivo de um trabalho, entregue ao handler por um worker.
+
+    O handler lê o arquivo em `caminho`, informa o andamento com `report` e registra
+    cada documento produzido com `add_result`. Em processamentos longos (ex: ZIPs),
+    deve chamar `check_cancelled` entre as etapas.
+    """
+
+    def __init__(self, queue: "JobQueue", file_id: int, job_id: str, nome: str, caminho: str,
+                 tamanho: int, dono: str, context: Optional[Dict[str, Any]]):
+        self.queue = queue
+        self.file_id = file_id
+        self.job_id = job_id
+        self.nome = nome
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.dono = dono
+        # Objetos da sessão que enviou o trabalho (ex: o LlmExtractor); não são persistidos
+        self.context = context or {}
+
+    def report(self, progresso: Optional[float], mensagem: Optional[str] = None):
+        """Atualiza o andamento do arquivo (0 a 1; None mantém o atual) e, opcionalmente, a mensagem."""
+        if progresso is not None:
+            progresso = min(max(progresso, 0.0), 1.0)
+        self.queue._update_file(self.file_id, progresso=progresso, mensagem=mensagem)
+
+    def add_result(self, resultado: Dict[str, Any]):
+        """Registra um resultado (um documento salvo, uma duplicata, um aviso ou um erro)."""
+        self.queue._add_result(self.job_id, self.file_id, resultado)
+
+    def is_cancelled(self) -> bool:
+        return self.queue.is_cancelled(self.job_id)
+
+    def check_cancelled(self):
+        """Interrompe o processamento (JobCancelled) se o trabalho foi cancelado."""
+        if self.is_cancelled():
+            raise JobCancelled(self.job_id)
+
+
+class JobQueue:
+    """
+    Fila de trabalhos persistente (SQLite) processada por threads em segundo plano.
+
+    Cada trabalho reúne os arquivos enviados de uma vez por um dono (ex: a sessão do
+    navegador). Os arquivos são gravados em `upload_dir` e processados um a um pelo
+    handler; o estado, o andamento e os resultados ficam no banco, de modo que a interface
+    pode consultá-los a qualquer momento (inclusive depois de recarregar a página) e os
+    arquivos pendentes são retomados quando o processo reinicia.
+
+    Ordem de atendimento:
+      * entre os donos, rodízio: o próximo arquivo é do dono atendido há mais tempo, para
+        que um envio grande não faça os demais usuários esperarem;
+      * dentro de um dono, os arquivos menores primeiro, exceto os que já esperam há mais
+        de `max_wait` segundos (que passam à frente, para não ficarem esperando para sempre).
+    """
+
+    def __init__(self, db_path: str = "data/jobs.db", upload_dir: str = "data/uploads",
+                 handler: Optional[Callable[[JobTask], None]] = None, workers: int = 2,
+                 poll_interval: float = 1.0, max_wait: float = 300.0):
+        """
+        Args:
+            db_path (str): O caminho para o arquivo SQLite da fila.
+            upload_dir (str): Diretório onde os arquivos enviados aguardam o processamento.
+            handler (Callable[[JobTask], None], optional): Função que processa um arquivo.
+                                                           Sem ela, `start` não inicia workers.
+            workers (int): Quantidade de threads de processamento.
+            poll_interval (float): Intervalo, em segundos, entre as consultas de um worker ocioso.
+            max_wait (float): Espera, em segundos, a partir da qual um arquivo grande passa
+                              à frente dos menores.
+        """
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+
+        self._lock = threading.RLock()
+        # Avisa os workers ociosos de novos envios; a geração evita perder um aviso que chega
+        # entre a consulta sem resultado e o início da espera
+        self._wakeup = threading.Condition()
+        self._generation = 0
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._contexts: Dict[str, Dict[str, Any]] = {}
+
+        os.makedirs(upload_dir, exist_ok=True)
+        # Conexão única compartilhada entre as threads, protegida pelo lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA busy_timeout=5000;")
+        self._create_tables()
+        self._recover()
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS trabalhos (
+                    id TEXT PRIMARY KEY,
+                    dono TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    criado_em REAL NOT NULL,
+                    iniciado_em REAL,
+                    concluido_em REAL,
+                    cancelado INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_trabalhos_dono ON trabalhos (dono, criado_em);
+
+                CREATE TABLE IF NOT EXISTS arquivos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    trabalho_id TEXT NOT NULL REFERENCES trabalhos(id),
+                    dono TEXT NOT NULL,
+                    nome TEXT NOT NULL,
+                    caminho TEXT NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    progresso REAL NOT NULL DEFAULT 0,
+                    mensagem TEXT,
+                    criado_em REAL NOT NULL,
+                    iniciado_em REAL,
+                    concluido_em REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_arquivos_trabalho ON arquivos (trabalho_id);
+                -- Busca dos pendentes de um dono, menores primeiro
+                CREATE INDEX IF NOT EXISTS idx_arquivos_pendentes ON arquivos (dono, tamanho)
+                    WHERE status = 'pendente';
+
+                CREATE TABLE IF NOT EXISTS resultados (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    trabalho_id TEXT NOT NULL,
+                    arquivo_id INTEGER NOT NULL,
+                    dados TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_resultados_trabalho ON resultados (trabalho_id, id);
+
+                -- Último atendimento de cada dono (rodízio entre os donos)
+                CREATE TABLE IF NOT EXISTS donos (
+                    dono TEXT PRIMARY KEY,
+                    atendido_em REAL NOT NULL
+                );
+            """)
+
+    def _recover(self):
+        """Devolve à fila os arquivos que estavam em processamento quando o processo terminou."""
+        with self._lock:
+            # Os resultados parciais são descartados: o arquivo será processado do início
+            self._conn.execute(
+                "DELETE FROM resultados WHERE arquivo_id IN (SELECT id FROM arquivos WHERE status = ?);",
+                (PROCESSANDO,),
+            )
+            self._conn.execute(
+                "UPDATE arquivos SET status = ?, progresso = 0, mensagem = 'Retomado após reinício' WHERE status = ?;",
+                (PENDENTE, PROCESSANDO),
+            )
+
+    # --- Envio e consulta ---
+
+    def submit(self, dono: str, arquivos: List[Tuple[str, Union[BinaryIO, bytes]]],
+               context: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Grava os arquivos em disco e os coloca na fila como um novo trabalho.
+
+        Args:
+            dono (str): Identificador de quem enviou (ex: a sessão do navegador).
+            arquivos (List[Tuple[str, Union[BinaryIO, bytes]]]): (nome do arquivo, conteúdo) de cada
+                                                                 arquivo. O conteúdo pode ser um objeto
+                                                                 de arquivo binário (ex: o UploadedFile do
+                                                                 Streamlit), copiado para o disco em blocos.
+            context (Dict[str, Any], optional): Objetos repassados ao handler em `JobTask.context`
+                                                (ex: o LlmExtractor da sessão). Ficam apenas em
+                                                memória: após um reinício, o handler usa seus padrões.
+
+        Returns:
+            str: O id do trabalho.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.upload_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        now = time.time()
+        rows = []
+        try:
+            for position, (nome, data) in enumerate(arquivos):
+                caminho = os.path.join(job_dir, f"{position:04d}_{_NOME_SEGURO.sub('_', os.path.basename(nome))}")
+                rows.append((job_id, dono, nome, caminho, self._spool(data, caminho), PENDENTE, now))
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        if context:
+            self._contexts[job_id] = context
+        with self._lock:
+            self._conn.execute("BEGIN;")
+            try:
+                self._conn.execute(
+                    "INSERT INTO trabalhos (id, dono, status, criado_em) VALUES (?, ?, ?, ?);",
+                    (job_id, dono, PENDENTE if rows else CONCLUIDO, now),
+                )
+                self._conn.executemany(
+                    "INSERT INTO arquivos (trabalho_id, dono, nome, caminho, tamanho, status, criado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    rows,
+                )
+                self._conn.execute("COMMIT;")
+            except Exception:
+                self._conn.execute("ROLLBACK;")
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise
+        metrics.inc("fila_arquivos_total", len(rows), status="enviado")
+        self._notify()
+        return job_id
+
+    @staticmethod
+    def _spool(data: Union[BinaryIO, bytes], caminho: str) -> int:
+        """Copia o conteúdo enviado para `caminho`, em blocos, e retorna o tamanho gravado."""
+        source = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        if hasattr(source, "seekable") and source.seekable():
+            # O objeto pode já ter sido lido (ex: pelo Streamlit ao exibir o arquivo)
+            source.seek(0)
+        with open(caminho, "wb") as file:
+            shutil.copyfileobj(source, file, _COPY_CHUNK)
+            return file.tell()
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Estado do trabalho e de cada arquivo.
+
+        Returns:
+            Optional[Dict[str, Any]]: id, dono, status, datas, "progresso" (0 a 1, média dos
+                                      arquivos), "posicao" (arquivos de outros trabalhos à
+                                      frente na fila, aproximado) e "arquivos" (nome, tamanho,
+                                      status, progresso e mensagem de cada um); None se o
+                                      trabalho não existir.
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM trabalhos WHERE id = ?;", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([d[0] for d in cursor.description], row))
+            cursor = self._conn.execute(
+                "SELECT id, nome, tamanho, status, progresso, mensagem, iniciado_em, concluido_em "
+                "FROM arquivos WHERE trabalho_id = ? ORDER BY id;",
+                (job_id,),
+            )
+            columns = [d[0] for d in cursor.description]
+            files = [dict(zip(columns, file_row)) for file_row in cursor.fetchall()]
+            ahead = 0
+            if job["status"] == PENDENTE:
+                ahead = self._conn.execute(
+                    "SELECT COUNT(*) FROM arquivos WHERE status IN (?, ?) AND criado_em < ? AND trabalho_id != ?;",
+                    (PENDENTE, PROCESSANDO, job["criado_em"], job_id),
+                ).fetchone()[0]
+        job["cancelado"] = bool(job["cancelado"])
+        job["arquivos"] = files
+        job["progresso"] = (sum(1.0 if f["status"] in _FINAIS else f["progresso"] for f in files) / len(files)
+                            if files else 1.0)
+        job["posicao"] = ahead
+        return job
+
+    def results(self, job_id: str, after_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Resultados registrados pelo handler, em ordem.
+
+        Args:
+            job_id (str): O id do trabalho.
+            after_id (int): Retorna apenas os resultados posteriores a este id (consulta incremental).
+            limit (int): Quantidade máxima de resultados.
+
+        Returns:
+            List[Dict[str, Any]]: Os resultados, cada um com seu "id" e o "arquivo_id" de origem.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, arquivo_id, dados FROM resultados WHERE trabalho_id = ? AND id > ? ORDER BY id LIMIT ?;",
+                (job_id, after_id, limit),
+            ).fetchall()
+        return [{"id": result_id, "arquivo_id": file_id, **json.loads(data)} for result_id, file_id, data in rows]
+
+    def jobs_for(self, dono: str, limit: int = 20) -> List[str]:
+        """Ids dos trabalhos mais recentes de um dono."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM trabalhos WHERE dono = ? ORDER BY criado_em DESC LIMIT ?;", (dono, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancela o trabalho: os arquivos pendentes não serão processados e o arquivo em
+        andamento é interrompido na próxima verificação do handler.
+
+        Returns:
+            bool: False se o trabalho não existir ou já tiver terminado.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE;")
+            try:
+                updated = self._conn.execute(
+                    "UPDATE trabalhos SET cancelado = 1 WHERE id = ? AND status IN (?, ?);",
+                    (job_id, PENDENTE, PROCESSANDO),
+                ).rowcount
+                paths = []
+                if updated:
+                    paths = [row[0] for row in self._conn.execute(
+                        "SELECT caminho FROM arquivos WHERE trabalho_id = ? AND status = ?;", (job_id, PENDENTE))]
+                    self._conn.execute(
+                        "UPDATE arquivos SET status = ?, mensagem = 'Cancelado', concluido_em = ? "
+                        "WHERE trabalho_id = ? AND status = ?;",
+                        (CANCELADO, now, job_id, PENDENTE),
+                    )
+                    self._refresh_job(job_id, now)
+                self._conn.execute("COMMIT;")
+            except Exception:
+                self._conn.execute("ROLLBACK;")
+                raise
+        for path in paths:
+            self._remove_upload(path)
+        return bool(updated)
+
+    def is_cancelled(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancelado FROM trabalhos WHERE id = ?;", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def pending_count(self) -> int:
+        """Quantidade de arquivos aguardando ou em processamento (todos os donos)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM arquivos WHERE status IN (?, ?);", (PENDENTE, PROCESSANDO)
+            ).fetchone()[0]
+
+    # --- Workers ---
+
+    def start(self):
+        """Inicia as threads de processamento (uma única vez)."""
+        if self.handler is None or self._threads:
+            return
+        self._stop.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Pede o encerramento dos workers e aguarda o arquivo em andamento de cada um."""
+        self._stop.set()
+        self._notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _notify(self):
+        with self._wakeup:
+            self._generation += 1
+            self._wakeup.notify_all()
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            with self._wakeup:
+                generation = self._generation
+            try:
+                task = self._claim()
+            except sqlite3.Error as e:
+                print(f"[Fila] Falha ao buscar o próximo arquivo: {e}")
+                task = None
+            if task is None:
+                # Acordado por um envio feito desde a consulta acima ou, no máximo, após poll_interval
+                with self._wakeup:
+                    self._wakeup.wait_for(lambda: self._generation != generation or self._stop.is_set(),
+                                          self.poll_interval)
+                continue
+            self._run_task(task)
+
+    def _run_task(self, task: JobTask):
+        status, message = CONCLUIDO, None
+        start = time.perf_counter()
+        try:
+            self.handler(task)
+        except JobCancelled:
+            status, message = CANCELADO, "Cancelado"
+        except Exception as e:
+            status, message = ERRO, str(e)
+            print(f"[Fila] Falha em '{task.nome}' (trabalho {task.job_id}): {e}")
+        metrics.observe("fila_processamento_segundos", time.perf_counter() - start)
+        metrics.inc("fila_arquivos_total", status=status)
+        try:
+            self._finish(task, status, message)
+        except Exception as e:
+            # O worker continua; o arquivo fica "processando" e volta à fila no próximo reinício
+            print(f"[Fila] Falha ao registrar o fim de '{task.nome}' (trabalho {task.job_id}): {e}")
+
+    def _claim(self) -> Optional[JobTask]:
+        """Reserva o próximo arquivo pendente (rodízio entre donos, menores primeiro)."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: a reserva é atômica mesmo com workers em outros processos
+            self._conn.execute("BEGIN IMMEDIATE;")
+            try:
+                owner = self._conn.execute("""
+                    SELECT a.dono FROM arquivos AS a
+                    LEFT JOIN donos AS d ON d.dono = a.dono
+                    WHERE a.status = ?
+                    GROUP BY a.dono
+                    ORDER BY COALESCE(MAX(d.atendido_em), 0), MIN(a.criado_em)
+                    LIMIT 1;
+                """, (PENDENTE,)).fetchone()
+                if owner is None:
+                    self._conn.execute("COMMIT;")
+                    return None
+                row = self._conn.execute("""
+                    SELECT id, trabalho_id, nome, caminho, tamanho, criado_em FROM arquivos
+                    WHERE dono = ? AND status = ?
+                    ORDER BY criado_em < ? DESC, tamanho, id
+                    LIMIT 1;
+                """, (owner[0], PENDENTE, now - self.max_wait)).fetchone()
+                file_id, job_id, nome, caminho, tamanho, criado_em = row
+                self._conn.execute(
+                    "UPDATE arquivos SET status = ?, progresso = 0, mensagem = NULL, iniciado_em = ? WHERE id = ?;",
+                    (PROCESSANDO, now, file_id),
+                )
+                self._conn.execute(
+                    "UPDATE trabalhos SET status = ?, iniciado_em = COALESCE(iniciado_em, ?) WHERE id = ?;",
+                    (PROCESSANDO, now, job_id),
+                )
+                self._conn.execute(
+                    "INSERT INTO donos (dono, atendido_em) VALUES (?, ?) "
+                    "ON CONFLICT(dono) DO UPDATE SET atendido_em = excluded.atendido_em;",
+                    (owner[0], now),
+                )
+                self._conn.execute("COMMIT;")
+            except Exception:
+                self._conn.execute("ROLLBACK;")
+                raise
+        metrics.observe("fila_espera_segundos", now - criado_em)
+        return JobTask(self, file_id, job_id, nome, caminho, tamanho, owner[0], self._contexts.get(job_id))
+
+    def _finish(self, task: JobTask, status: str, message: Optional[str]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE;")
+            try:
+                self._conn.execute(
+                    "UPDATE arquivos SET status = ?, progresso = 1, mensagem = ?, "
+                    "concluido_em = ? WHERE id = ?;",
+                    (status, message, now, task.file_id),
+                )
+                self._refresh_job(task.job_id, now)
+                self._conn.execute("COMMIT;")
+            except Exception:
+                self._conn.execute("ROLLBACK;")
+                raise
+        self._remove_upload(task.caminho)
+
+    def _refresh_job(self, job_id: str, now: float):
+        """Conclui o trabalho quando todos os seus arquivos chegaram a um estado final."""
+        remaining, cancelled = self._conn.execute(
+            "SELECT (SELECT COUNT(*) FROM arquivos WHERE trabalho_id = ? AND status IN (?, ?)), "
+            "cancelado FROM trabalhos WHERE id = ?;",
+            (job_id, PENDENTE, PROCESSANDO, job_id),
+        ).fetchone()
+        if remaining == 0:
+            self._conn.execute(
+                "UPDATE trabalhos SET status = ?, concluido_em = ? WHERE id = ?;",
+                (CANCELADO if cancelled else CONCLUIDO, now, job_id),
+            )
+            self._contexts.pop(job_id, None)
+            shutil.rmtree(os.path.join(self.upload_dir, job_id), ignore_errors=True)
+
+    def _update_file(self, file_id: int, progresso: Optional[float], mensagem: Optional[str]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE arquivos SET progresso = COALESCE(?, progresso), mensagem = COALESCE(?, mensagem) "
+                "WHERE id = ?;",
+                (progresso, mensagem, file_id),
+            )
+
+    def _add_result(self, job_id: str, file_id: int, resultado: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO resultados (trabalho_id, arquivo_id, dados) VALUES (?, ?, ?);",
+                (job_id, file_id, json.dumps(resultado, ensure_ascii=False, default=str)),
+            )
+
+    @staticmethod
+    def _remove_upload(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def close(self):
+        """Encerra os workers e fecha a conexão."""
+        self.stop()
+        with self._lock:
+            self._conn.close()
@@ -1,34 +1,180 @@
+import asyncio
 import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-from openai import OpenAI
+from openai import (APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, OpenAI,
+                    RateLimitError)
+
+from utils.metrics import metrics
+from utils.regex_extractor import extract_hints, pre_extract, select_windows
+from utils.result_cache import ResultCache, text_hash
+
+# Modelo usado na extração. O PROMPT_VERSION deve ser incrementado sempre que o
+# prompt mudar, para que resultados antigos do cache não sejam reaproveitados.
+MODEL = "gpt-3.5-turbo-1106"  # Modelo otimizado para seguir instruções e retornar JSON
+PROMPT_VERSION = "4"
+CACHE_NAMESPACE = "llm"
+
+# Limite de caracteres do documento enviados no prompt (seguro para modelos como gpt-3.5-turbo).
+MAX_PROMPT_CHARS = 12000
+
+# Campos pedidos ao LLM e suas instruções, na ordem do prompt.
+FIELD_DESCRIPTIONS = {
+    "tipo_documento": 'Classifique o documento (ex: "Nota Fiscal", "Contrato de Aluguel", "Fatura de Cartão", "CNH", "Orçamento").',
+    "numero_nf": "Se for uma nota fiscal, o número dela.",
+    "cnpj_emitente": "O CNPJ do emissor do documento, se aplicável.",
+    "nome_emitente": "O nome do emissor do documento, se aplicável.",
+    "cnpj_destinatario": "O CNPJ do destinatário, se aplicável.",
+    "nome_destinatario": "O nome do destinatário, se aplicável.",
+    "data_emissao": "A data de emissão do documento (formato AAAA-MM-DD).",
+    "valor_total": "O valor total, se for um documento financeiro (formato numérico).",
+}
+
+# Sugestões de `extract_hints`: descrição no prompt e campos a que se aplicam.
+HINT_DESCRIPTIONS = {
+    "cnpj_cpf": "CNPJs/CPFs válidos (identifique a quem cada um pertence)",
+    "valor_total": "Valores com rótulo genérico de total (podem ser de um item)",
+}
+HINT_FIELDS = {
+    "cnpj_cpf": ("cnpj_emitente", "cnpj_destinatario"),
+    "valor_total": ("valor_total",),
+}
+
+SYSTEM_PROMPT = "Você é um assistente especialista em extração de dados de documentos e responde em formato JSON."
+
+# Estimativa de tokens da resposta, usada para reservar o orçamento de tokens por minuto.
+ESTIMATED_COMPLETION_TOKENS = 300
+# Estimativa simples: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+
+class _RateLimiter:
+    """
+    Limita requisições e tokens por minuto usando uma janela deslizante de 60 segundos.
+
+    Deve ser usado dentro de um único event loop.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int], tokens_per_minute: Optional[int]):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._events: deque = deque()  # (instante, tokens)
+        self._tokens_in_window = 0
+        self._lock = asyncio.Lock()
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] >= 60.0:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def _has_room(self, tokens: int) -> bool:
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            return False
+        if self.tokens_per_minute and self._events and self._tokens_in_window + tokens > self.tokens_per_minute:
+            return False
+        return True
+
+    async def acquire(self, tokens: int):
+        """Aguarda até que a requisição (com a estimativa de tokens) caiba no orçamento."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                if self._has_room(tokens):
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                # Espera a saída do evento mais antigo da janela
+                await asyncio.sleep(max(0.01, 60.0 - (now - self._events[0][0])))
 
 
 class LlmExtractor:
     """
     Usa um LLM (GPT) para extrair informações estruturadas de um texto.
+
+    As chamadas assíncronas de todas as threads (ex: os workers da fila de trabalhos) são
+    feitas em um único event loop do extrator, rodando em uma thread própria: o cliente,
+    o limite de concorrência e o orçamento de requisições/tokens por minuto são
+    compartilhados e valem para o processo inteiro.
     """
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache: Optional[ResultCache] = None, base_url: Optional[str] = None,
+                 max_concurrency: int = 8, requests_per_minute: Optional[int] = 500,
+                 tokens_per_minute: Optional[int] = 160000, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        """
+        Args:
+            api_key (str): A chave da API da OpenAI.
+            cache (ResultCache, optional): Cache persistente das respostas, indexado pelo hash
+                                           do texto, do modelo e da versão do prompt.
+            base_url (str, optional): URL alternativa da API (ex: servidor local compatível
+                                      com a OpenAI usado em testes). Defaults to None.
+            max_concurrency (int): Máximo de chamadas simultâneas no modo assíncrono.
+            requests_per_minute (int, optional): Orçamento de requisições por minuto (None = sem limite).
+            tokens_per_minute (int, optional): Orçamento de tokens por minuto (None = sem limite).
+            max_retries (int): Tentativas extras em respostas 429/5xx ou falhas de conexão.
+            backoff_base (float): Espera inicial, em segundos, entre as tentativas.
+            backoff_max (float): Espera máxima, em segundos, entre as tentativas.
+        """
         if not api_key:
             raise ValueError("A chave da API da OpenAI é necessária para usar o extrator LLM.")
-        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.cache = cache
+
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # Event loop do extrator (criado na primeira chamada assíncrona) e o estado vinculado
+        # a ele: cliente, semáforo e limitador
+        self._loop_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._rate_limiter: Optional[_RateLimiter] = None
+        self._stats_lock = threading.Lock()
 
-    def _build_prompt(self, text: str) -> str:
-        """Constrói o prompt para o LLM, instruindo-o a extrair dados em JSON."""
+        # Economia obtida pela extração local: relatório por documento (os mais recentes)
+        # e totais acumulados (ver token_savings_summary)
+        self.token_reports: deque = deque(maxlen=1000)
+        self.token_savings: Counter = Counter()
+
+    def _build_prompt(self, text: str, fields: Optional[List[str]] = None,
+                      hints: Optional[Dict[str, List[str]]] = None) -> str:
+        """
+        Constrói o prompt para o LLM, instruindo-o a extrair dados em JSON.
+
+        Args:
+            text (str): O texto (ou os trechos selecionados) do documento.
+            fields (List[str], optional): Os campos a pedir. Defaults to todos de FIELD_DESCRIPTIONS.
+            hints (Dict[str, List[str]], optional): Valores encontrados no texto sem rótulo que
+                                                    os identifique (ver `extract_hints`).
+        """
         # Limita o texto para evitar exceder o limite de tokens da API
-        max_chars = 12000  # Limite seguro para modelos como gpt-3.5-turbo
-        truncated_text = text[:max_chars]
+        truncated_text = text[:MAX_PROMPT_CHARS]
+        fields = fields or list(FIELD_DESCRIPTIONS)
+        instructions = "\n        ".join(
+            f'{i}. "{field}": {FIELD_DESCRIPTIONS[field]}' for i, field in enumerate(fields, start=1)
+        )
+        hint_lines = [f"{HINT_DESCRIPTIONS[name]}: {', '.join(values)}."
+                      for name, values in (hints or {}).items() if name in HINT_DESCRIPTIONS]
+        if hint_lines:
+            instructions += ("\n\n        Sugestões encontradas no texto (confirme pelo contexto antes de usar):\n        "
+                             + "\n        ".join(hint_lines))
 
         prompt = f"""
         Analise o texto do documento abaixo e extraia as seguintes informações em formato JSON:
-        1. "tipo_documento": Classifique o documento (ex: "Nota Fiscal", "Contrato de Aluguel", "Fatura de Cartão", "CNH", "Orçamento").
-        2. "numero_nf": Se for uma nota fiscal, o número dela.
-        3. "cnpj_emitente": O CNPJ do emissor do documento, se aplicável.
-        4. "nome_emitente": O nome do emissor do documento, se aplicável.
-        5. "cnpj_destinatario": O CNPJ do destinatário, se aplicável.
-        6. "nome_destinatario": O nome do destinatário, se aplicável.
-        7. "data_emissao": A data de emissão do documento (formato AAAA-MM-DD).
-        8. "valor_total": O valor total, se for um documento financeiro (formato numérico).
+        {instructions}
 
         Se uma informação não for encontrada, omita a chave correspondente do JSON.
         Responda APENAS com o objeto JSON, sem nenhum texto, explicação ou formatação adicional.
@@ -40,6 +186,97 @@ class LlmExtractor:
         """
         return prompt
 
+    def _build_request(self, prompt: str) -> dict:
+        """Monta os parâmetros da chamada `chat.completions.create` para um prompt."""
+        return {
+            "model": MODEL,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.0,  # Baixa temperatura para respostas mais determinísticas
+        }
+
+    def _prepare(self, text: str) -> Tuple[dict, Optional[dict]]:
+        """
+        Extrai localmente os campos determinísticos e monta a requisição só para o restante.
+
+        Returns:
+            Tuple[dict, Optional[dict]]: Os campos encontrados localmente e os parâmetros da
+                                         chamada ao LLM (None quando ela não é necessária).
+        """
+        local_fields = pre_extract(text)
+        missing = [field for field in FIELD_DESCRIPTIONS if field not in local_fields]
+
+        baseline_chars = len(SYSTEM_PROMPT) + len(self._build_prompt(text))
+        request = None
+        sent_chars = 0
+        if missing:
+            # Apenas os trechos relevantes para os campos que faltam são enviados
+            excerpt = select_windows(text, missing, MAX_PROMPT_CHARS)
+            # Valores sem rótulo que os identifique são só sugestões: o LLM decide pelo contexto
+            hints = {name: values for name, values in extract_hints(text).items()
+                     if any(field in missing for field in HINT_FIELDS[name])}
+            request = self._build_request(self._build_prompt(excerpt, missing, hints))
+            sent_chars = sum(len(message["content"]) for message in request["messages"])
+
+        report = {
+            "campos_locais": sorted(field for field in local_fields if field in FIELD_DESCRIPTIONS),
+            "campos_llm": missing,
+            "chamada_llm": request is not None,
+            "tokens_estimados_originais": baseline_chars // CHARS_PER_TOKEN,
+            "tokens_estimados_enviados": sent_chars // CHARS_PER_TOKEN,
+        }
+        report["tokens_estimados_economizados"] = (report["tokens_estimados_originais"]
+                                                   - report["tokens_estimados_enviados"])
+        with self._stats_lock:
+            self.token_reports.append(report)
+            self.token_savings["documentos"] += 1
+            self.token_savings["chamadas_llm"] += int(request is not None)
+            self.token_savings["tokens_estimados_originais"] += report["tokens_estimados_originais"]
+            self.token_savings["tokens_estimados_enviados"] += report["tokens_estimados_enviados"]
+        return local_fields, request
+
+    def token_savings_summary(self) -> dict:
+        """Resume a economia estimada de tokens e de chamadas obtida pela extração local."""
+        with self._stats_lock:
+            summary = dict(self.token_savings)
+        original = summary.get("tokens_estimados_originais", 0)
+        sent = summary.get("tokens_estimados_enviados", 0)
+        summary["tokens_estimados_economizados"] = original - sent
+        summary["economia_percentual"] = round(100 * (original - sent) / original, 1) if original else 0.0
+        return summary
+
+    @staticmethod
+    def _merge(local_fields: dict, llm_details: Optional[dict]) -> dict:
+        """Combina a resposta do LLM com os campos locais (validados, e por isso prioritários)."""
+        details = dict(llm_details or {})
+        details.update(local_fields)
+        return details
+
+    def _cache_key(self, text: str) -> str:
+        return text_hash(MODEL, PROMPT_VERSION, text)
+
+    def _get_cached(self, text: str) -> Optional[dict]:
+        if self.cache is None:
+            return None
+        return self.cache.get(CACHE_NAMESPACE, self._cache_key(text))
+
+    def _store_cached(self, text: str, details: dict):
+        if self.cache is not None:
+            self.cache.set(CACHE_NAMESPACE, self._cache_key(text), details)
+
+    @staticmethod
+    def _record_usage(response):
+        """Contabiliza os tokens informados pela API (response.usage)."""
+        metrics.inc("llm_requisicoes_total", status="ok")
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.inc("llm_tokens_total", usage.prompt_tokens or 0, tipo="prompt")
+            metrics.inc("llm_tokens_total", usage.completion_tokens or 0, tipo="completion")
+
+    @metrics.timed("llm_extracao_segundos", modo="sincrono")
     def extract_details(self, text: str) -> dict:
         """
         Envia o texto para o LLM e retorna os detalhes extraídos como um dicionário.
@@ -47,20 +284,162 @@ class LlmExtractor:
         if not text or not text.strip():
             return {"tipo_documento": "Vazio ou ilegível"}
 
-        prompt = self._build_prompt(text)
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo-1106",  # Modelo otimizado para seguir instruções e retornar JSON
-                messages=[
-                    {"role": "system", "content": "Você é um assistente especialista em extração de dados de documentos e responde em formato JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.0,  # Baixa temperatura para respostas mais determinísticas
-            )
-            json_response = response.choices[0].message.content
-            return json.loads(json_response)
-        except Exception as e:
-            print(f"Erro ao chamar a API da OpenAI: {e}")
-            raise RuntimeError(f"Falha na comunicação com a API da OpenAI: {e}")
\ No newline at end of file
+        cached_details = self._get_cached(text)
+        if cached_details is not None:
+            return cached_details
+
+        local_fields, request = self._prepare(text)
+        llm_details = None
+        if request is not None:
+            try:
+                response = self.client.chat.completions.create(**request)
+                self._record_usage(response)
+                json_response = response.choices[0].message.content
+                llm_details = json.loads(json_response)
+            except Exception as e:
+                metrics.inc("llm_requisicoes_total", status="erro")
+                print(f"Erro ao chamar a API da OpenAI: {e}")
+                raise RuntimeError(f"Falha na comunicação com a API da OpenAI: {e}")
+
+        details = self._merge(local_fields, llm_details)
+        self._store_cached(text, details)
+        return details
+
+    # --- Modo assíncrono / em lote ---
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Inicia, na primeira chamada, a thread com o event loop do extrator."""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-extractor-loop", daemon=True)
+                thread.start()
+                self._loop, self._loop_thread = loop, thread
+            return self._loop
+
+    def _ensure_async_state(self):
+        """Cria o cliente assíncrono, o semáforo e o limitador (no event loop do extrator)."""
+        if self._async_client is None:
+            # As novas tentativas são controladas aqui, com backoff e jitter próprios
+            self._async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._rate_limiter = _RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+
+    async def _in_extractor_loop(self, coroutine):
+        """Executa a corrotina no event loop do extrator e aguarda o resultado no loop atual."""
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop))
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Espera exponencial com jitter completo, respeitando o cabeçalho Retry-After."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after)) + random.uniform(0, self.backoff_base)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _acall(self, request: dict) -> dict:
+        """Envia a requisição ao LLM, com limite de concorrência, orçamento e novas tentativas."""
+        self._ensure_async_state()
+        estimated_tokens = (sum(len(m["content"]) for m in request["messages"]) // CHARS_PER_TOKEN
+                            + ESTIMATED_COMPLETION_TOKENS)
+
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await self._rate_limiter.acquire(estimated_tokens)
+                try:
+                    response = await self._async_client.chat.completions.create(**request)
+                    self._record_usage(response)
+                    return json.loads(response.choices[0].message.content)
+                except Exception as e:
+                    metrics.inc("llm_requisicoes_total", status="erro")
+                    if not self._is_retryable(e) or attempt >= self.max_retries:
+                        print(f"Erro ao chamar a API da OpenAI: {e}")
+                        raise RuntimeError(f"Falha na comunicação com a API da OpenAI: {e}")
+                    delay = self._backoff_delay(attempt, e)
+                    last_error = e
+            # A espera acontece fora do semáforo para liberar a vaga a outras requisições
+            attempt += 1
+            print(f"  Tentativa {attempt}/{self.max_retries} em {delay:.1f}s após erro: {last_error}")
+            await asyncio.sleep(delay)
+
+    @metrics.timed("llm_extracao_segundos", modo="assincrono")
+    async def aextract_details(self, text: str) -> dict:
+        """
+        Versão assíncrona de `extract_details`, sujeita ao limite de concorrência,
+        ao orçamento de requisições/tokens por minuto e às novas tentativas com backoff.
+
+        Pode ser chamada de qualquer event loop: a requisição é feita no loop do extrator.
+        """
+        if not text or not text.strip():
+            return {"tipo_documento": "Vazio ou ilegível"}
+
+        cached_details = self._get_cached(text)
+        if cached_details is not None:
+            return cached_details
+
+        local_fields, request = self._prepare(text)
+        llm_details = await self._in_extractor_loop(self._acall(request)) if request is not None else None
+        details = self._merge(local_fields, llm_details)
+        self._store_cached(text, details)
+        return details
+
+    async def aextract_details_many(self, texts: Iterable[str]) -> List[Union[dict, RuntimeError]]:
+        """
+        Extrai os detalhes de vários textos concorrentemente.
+
+        Returns:
+            List[Union[dict, RuntimeError]]: Um resultado por texto, na ordem de entrada.
+                                             Textos cuja extração falhou após todas as
+                                             tentativas recebem a exceção no lugar do dicionário.
+        """
+        return await asyncio.gather(*(self.aextract_details(text) for text in texts), return_exceptions=True)
+
+    def extract_details_many(self, texts: Iterable[str]) -> List[Union[dict, RuntimeError]]:
+        """
+        Versão síncrona de `aextract_details_many`, para uso fora de um event loop.
+
+        Pode ser chamada por várias threads ao mesmo tempo: todas compartilham o event loop,
+        o cliente e o orçamento do extrator.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.aextract_details_many(list(texts)), self._ensure_loop())
+        return future.result()
+
+    def close(self):
+        """
+        Fecha o cliente assíncrono e encerra o event loop do extrator (se iniciados).
+
+        Deve ser chamado sem extrações em andamento; uma nova chamada assíncrona inicia
+        outro event loop.
+        """
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop, self._loop_thread = None, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_client(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    async def _close_client(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+        self._async_client = None
+        self._semaphore = None
+        self._rate_limiter = None
+
+    async def aclose(self):
+        """Versão assíncrona de `close`, para uso dentro de um event loop."""
+        await asyncio.to_thread(self.close)
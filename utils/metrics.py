@@ -0,0 +1,268 @@
+import asyncio
+import functools
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Variável de ambiente que desativa a instrumentação ("0", "false" ou "nao").
+METRICS_ENV_VAR = "DOCUMENTOS_METRICAS"
+
+# Limites (em segundos) dos buckets dos histogramas de latência.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Descrição de cada métrica, usada nas linhas "# HELP" do formato Prometheus.
+METRIC_HELP = {
+    "ocr_arquivo_segundos": "Tempo total de extração de um arquivo (inclui o cache).",
+    "ocr_etapa_segundos": "Tempo de cada processador de formato (_process_*).",
+    "ocr_bytes_total": "Bytes de arquivos recebidos para extração.",
+    "ocr_arquivos_total": "Arquivos extraídos, por formato e origem (processado ou cache).",
+    "ocr_paginas_total": "Páginas de PDF processadas, por origem do texto.",
+    "llm_extracao_segundos": "Tempo de extração de detalhes de um documento pelo LLM.",
+    "llm_requisicoes_total": "Requisições enviadas à API do LLM.",
+    "llm_tokens_total": "Tokens consumidos na API do LLM, por tipo (prompt ou completion).",
+    "banco_gravacao_segundos": "Tempo de gravação de documentos no banco.",
+    "banco_documentos_total": "Documentos gravados no banco.",
+    "banco_duplicatas_total": "Documentos gravados como ligação a um canônico, por critério (hash, chave).",
+    "banco_possiveis_duplicatas_total": "Documentos gravados com texto quase idêntico ao de outro (possivel_duplicata_de).",
+    "fila_arquivos_total": "Arquivos da fila de trabalhos, por status (enviado, concluido, erro, cancelado).",
+    "fila_espera_segundos": "Tempo de espera de um arquivo na fila até o início do processamento.",
+    "fila_processamento_segundos": "Tempo de processamento de um arquivo da fila pelo handler.",
+    "erros_total": "Erros por operação instrumentada.",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _env_enabled() -> bool:
+    return os.environ.get(METRICS_ENV_VAR, "1").strip().lower() not in ("0", "false", "nao", "não")
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """Histograma cumulativo com buckets fixos (como o tipo histogram do Prometheus)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # o último é o bucket +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimativa do quantil pelo limite superior do bucket (como histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas em memória, com exportação no formato texto do Prometheus.
+
+    Quando desativado (`enabled=False`, ou a variável de ambiente DOCUMENTOS_METRICAS=0),
+    cada chamada instrumentada custa apenas a verificação de um atributo.
+    """
+
+    def __init__(self, prefix: str = "documentos", enabled: Optional[bool] = None):
+        """
+        Args:
+            prefix (str): Prefixo adicionado ao nome de todas as métricas exportadas.
+            enabled (bool, optional): Liga/desliga a coleta. Defaults to a variável de ambiente.
+        """
+        self.prefix = prefix
+        self.enabled = _env_enabled() if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # --- Coleta ---
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Incrementa um contador (nomes terminados em _total, por convenção)."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Registra uma observação (ex: latência em segundos) em um histograma."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """
+        Mede o bloco `with` no histograma `name`. Exceções incrementam `erros_total`
+        (com o rótulo `operacao`) e são propagadas.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("erros_total", operacao=name, **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels):
+        """Decorator equivalente a `timer`, para funções e corrotinas."""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with self.timer(name, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        """Descarta todas as séries coletadas."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # --- Consulta e exportação ---
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """
+        Resumo das métricas para exibição (ex: no painel de diagnóstico).
+
+        Returns:
+            Dict[str, List[Dict]]: {"contadores": [...], "histogramas": [...]}, uma linha por série,
+                                   com os rótulos como texto e, nos histogramas, contagem, soma,
+                                   média, p50 e p95 (em segundos).
+        """
+        with self._lock:
+            counters = [
+                {"metrica": name, "rotulos": _format_labels(key), "valor": value}
+                for name, series in sorted(self._counters.items()) for key, value in sorted(series.items())
+            ]
+            histograms = [
+                {
+                    "metrica": name,
+                    "rotulos": _format_labels(key),
+                    "contagem": histogram.count,
+                    "soma": round(histogram.sum, 4),
+                    "media": round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for name, series in sorted(self._histograms.items()) for key, histogram in sorted(series.items())
+            ]
+        return {"contadores": counters, "histogramas": histograms}
+
+    def render_prometheus(self) -> str:
+        """Gera as métricas no formato de exposição em texto do Prometheus (versão 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_format_labels(key, (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(key, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Grava as métricas em um arquivo (ex: para o textfile collector do node_exporter)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Escrita atômica: o coletor nunca lê um arquivo pela metade
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False, encoding="utf-8") as tmp:
+            tmp.write(self.render_prometheus())
+        os.replace(tmp.name, path)
+
+    def start_http_server(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Expõe as métricas em http://host:port/metrics, em uma thread de fundo.
+        Chamadas repetidas reutilizam o servidor já iniciado.
+        """
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Métricas disponíveis em http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+
+# Registro global usado pela instrumentação dos módulos.
+metrics = MetricsRegistry()
@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+
+class OcrEnginePool:
+    """
+    Conjunto de motores PaddleOCR pré-carregados, emprestados e devolvidos pelas threads.
+
+    O PaddleOCR (e o PaddlePaddle) só é importado quando o primeiro motor é construído,
+    o que pode acontecer em uma thread de fundo (`warm_start=True`). Assim, a aplicação
+    fica disponível imediatamente para formatos que não precisam de OCR (XML, DOCX,
+    PDFs com camada de texto) enquanto os motores são carregados.
+    """
+
+    def __init__(self, size: int = 1, engine_kwargs: Optional[Dict] = None, warm_start: bool = True):
+        """
+        Args:
+            size (int): Quantidade de motores mantidos no pool.
+            engine_kwargs (dict, optional): Parâmetros repassados ao construtor do PaddleOCR.
+            warm_start (bool): Se True, os motores começam a ser construídos em segundo plano
+                               imediatamente; caso contrário, apenas no primeiro uso.
+        """
+        self.size = max(1, size)
+        self.engine_kwargs = engine_kwargs or {}
+        self._engines: queue.Queue = queue.Queue()
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+        # Medidas do cold start
+        self._created_at = time.perf_counter()
+        self.import_seconds: Optional[float] = None
+        self.build_seconds: List[float] = []
+        self.first_ready_seconds: Optional[float] = None
+
+        if warm_start:
+            self.start()
+
+    def start(self):
+        """Inicia (uma única vez) a construção dos motores em segundo plano."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._build_engines, name="ocr-engine-pool", daemon=True)
+                self._thread.start()
+
+    def _build_engines(self):
+        try:
+            start = time.perf_counter()
+            # Importação pesada (PaddlePaddle), adiada até aqui de propósito
+            from paddleocr import PaddleOCR
+            self.import_seconds = time.perf_counter() - start
+
+            for i in range(self.size):
+                start = time.perf_counter()
+                engine = PaddleOCR(**self.engine_kwargs)
+                self.build_seconds.append(time.perf_counter() - start)
+                self._engines.put(engine)
+                if i == 0:
+                    self.first_ready_seconds = time.perf_counter() - self._created_at
+                    self._ready.set()
+                    print(f"Motor OCR pronto em {self.first_ready_seconds:.1f}s.")
+        except BaseException as e:
+            self._error = e
+            print(f"Falha ao carregar o motor OCR: {e}")
+            self._ready.set()
+
+    @property
+    def is_ready(self) -> bool:
+        """Indica se ao menos um motor já foi construído."""
+        return self._ready.is_set() and self._error is None
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda até que o primeiro motor esteja pronto. Retorna False se o tempo esgotar."""
+        self.start()
+        ready = self._ready.wait(timeout)
+        if self._error is not None:
+            raise RuntimeError(f"O motor OCR não pôde ser carregado: {self._error}")
+        return ready
+
+    @contextmanager
+    def engine(self, timeout: Optional[float] = None) -> Iterator:
+        """
+        Empresta um motor do pool durante o bloco `with` (bloqueia até haver um livre).
+
+        Raises:
+            RuntimeError: Se os motores não puderem ser carregados.
+            TimeoutError: Se nenhum motor ficar livre dentro de `timeout` segundos.
+        """
+        self.wait_ready(timeout)
+        try:
+            engine = self._engines.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Nenhum motor OCR livre dentro do tempo limite.")
+        try:
+            yield engine
+        finally:
+            self._engines.put(engine)
+
+    def cold_start_report(self) -> Dict:
+        """Resume o tempo de carregamento: importação, construção de cada motor e primeiro motor pronto."""
+        return {
+            "motores": self.size,
+            "motores_prontos": len(self.build_seconds),
+            "importacao_segundos": None if self.import_seconds is None else round(self.import_seconds, 2),
+            "construcao_segundos": [round(seconds, 2) for seconds in self.build_seconds],
+            "primeiro_motor_pronto_segundos": (None if self.first_ready_seconds is None
+                                               else round(self.first_ready_seconds, 2)),
+            "erro": None if self._error is None else str(self._error),
+        }
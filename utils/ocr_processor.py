@@ -1,12 +1,150 @@
 import io
+import multiprocessing
 import os
+import tempfile
+import threading
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Union
 
 import docx  # python-docx
 import numpy as np
-from paddleocr import PaddleOCR
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
+from pypdf import PdfReader
+
+from utils.fiscal_xml import parse_xml
+from utils.metrics import metrics
+from utils.ocr_engine_pool import OcrEnginePool
+from utils.result_cache import ResultCache, content_hash, text_hash
+
+# Parâmetros usados para construir o motor PaddleOCR (no processo principal e nos workers).
+OCR_ENGINE_KWARGS = {"use_angle_cls": True, "lang": "pt", "show_log": False}
+
+PAGE_SEPARATOR = "\n\n--- Fim da Página ---\n\n"
+
+# Origem do texto de cada página de PDF.
+PAGE_SOURCE_TEXT_LAYER = "camada_texto"
+PAGE_SOURCE_OCR = "ocr"
+
+# Namespace do cache de resultados usado para o texto extraído dos arquivos.
+CACHE_NAMESPACE = "extracao"
+IMAGE_ERROR_PREFIX = "Erro ao processar imagem:"
+
+# Resolução padrão da rasterização de PDFs (a mesma do pdf2image).
+DEFAULT_PDF_DPI = 200
+
+# Motor OCR exclusivo de cada processo worker (criado por _init_ocr_worker).
+_worker_engine = None
+
+
+def _ocr_result_to_text(result) -> str:
+    """Converte a saída do PaddleOCR em texto, uma linha por caixa detectada."""
+    text_lines = []
+    if result and result[0] is not None:
+        for line_info in result:
+            for line in line_info:
+                # A estrutura do resultado é [box, (texto, confiança)]
+                text_lines.append(line[1][0])
+    return "\n".join(text_lines)
+
+
+def _to_rgb_array(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+    """
+    Normaliza uma imagem PIL ou um array NumPy para um array RGB (H, W, 3) uint8.
+
+    A conversão de modo é feita uma única vez e, sempre que possível, o array
+    resultante compartilha a memória da imagem original (sem cópias extras).
+    """
+    if isinstance(image, Image.Image):
+        if image.mode != "RGB":
+            # RGBA, L, P, CMYK, etc. -> RGB (única cópia necessária)
+            image = image.convert("RGB")
+        return np.asarray(image)
+
+    if isinstance(image, np.ndarray):
+        if image.dtype != np.uint8:
+            image = image.astype(np.uint8, copy=False)
+        if image.ndim == 2:
+            # Tons de cinza -> 3 canais
+            return np.stack((image, image, image), axis=-1)
+        if image.ndim == 3 and image.shape[2] == 3:
+            return image
+        if image.ndim == 3 and image.shape[2] == 4:
+            # Descarta o canal alfa sem copiar os dados (view)
+            return image[:, :, :3]
+        if image.ndim == 3 and image.shape[2] == 1:
+            return np.repeat(image, 3, axis=2)
+        raise ValueError(f"Formato de array não suportado para OCR: {image.shape}")
+
+    raise TypeError(f"Tipo de imagem não suportado para OCR: {type(image).__name__}")
+
+
+def preprocess_image(image: Image.Image, max_side: Optional[int] = None, min_side: Optional[int] = None,
+                     grayscale: bool = False, binarize_threshold: Optional[int] = None) -> Image.Image:
+    """
+    Ajusta a resolução e as cores de uma imagem antes do OCR.
+
+    Args:
+        image (PIL.Image.Image): A imagem original (não é modificada).
+        max_side (int, optional): Imagens com o maior lado acima deste valor são reduzidas
+                                  (fotos de 12 MP são lentas e não ganham precisão).
+        min_side (int, optional): Imagens com o maior lado abaixo deste valor são ampliadas
+                                  (miniaturas têm letras pequenas demais para o detector).
+        grayscale (bool): Converte para tons de cinza.
+        binarize_threshold (int, optional): Limiar (0-255) para converter em preto e branco;
+                                            implica `grayscale`.
+
+    Returns:
+        PIL.Image.Image: A imagem ajustada (a própria imagem se nada precisar mudar).
+    """
+    width, height = image.size
+    long_side = max(width, height)
+    scale = 1.0
+    if max_side and long_side > max_side:
+        scale = max_side / long_side
+    elif min_side and long_side < min_side:
+        scale = min_side / long_side
+    if scale != 1.0:
+        resample = Image.Resampling.BILINEAR if scale < 1 else Image.Resampling.BICUBIC
+        # reducing_gap reduz primeiro por um fator inteiro (bem mais rápido em reduções grandes)
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                             resample, reducing_gap=2.0 if scale < 1 else None)
+
+    if grayscale or binarize_threshold is not None:
+        if image.mode != "L":
+            image = image.convert("L")
+        if binarize_threshold is not None:
+            image = image.point(lambda value: 255 if value >= binarize_threshold else 0)
+    return image
+
+
+def _init_ocr_worker(engine_kwargs: Dict) -> None:
+    """Inicializador do pool: cada processo worker carrega seu próprio PaddleOCR."""
+    global _worker_engine
+    from paddleocr import PaddleOCR
+    _worker_engine = PaddleOCR(**engine_kwargs)
+
+
+def _worker_ready() -> int:
+    """Tarefa vazia usada para forçar a criação (e o carregamento do motor) dos workers."""
+    return os.getpid()
+
+
+def _ocr_pdf_page(pdf_path: str, page_number: int, dpi: int, preprocess_options: Dict, angle_cls: bool) -> str:
+    """
+    Rasteriza uma única página do PDF e executa o OCR nela (executado no worker).
+
+    A página é convertida dentro do próprio worker, de modo que apenas o caminho
+    do arquivo e o número da página trafegam entre os processos.
+    """
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    if not images:
+        return ""
+    image = preprocess_image(images[0], **preprocess_options)
+    return _ocr_result_to_text(_worker_engine.ocr(_to_rgb_array(image), cls=angle_cls))
 
 
 class OcrProcessor:
@@ -15,70 +153,338 @@ class OcrProcessor:
     e extrair seu conteúdo textual.
     """
 
-    def __init__(self):
+    def __init__(self, max_workers: Optional[int] = None, pdf_chunk_size: int = 4,
+                 min_text_layer_chars: int = 40, cache: Optional[ResultCache] = None,
+                 engine_pool_size: int = 1, warm_start: bool = True, prewarm_workers: bool = False,
+                 pdf_dpi: int = DEFAULT_PDF_DPI, max_side: Optional[int] = 2500, min_side: Optional[int] = 800,
+                 grayscale: bool = False, binarize_threshold: Optional[int] = None,
+                 pdf_angle_cls: bool = True):
         """
-        Inicializa o motor PaddleOCR.
-        O modelo de linguagem será baixado na primeira execução.
+        Prepara o processador. O PaddleOCR é carregado em segundo plano (ver `OcrEnginePool`),
+        de modo que XMLs, DOCXs e PDFs com camada de texto podem ser processados antes de o
+        motor ficar pronto. O modelo de linguagem será baixado na primeira execução.
+
+        Args:
+            max_workers (int, optional): Número de processos usados para o OCR das páginas
+                                         de PDFs. Cada processo carrega seu próprio motor.
+                                         Defaults to min(4, número de CPUs). Use 1 para
+                                         processar as páginas no processo atual.
+            pdf_chunk_size (int, optional): Quantidade máxima de páginas rasterizadas de cada
+                                            vez quando o PDF é processado sem o pool.
+                                            Defaults to 4.
+            min_text_layer_chars (int, optional): Quantidade mínima de caracteres na camada de
+                                                  texto de uma página para dispensar o OCR.
+                                                  Defaults to 40.
+            cache (ResultCache, optional): Cache persistente do texto extraído, indexado pelo
+                                           hash dos bytes do arquivo. Defaults to None.
+            engine_pool_size (int, optional): Quantidade de motores PaddleOCR no processo atual,
+                                              compartilhados entre threads. Defaults to 1.
+            warm_start (bool, optional): Se True, os motores começam a ser carregados em segundo
+                                         plano imediatamente; caso contrário, no primeiro OCR.
+                                         Defaults to True.
+            prewarm_workers (bool, optional): Se True, os processos do pool de PDFs também são
+                                              criados (e seus motores carregados) em segundo
+                                              plano. Defaults to False.
+            pdf_dpi (int, optional): Resolução da rasterização das páginas de PDF enviadas ao
+                                     OCR. Defaults to 200.
+            max_side (int, optional): Maior lado máximo (em pixels) das imagens enviadas ao OCR;
+                                      imagens maiores são reduzidas. None desativa.
+                                      Defaults to 2500.
+            min_side (int, optional): Imagens com o maior lado abaixo deste valor são ampliadas.
+                                      None desativa. Defaults to 800.
+            grayscale (bool, optional): Converte as imagens para tons de cinza. Defaults to False.
+            binarize_threshold (int, optional): Limiar (0-255) para binarizar as imagens.
+                                                Defaults to None (desativado).
+            pdf_angle_cls (bool, optional): Executa o classificador de orientação também nas
+                                            páginas de PDF. Só chegam ao OCR as páginas sem
+                                            camada de texto (digitalizadas), justamente as que
+                                            podem estar giradas ou de cabeça para baixo; use
+                                            False apenas para lotes sabidamente na orientação
+                                            correta. Imagens enviadas diretamente sempre o
+                                            utilizam. Defaults to True.
         """
-        print("Inicializando o motor OCR (PaddleOCR)... Isso pode levar um momento.")
+        if max_workers is None:
+            max_workers = min(4, os.cpu_count() or 1)
+        self.max_workers = max(1, max_workers)
+        self.pdf_chunk_size = max(1, pdf_chunk_size)
+        self.min_text_layer_chars = min_text_layer_chars
+        self.cache = cache
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        # Pré-processamento aplicado a todas as imagens antes do OCR
+        self.pdf_dpi = pdf_dpi
+        self.pdf_angle_cls = pdf_angle_cls
+        self.preprocess_options = {
+            "max_side": max_side,
+            "min_side": min_side,
+            "grayscale": grayscale,
+            "binarize_threshold": binarize_threshold,
+        }
+        self._options_tag = text_hash(str(pdf_dpi), str(pdf_angle_cls),
+                                      repr(sorted(self.preprocess_options.items())))[:12]
+
+        # Origem de cada página do último PDF e contagem acumulada por origem,
+        # usadas para medir quantas chamadas de OCR a camada de texto economiza.
+        self.last_pdf_page_sources: List[str] = []
+        self.pdf_page_stats: Counter = Counter()
+
+        print("Carregando o motor OCR (PaddleOCR) em segundo plano...")
         # Configurado para português e para corrigir a orientação do texto.
-        self.ocr_engine = PaddleOCR(use_angle_cls=True, lang='pt', show_log=False)
-        print("Motor OCR pronto.")
+        self.engine_pool = OcrEnginePool(size=engine_pool_size, engine_kwargs=OCR_ENGINE_KWARGS,
+                                         warm_start=warm_start)
+
+        self._pool_lock = threading.Lock()
+        self.worker_warmup_seconds: Optional[float] = None
+        if prewarm_workers and self.max_workers > 1:
+            threading.Thread(target=self._prewarm_workers, name="ocr-worker-warmup", daemon=True).start()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Cria (sob demanda) o pool de processos usado no OCR das páginas de PDF."""
+        with self._pool_lock:
+            if self._pool is None:
+                print(f"Iniciando pool de OCR com {self.max_workers} processos...")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    # 'spawn' evita herdar o estado do PaddlePaddle do processo principal
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_ocr_worker,
+                    initargs=(OCR_ENGINE_KWARGS,),
+                )
+            return self._pool
+
+    def _prewarm_workers(self):
+        """Cria todos os processos do pool e aguarda o carregamento dos seus motores."""
+        start = time.perf_counter()
+        try:
+            pool = self._get_pool()
+            # Os processos são criados sob demanda: uma tarefa por worker força a criação de todos
+            futures = [pool.submit(_worker_ready) for _ in range(self.max_workers)]
+            for future in futures:
+                future.result()
+            self.worker_warmup_seconds = time.perf_counter() - start
+            print(f"Pool de OCR pronto em {self.worker_warmup_seconds:.1f}s.")
+        except Exception as e:
+            print(f"Falha ao pré-carregar o pool de OCR: {e}")
+
+    def cold_start_report(self) -> Dict:
+        """
+        Tempo de carregamento do OCR: importação do PaddleOCR, construção de cada motor,
+        tempo até o primeiro motor ficar pronto e, se houver, o pré-carregamento do pool.
+        """
+        report = self.engine_pool.cold_start_report()
+        report["motor_pronto"] = self.engine_pool.is_ready
+        report["pool_processos_segundos"] = (None if self.worker_warmup_seconds is None
+                                             else round(self.worker_warmup_seconds, 2))
+        return report
+
+    def close(self):
+        """Encerra o pool de processos do OCR, se ele tiver sido criado."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def process_image(self, image: Union[Image.Image, np.ndarray], angle_cls: bool = True) -> str:
+        """
+        Executa OCR diretamente sobre uma imagem já decodificada.
+
+        Imagens PIL passam pelo pré-processamento configurado (`preprocess_image`);
+        arrays NumPy são usados como estão.
+
+        Args:
+            image (PIL.Image.Image | np.ndarray): Imagem PIL (qualquer modo) ou array
+                                                  NumPy (H, W), (H, W, 3) ou (H, W, 4).
+            angle_cls (bool, optional): Executa o classificador de orientação do texto.
+                                        Use False quando a orientação já for conhecida.
+
+        Returns:
+            str: O texto reconhecido, uma linha por caixa detectada.
+        """
+        if isinstance(image, Image.Image):
+            image = preprocess_image(image, **self.preprocess_options)
+        rgb = _to_rgb_array(image)
+        with self.engine_pool.engine() as engine:
+            result = engine.ocr(rgb, cls=angle_cls)
+        return _ocr_result_to_text(result)
 
+    @metrics.timed("ocr_etapa_segundos", etapa="imagem")
     def _process_image_content(self, image_content: bytes) -> str:
         """Função auxiliar para executar OCR em bytes de imagem."""
         try:
-            image = Image.open(io.BytesIO(image_content))
-            image_np = np.array(image)
-
-            result = self.ocr_engine.ocr(image_np, cls=True)
-            
-            text_lines = []
-            if result and result[0] is not None:
-                for line_info in result:
-                    for line in line_info:
-                        # A estrutura do resultado é [box, (texto, confiança)]
-                        text_lines.append(line[1][0])
-            return "\n".join(text_lines)
+            with Image.open(io.BytesIO(image_content)) as image:
+                max_side = self.preprocess_options["max_side"]
+                if max_side and image.format == "JPEG":
+                    # Decodifica JPEGs grandes já reduzidos (1/2, 1/4 ou 1/8), sem ler a resolução cheia
+                    image.draft("RGB", (max_side, max_side))
+                return self.process_image(image)
         except Exception as e:
-            return f"Erro ao processar imagem: {e}"
+            metrics.inc("erros_total", operacao="ocr_etapa_segundos", etapa="imagem")
+            return f"{IMAGE_ERROR_PREFIX} {e}"
 
+    def _ocr_pages_inline(self, pdf_path: str, pages: List[int]) -> Dict[int, str]:
+        """
+        Processa as páginas no processo atual, rasterizando-as em blocos limitados.
+
+        Páginas consecutivas são convertidas juntas, em blocos de até `pdf_chunk_size`.
+        """
+        page_texts: Dict[int, str] = {}
+        position = 0
+        while position < len(pages):
+            first = last = pages[position]
+            position += 1
+            while (position < len(pages) and pages[position] == last + 1
+                   and last - first + 1 < self.pdf_chunk_size):
+                last = pages[position]
+                position += 1
+
+            images = convert_from_path(pdf_path, dpi=self.pdf_dpi, first_page=first, last_page=last)
+            for offset, image in enumerate(images):
+                print(f"  Lendo página {first + offset} do PDF com OCR...")
+                page_texts[first + offset] = self.process_image(image, angle_cls=self.pdf_angle_cls)
+            del images
+        return page_texts
+
+    def _ocr_pages_parallel(self, pdf_path: str, pages: List[int]) -> Dict[int, str]:
+        """
+        Distribui as páginas entre os processos do pool e devolve o texto de cada uma.
+
+        No máximo 2 páginas por worker ficam em andamento ao mesmo tempo, o que mantém
+        o consumo de memória limitado independentemente do tamanho do PDF.
+        """
+        pool = self._get_pool()
+        max_in_flight = self.max_workers * 2
+        page_texts: Dict[int, str] = {}
+        pending = {}
+        queue = iter(pages)
+        next_page = next(queue, None)
+
+        while next_page is not None or pending:
+            while next_page is not None and len(pending) < max_in_flight:
+                future = pool.submit(_ocr_pdf_page, pdf_path, next_page, self.pdf_dpi,
+                                     self.preprocess_options, self.pdf_angle_cls)
+                pending[future] = next_page
+                next_page = next(queue, None)
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page_number = pending.pop(future)
+                page_texts[page_number] = future.result()
+                print(f"  Página {page_number} do PDF concluída (OCR).")
+
+        return page_texts
+
+    def _is_text_layer_usable(self, text: str) -> bool:
+        """
+        Decide se o texto embutido de uma página é confiável o suficiente para dispensar o OCR.
+
+        Páginas digitalizadas costumam ter camada de texto vazia ou quase vazia; fontes
+        com codificação quebrada geram muitos caracteres de controle/substituição.
+        """
+        stripped = text.strip()
+        if len(stripped) < self.min_text_layer_chars:
+            return False
+        readable = sum(1 for char in stripped if char.isalnum() or char.isspace() or char in ".,;:/-()$%ºª°")
+        return readable / len(stripped) >= 0.85
+
+    def _extract_text_layer(self, file_bytes: bytes) -> List[Optional[str]]:
+        """
+        Lê a camada de texto de cada página do PDF.
+
+        Returns:
+            List[Optional[str]]: O texto de cada página, ou None quando a página precisa de OCR.
+                                 Lista vazia se o PDF não puder ser lido pelo pypdf.
+        """
+        try:
+            reader = PdfReader(io.BytesIO(file_bytes))
+            page_texts = []
+            for page in reader.pages:
+                try:
+                    text = page.extract_text() or ""
+                except Exception:
+                    text = ""
+                page_texts.append(text if self._is_text_layer_usable(text) else None)
+            return page_texts
+        except Exception as e:
+            print(f"  Camada de texto indisponível ({e}); todas as páginas irão para o OCR.")
+            return []
+
+    @metrics.timed("ocr_etapa_segundos", etapa="pdf")
     def _process_pdf(self, file_bytes: bytes) -> str:
-        """Converte PDF para imagens e extrai texto usando OCR."""
+        """
+        Extrai o texto de um PDF.
+
+        A camada de texto embutida é usada sempre que for boa o suficiente; apenas as
+        páginas digitalizadas (ou sem texto) são rasterizadas e enviadas ao OCR. A origem
+        de cada página fica registrada em `last_pdf_page_sources` e acumulada em
+        `pdf_page_stats`.
+        """
         print("Processando PDF...")
-        full_text = []
+        page_texts = self._extract_text_layer(file_bytes)
+        ocr_pages = [number for number, text in enumerate(page_texts, start=1) if text is None]
+
+        tmp = None
         try:
-            images = convert_from_bytes(file_bytes)
-            for i, image in enumerate(images):
-                print(f"  Lendo página {i+1}/{len(images)} do PDF...")
-                with io.BytesIO() as output:
-                    image.save(output, format="PNG")
-                    image_bytes = output.getvalue()
-                
-                page_text = self._process_image_content(image_bytes)
-                full_text.append(page_text)
-            
-            return "\n\n--- Fim da Página ---\n\n".join(full_text)
+            if ocr_pages or not page_texts:
+                # O PDF é gravado uma única vez em disco para que as páginas possam ser
+                # rasterizadas individualmente, sob demanda, sem copiar os bytes a cada tarefa.
+                tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+                with tmp:
+                    tmp.write(file_bytes)
+
+                if not page_texts:
+                    total_pages = int(pdfinfo_from_path(tmp.name)["Pages"])
+                    page_texts = [None] * total_pages
+                    ocr_pages = list(range(1, total_pages + 1))
+
+                if self.max_workers > 1 and len(ocr_pages) > 1:
+                    ocr_texts = self._ocr_pages_parallel(tmp.name, ocr_pages)
+                else:
+                    ocr_texts = self._ocr_pages_inline(tmp.name, ocr_pages)
+            else:
+                ocr_texts = {}
+
+            sources = []
+            full_text = []
+            for number, text in enumerate(page_texts, start=1):
+                if text is None:
+                    sources.append(PAGE_SOURCE_OCR)
+                    full_text.append(ocr_texts.get(number, ""))
+                else:
+                    sources.append(PAGE_SOURCE_TEXT_LAYER)
+                    full_text.append(text)
+
+            self.last_pdf_page_sources = sources
+            for source in sources:
+                self.pdf_page_stats[source] += 1
+                metrics.inc("ocr_paginas_total", origem=source)
+            print(f"  {sources.count(PAGE_SOURCE_TEXT_LAYER)} página(s) lidas da camada de texto, "
+                  f"{sources.count(PAGE_SOURCE_OCR)} com OCR.")
+
+            return PAGE_SEPARATOR.join(full_text)
         except Exception as e:
-            if "Poppler" in str(e):
+            if "Poppler" in str(e) or "poppler" in str(e):
                 raise RuntimeError(
                     "Dependência 'Poppler' não encontrada. "
                     "Por favor, instale o Poppler e adicione-o ao PATH do seu sistema. "
                     f"Detalhe do erro: {e}"
                 )
             raise e
+        finally:
+            if tmp is not None:
+                os.unlink(tmp.name)
 
-    def _process_xml(self, file_bytes: bytes) -> str:
-        """Extrai conteúdo de texto de um arquivo XML."""
+    @metrics.timed("ocr_etapa_segundos", etapa="xml")
+    def _process_xml(self, file_bytes: bytes) -> Tuple[str, Optional[Dict]]:
+        """
+        Extrai conteúdo de texto de um arquivo XML e, se for NF-e/NFC-e/CT-e,
+        também os campos do Documento (ver `utils.fiscal_xml.parse_xml`).
+        """
         print("Processando XML...")
         try:
-            xml_string = file_bytes.decode('utf-8')
-            root = ET.fromstring(xml_string)
-            text_content = [elem.text for elem in root.iter() if elem.text and elem.text.strip()]
-            return "\n".join(text_content)
+            return parse_xml(file_bytes)
         except ET.ParseError as e:
             raise ValueError(f"Erro ao analisar o arquivo XML: {e}")
 
+    @metrics.timed("ocr_etapa_segundos", etapa="docx")
     def _process_docx(self, file_bytes: bytes) -> str:
         """Extrai texto de um arquivo .docx."""
         print("Processando DOCX...")
@@ -89,20 +495,62 @@ class OcrProcessor:
         except Exception as e:
             raise ValueError(f"Erro ao ler o arquivo .docx: {e}")
 
-    def process_file(self, uploaded_file) -> str:
-        """Identifica o tipo de arquivo e o processa para extrair o texto."""
-        file_bytes = uploaded_file.getvalue()
-        file_extension = os.path.splitext(uploaded_file.name)[1].lower()
-
+    def _extract(self, file_bytes: bytes, file_extension: str) -> Tuple[str, Optional[Dict]]:
+        """Encaminha os bytes do arquivo para o processador adequado à extensão."""
         if file_extension == '.pdf':
-            return self._process_pdf(file_bytes)
+            return self._process_pdf(file_bytes), None
         elif file_extension == '.xml':
             return self._process_xml(file_bytes)
         elif file_extension == '.docx':
-            return self._process_docx(file_bytes)
+            return self._process_docx(file_bytes), None
         elif file_extension in ['.png', '.jpg', '.jpeg']:
-            return self._process_image_content(file_bytes)
+            return self._process_image_content(file_bytes), None
         elif file_extension == '.doc':
             raise NotImplementedError("Formato .doc não é suportado. Por favor, converta para .docx ou .pdf.")
         else:
-            raise ValueError(f"Tipo de arquivo não suportado: {file_extension}")
\ No newline at end of file
+            raise ValueError(f"Tipo de arquivo não suportado: {file_extension}")
+
+    def process_file_structured(self, uploaded_file) -> Tuple[str, Optional[Dict]]:
+        """
+        Extrai o texto do arquivo e, quando o formato já traz os dados estruturados
+        (XML de NF-e, NFC-e ou CT-e), também os campos do Documento.
+
+        Se houver um cache configurado, arquivos com o mesmo conteúdo (e extensão)
+        já processados são devolvidos sem executar a extração novamente.
+
+        Returns:
+            Tuple[str, Optional[Dict]]: O texto extraído e os campos estruturados (incluindo
+                                        'tipo_documento'), ou None quando for preciso usar o LLM.
+        """
+        file_bytes = uploaded_file.getvalue()
+        file_extension = os.path.splitext(uploaded_file.name)[1].lower()
+        file_format = file_extension.lstrip(".") or "desconhecido"
+
+        metrics.inc("ocr_bytes_total", len(file_bytes), formato=file_format)
+        with metrics.timer("ocr_arquivo_segundos", formato=file_format):
+            text, fields, origin = self._extract_cached(uploaded_file.name, file_bytes, file_extension)
+        metrics.inc("ocr_arquivos_total", formato=file_format, origem=origin)
+        return text, fields
+
+    def _extract_cached(self, file_name: str, file_bytes: bytes,
+                        file_extension: str) -> Tuple[str, Optional[Dict], str]:
+        """Consulta o cache antes de extrair. Retorna também a origem ("cache" ou "processado")."""
+        if self.cache is None:
+            return (*self._extract(file_bytes, file_extension), "processado")
+
+        # As opções de pré-processamento alteram o resultado do OCR e fazem parte da chave
+        cache_key = f"{file_extension}:{self._options_tag}:{content_hash(file_bytes)}"
+        cached = self.cache.get(CACHE_NAMESPACE, cache_key)
+        if cached is not None:
+            print(f"Resultado de '{file_name}' obtido do cache.")
+            return cached["texto"], cached["campos"], "cache"
+
+        text, fields = self._extract(file_bytes, file_extension)
+        # Falhas de leitura de imagem não devem ficar gravadas no cache
+        if not text.startswith(IMAGE_ERROR_PREFIX):
+            self.cache.set(CACHE_NAMESPACE, cache_key, {"texto": text, "campos": fields})
+        return text, fields, "processado"
+
+    def process_file(self, uploaded_file) -> str:
+        """Identifica o tipo de arquivo e o processa para extrair o texto."""
+        return self.process_file_structured(uploaded_file)[0]
@@ -0,0 +1,262 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.field_normalizers import normalize_date, normalize_decimal
+
+# --- Padrões pré-compilados ---
+
+_CNPJ_PATTERN = re.compile(r"(?<!\d)(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})(?!\d)")
+_CPF_PATTERN = re.compile(r"(?<![\d/])(\d{3}\.\d{3}\.\d{3}-\d{2})(?![\d/])")
+_DATE_PATTERN = re.compile(r"(?<!\d)(\d{2}[/.-]\d{2}[/.-]\d{4})(?!\d)")
+_MONEY = r"(\d{1,3}(?:\.\d{3})+,\d{2}|\d+,\d{2})"
+# Separadores entre um rótulo e o valor, sem mudar de linha.
+_SAME_LINE = r"[ \t]*(?:\(R\$\))?[ \t]*[:\-]?[ \t]*(?:R\$)?[ \t]*"
+# Rótulos do valor total da nota, do mais específico ao menos específico.
+_TOTAL_PATTERNS = [
+    re.compile(label + _SAME_LINE + _MONEY, re.IGNORECASE)
+    for label in (r"VALOR\s+TOTAL\s+DA\s+NOTA", r"VALOR\s+TOTAL\s+DA\s+NF-?e?")
+]
+# Rótulos genéricos (podem ser o total de um item ou de uma seção): apenas sugestões ao LLM.
+_GENERIC_TOTAL_PATTERN = re.compile(
+    r"(?:VALOR\s+TOTAL|TOTAL\s+A\s+PAGAR|VALOR\s+A\s+PAGAR)" + _SAME_LINE + _MONEY, re.IGNORECASE
+)
+_NF_NUMBER_PATTERN = re.compile(
+    r"(?:NF-?e|NOTA\s+FISCAL(?:\s+ELETR[ÔO]NICA)?)\s*(?:N[º°o.]|N[ÚU]MERO|NR\.?)\s*[:.]?\s*(\d{3}\.\d{3}\.\d{3}|\d{1,9})",
+    re.IGNORECASE,
+)
+_ACCESS_KEY_PATTERN = re.compile(r"(?<!\d)((?:\d{4}\s?){10}\d{4})(?!\d)")
+_ISSUE_DATE_LABEL = re.compile(r"EMISS[ÃA]O", re.IGNORECASE)
+# Rótulos das seções de cada parte do documento. "DESTINATÁRIO / REMETENTE" (DANFE) é um
+# único rótulo do destinatário.
+_PARTY_LABEL = re.compile(
+    r"(?P<emitente>EMITENTE|PRESTADOR\s+D[OE]S?\s+SERVI[ÇC]OS?)"
+    r"|(?P<destinatario>DESTINAT[ÁA]RIO(?:\s*/\s*REMETENTE)?|TOMADOR(?:\s+D[OE]S?\s+SERVI[ÇC]OS?)?)"
+    r"|(?P<outro>TRANSPORTADOR|FIADOR|AVALISTA|REMETENTE|EXPEDIDOR|RECEBEDOR|INTERVENIENTE|TESTEMUNHA)",
+    re.IGNORECASE,
+)
+# Distância máxima, em caracteres, entre o rótulo de uma parte e o CNPJ/CPF dela.
+_PARTY_LABEL_WINDOW = 200
+# Distância máxima, em caracteres, entre o rótulo "EMISSÃO" e a data de emissão.
+_ISSUE_DATE_WINDOW = 80
+
+# Modelo do documento fiscal (posições 21-22 da chave de acesso) -> tipo do documento.
+_MODEL_TYPES = {
+    "55": "Nota Fiscal Eletrônica (NF-e)",
+    "65": "Nota Fiscal de Consumidor Eletrônica (NFC-e)",
+    "57": "Conhecimento de Transporte Eletrônico (CT-e)",
+}
+
+# Palavras-chave que indicam onde cada campo costuma aparecer no texto.
+FIELD_KEYWORDS = {
+    "tipo_documento": [],
+    "numero_nf": [r"N[º°o]\.?\s*\d", r"NOTA\s+FISCAL", r"NF-?e"],
+    "cnpj_emitente": [r"CNPJ", r"EMITENTE"],
+    "nome_emitente": [r"EMITENTE", r"RAZ[ÃA]O\s+SOCIAL", r"CONTRATAD[OA]", r"LOCADOR"],
+    "cnpj_destinatario": [r"DESTINAT[ÁA]RIO", r"TOMADOR"],
+    "nome_destinatario": [r"DESTINAT[ÁA]RIO", r"TOMADOR", r"CONTRATANTE", r"LOCAT[ÁA]RIO"],
+    "data_emissao": [r"EMISS[ÃA]O", r"DATA"],
+    "valor_total": [r"VALOR\s+TOTAL", r"TOTAL", r"R\$"],
+}
+_KEYWORD_PATTERNS = {field: [re.compile(k, re.IGNORECASE) for k in keywords]
+                     for field, keywords in FIELD_KEYWORDS.items()}
+
+
+# --- Validação de dígitos verificadores ---
+
+def _digits(value: str) -> str:
+    return "".join(ch for ch in value if ch.isdigit())
+
+
+def is_valid_cnpj(value: str) -> bool:
+    """Valida os dígitos verificadores de um CNPJ (com ou sem pontuação)."""
+    cnpj = _digits(value)
+    if len(cnpj) != 14 or cnpj == cnpj[0] * 14:
+        return False
+    for size in (12, 13):
+        weights = list(range(size - 7, 1, -1)) + list(range(9, 1, -1))
+        total = sum(int(d) * w for d, w in zip(cnpj[:size], weights))
+        check = 11 - total % 11
+        if (0 if check >= 10 else check) != int(cnpj[size]):
+            return False
+    return True
+
+
+def is_valid_cpf(value: str) -> bool:
+    """Valida os dígitos verificadores de um CPF (com ou sem pontuação)."""
+    cpf = _digits(value)
+    if len(cpf) != 11 or cpf == cpf[0] * 11:
+        return False
+    for size in (9, 10):
+        total = sum(int(d) * w for d, w in zip(cpf[:size], range(size + 1, 1, -1)))
+        check = (total * 10) % 11
+        if (0 if check == 10 else check) != int(cpf[size]):
+            return False
+    return True
+
+
+def is_valid_access_key(value: str) -> bool:
+    """Valida o dígito verificador (módulo 11) de uma chave de acesso de 44 dígitos."""
+    key = _digits(value)
+    if len(key) != 44:
+        return False
+    weights = [2, 3, 4, 5, 6, 7, 8, 9]
+    total = sum(int(d) * weights[i % 8] for i, d in enumerate(reversed(key[:43])))
+    check = 11 - total % 11
+    return (0 if check >= 10 else check) == int(key[43])
+
+
+# --- Extração ---
+
+def document_candidates(text: str) -> List[Tuple[int, str]]:
+    """
+    CNPJs e CPFs com dígitos verificadores válidos encontrados no texto.
+
+    Returns:
+        List[Tuple[int, str]]: (posição no texto, dígitos), em ordem de posição.
+    """
+    documents = [(m.start(), _digits(m.group(1))) for m in _CNPJ_PATTERN.finditer(text)
+                 if is_valid_cnpj(m.group(1))]
+    documents += [(m.start(), _digits(m.group(1))) for m in _CPF_PATTERN.finditer(text)
+                  if is_valid_cpf(m.group(1))]
+    documents.sort()
+    return documents
+
+
+def extract_hints(text: str) -> Dict[str, List[str]]:
+    """
+    Valores encontrados no texto sem um rótulo que os identifique, sugeridos ao LLM (que
+    decide pelo contexto), em vez de preencher os campos diretamente.
+
+    Returns:
+        Dict[str, List[str]]: "cnpj_cpf" (CNPJs/CPFs válidos) e "valor_total" (valores com
+                              rótulos genéricos, ex: "VALOR TOTAL: 10,00"), na ordem do texto.
+    """
+    hints = {
+        "cnpj_cpf": list(dict.fromkeys(document for _, document in document_candidates(text))),
+        "valor_total": list(dict.fromkeys(match.group(1) for match in _GENERIC_TOTAL_PATTERN.finditer(text))),
+    }
+    return {name: values[:10] for name, values in hints.items() if values}
+
+
+def _labelled_document(text: str, documents: List[Tuple[int, str]], party: str,
+                       cnpj_only: bool = False, exclude: Optional[str] = None) -> Optional[str]:
+    """
+    CNPJ/CPF logo após um rótulo da parte ("emitente" ou "destinatario"), antes do rótulo
+    de qualquer outra seção (ex: o transportador ou o fiador) e a no máximo
+    _PARTY_LABEL_WINDOW caracteres.
+    """
+    labels = list(_PARTY_LABEL.finditer(text))
+    for index, label in enumerate(labels):
+        if label.lastgroup != party:
+            continue
+        section_end = labels[index + 1].start() if index + 1 < len(labels) else len(text)
+        section_end = min(section_end, label.end() + _PARTY_LABEL_WINDOW)
+        for position, document in documents:
+            if position < label.end() or (cnpj_only and len(document) != 14) or document == exclude:
+                continue
+            if position < section_end:
+                return document
+            break
+    return None
+
+
+def pre_extract(text: str) -> Dict:
+    """
+    Extrai localmente, com padrões validados, os campos que não precisam do LLM.
+
+    Campos possíveis: chave_acesso, tipo_documento (apenas quando há chave de acesso),
+    numero_nf, cnpj_emitente, cnpj_destinatario, data_emissao e valor_total. CNPJs, CPFs
+    e chaves de acesso só são aceitos com dígitos verificadores válidos; valores e datas
+    só quando acompanhados de um rótulo reconhecível (o valor total, apenas com o rótulo
+    do total da nota e na mesma linha). O CNPJ do emitente só é preenchido a partir da
+    chave de acesso ou de um rótulo do emitente. Os demais CNPJs/CPFs e valores com
+    rótulos genéricos são apenas sugestões ao LLM (ver `extract_hints`).
+
+    Returns:
+        Dict: Os campos encontrados (os ausentes são omitidos).
+    """
+    fields: Dict = {}
+
+    # Chave de acesso (NF-e/NFC-e/CT-e): contém UF, AAMM, CNPJ do emitente, modelo e número
+    for match in _ACCESS_KEY_PATTERN.finditer(text):
+        key = _digits(match.group(1))
+        if is_valid_access_key(key):
+            fields["chave_acesso"] = key
+            fields["cnpj_emitente"] = key[6:20]
+            fields["numero_nf"] = str(int(key[25:34]))
+            if key[20:22] in _MODEL_TYPES:
+                fields["tipo_documento"] = _MODEL_TYPES[key[20:22]]
+            break
+
+    documents = document_candidates(text)
+    if documents:
+        if "cnpj_emitente" not in fields:
+            emitter = _labelled_document(text, documents, "emitente", cnpj_only=True)
+            if emitter:
+                fields["cnpj_emitente"] = emitter
+        recipient = _labelled_document(text, documents, "destinatario", exclude=fields.get("cnpj_emitente"))
+        if recipient:
+            fields["cnpj_destinatario"] = recipient
+
+    if "numero_nf" not in fields:
+        match = _NF_NUMBER_PATTERN.search(text)
+        if match:
+            fields["numero_nf"] = str(int(_digits(match.group(1))))
+
+    # Apenas a data logo após o rótulo de emissão: datas soltas podem ser o vencimento,
+    # um nascimento etc., e o campo local não é revisto pelo LLM
+    for label in _ISSUE_DATE_LABEL.finditer(text):
+        match = _DATE_PATTERN.search(text, label.end(), label.end() + _ISSUE_DATE_WINDOW)
+        if match:
+            normalized = normalize_date(match.group(1).replace(".", "/").replace("-", "/"))
+            if normalized:
+                fields["data_emissao"] = normalized
+                break
+
+    for pattern in _TOTAL_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            fields["valor_total"] = normalize_decimal(match.group(1))
+            break
+
+    return fields
+
+
+def select_windows(text: str, fields: Iterable[str], max_chars: int = 12000,
+                   head_chars: int = 1500, radius: int = 300) -> str:
+    """
+    Seleciona os trechos do texto relevantes para os campos pedidos.
+
+    Inclui o início do documento (onde costuma estar o cabeçalho, útil para a
+    classificação) e janelas de `radius` caracteres ao redor das palavras-chave de cada
+    campo, mesclando as sobrepostas, até o limite de `max_chars`.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    spans: List[Tuple[int, int]] = [(0, min(head_chars, len(text)))]
+    for field in fields:
+        for pattern in _KEYWORD_PATTERNS.get(field, []):
+            # Poucas ocorrências por palavra-chave bastam para localizar o campo
+            for count, match in enumerate(pattern.finditer(text)):
+                if count >= 3:
+                    break
+                spans.append((max(0, match.start() - radius), min(len(text), match.end() + radius)))
+
+    spans.sort()
+    merged: List[List[int]] = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    pieces = []
+    used = 0
+    for start, end in merged:
+        if used >= max_chars:
+            break
+        piece = text[start:min(end, start + max_chars - used)]
+        pieces.append(piece)
+        used += len(piece)
+    return "\n[...]\n".join(pieces)
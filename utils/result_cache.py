@@ -0,0 +1,117 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+
+def content_hash(data: bytes) -> str:
+    """Retorna o hash SHA-256 (hexadecimal) dos bytes de um arquivo."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def text_hash(*parts: str) -> str:
+    """Retorna o hash SHA-256 (hexadecimal) de uma sequência de textos."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        # Separador para que ("ab", "c") e ("a", "bc") não colidam
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache persistente de resultados (OCR, extração por LLM, etc.) endereçado por conteúdo.
+
+    As entradas ficam em um arquivo SQLite, separadas por namespace, e são descartadas
+    pela política LRU (menos recentemente usadas) quando o limite de entradas é atingido.
+    """
+
+    def __init__(self, db_path: str = "data/cache.db", max_entries: int = 10000):
+        """
+        Inicializa o cache e cria a tabela se ela não existir.
+
+        Args:
+            db_path (str): O caminho para o arquivo SQLite do cache.
+            max_entries (int): Número máximo de entradas mantidas (somando todos os namespaces).
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+        # Conexão única compartilhada entre as threads do Streamlit, protegida pelo lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                chave TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                ultimo_acesso REAL NOT NULL,
+                PRIMARY KEY (namespace, chave)
+            );
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_ultimo_acesso ON cache (ultimo_acesso);")
+        self._conn.commit()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Busca um resultado no cache e atualiza seu último acesso.
+
+        Returns:
+            Optional[Any]: O valor armazenado, ou None se a chave não existir.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT valor FROM cache WHERE namespace = ? AND chave = ?;", (namespace, key)
+            ).fetchone()
+            if row is None:
+                self.misses[namespace] += 1
+                return None
+            self._conn.execute(
+                "UPDATE cache SET ultimo_acesso = ? WHERE namespace = ? AND chave = ?;",
+                (time.time(), namespace, key),
+            )
+            self._conn.commit()
+            self.hits[namespace] += 1
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any):
+        """Armazena um resultado serializável em JSON, descartando as entradas mais antigas se necessário."""
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, chave, valor, ultimo_acesso) VALUES (?, ?, ?, ?);",
+                (namespace, key, payload, time.time()),
+            )
+            total = self._conn.execute("SELECT COUNT(*) FROM cache;").fetchone()[0]
+            if total > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE rowid IN "
+                    "(SELECT rowid FROM cache ORDER BY ultimo_acesso ASC LIMIT ?);",
+                    (total - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self, namespace: Optional[str] = None):
+        """Remove todas as entradas (ou apenas as de um namespace)."""
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM cache;")
+            else:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ?;", (namespace,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Retorna os contadores de acertos e falhas por namespace."""
+        namespaces = set(self.hits) | set(self.misses)
+        return {ns: {"hits": self.hits[ns], "misses": self.misses[ns]} for ns in sorted(namespaces)}
+
+    def close(self):
+        """Fecha a conexão com o arquivo do cache."""
+        with self._lock:
+            self._conn.close()